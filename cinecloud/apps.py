@@ -0,0 +1,27 @@
+from django.apps import AppConfig
+import os
+import sys
+
+# Procesos que codifican video: el servidor web (variantes bajo demanda) y los workers de Celery
+SERVER_PROGRAMS = ('uvicorn', 'gunicorn', 'daphne')
+
+
+def _is_encoding_process(argv):
+    # migrate, makemigrations, shell, tests... no necesitan detectar codificadores
+    program = argv[0] if argv else ''
+    if any(name in program for name in SERVER_PROGRAMS):
+        return True
+    if 'runserver' in argv[1:2]:
+        return True
+    return 'celery' in program and 'worker' in argv
+
+
+class CinecloudConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cinecloud'
+
+    def ready(self):
+        # Detectar los codificadores disponibles en segundo plano al arrancar
+        if os.getenv('HLS_ENCODER_WARMUP', 'True') == 'True' and _is_encoding_process(sys.argv):
+            from .hls_utils import encoder_registry
+            encoder_registry.warm_up()
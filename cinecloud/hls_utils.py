@@ -7,8 +7,25 @@ import concurrent.futures
 import subprocess
 import argparse
 import traceback
-from typing import Dict, Tuple, List, Optional, Any, Union
+import json
+import shutil
+import tempfile
+import threading
+import math
+import glob
+import gzip
+import hashlib
+import re
+import collections
+import heapq
+import itertools
+import uuid
+import atexit
+import socket
+from contextlib import contextmanager
+from typing import Dict, Tuple, List, Optional, Any, Union, Callable, Iterable, Iterator
 from pathlib import Path
+from dataclasses import dataclass, asdict
 
 # Configuración de logging
 logging.basicConfig(
@@ -24,6 +41,273 @@ logger = logging.getLogger('hls_utils')
 # Constantes
 MAX_RETRIES = 3
 RETRY_DELAY = 2  # segundos
+ENCODER_CACHE_PATH = os.getenv('HLS_ENCODER_CACHE', os.path.join(tempfile.gettempdir(), 'cinecloud_encoders.json'))
+ENCODER_CACHE_TTL = int(os.getenv('HLS_ENCODER_CACHE_TTL', 24 * 3600))  # segundos
+MIN_CHUNK_DURATION = 30  # segundos, tramo mínimo en el modo por fragmentos
+STDERR_TAIL_LINES = 200  # líneas de stderr de ffmpeg conservadas para informar de errores
+AUDIO_RENDITION = ('audio', '128k')  # pista de audio compartida por todas las variantes de video
+AUDIO_LOW_RENDITION = ('audio_low', '48k')  # variante sólo audio para conexiones muy pobres
+SEGMENT_FORMATS = ('ts', 'fmp4')  # segmentos .ts sueltos o un único .mp4 (CMAF) por variante
+HLS_TIME = 10  # segundos, duración objetivo de cada segmento
+# Fuentes que se pueden segmentar con -c copy sin recodificar
+COPY_VIDEO_CODECS = ('h264',)
+COPY_PROFILES = ('Constrained Baseline', 'Baseline', 'Main', 'High')
+COPY_PIX_FMTS = ('yuv420p', 'yuvj420p')
+# Atributo CODECS (RFC 6381) de las variantes: perfil H.264 -> profile_idc y constraint flags
+AVC_PROFILE_CODES = {'Constrained Baseline': '42E0', 'Baseline': '4200', 'Main': '4D40', 'High': '6400'}
+AAC_CODECS = {'HE-AAC': 'mp4a.40.5', 'HE-AACv2': 'mp4a.40.29'}  # el resto, AAC-LC (mp4a.40.2)
+COPY_SEGMENT_TOLERANCE = 0.5  # desviación máxima de un segmento respecto a HLS_TIME
+COPY_MAX_BITRATE_RATIO = 2.0  # bitrate máximo de la fuente respecto al de la variante que sustituye
+# Escalera por título: codificación de sondeo CRF a baja resolución sobre muestras del video
+LADDER_SAMPLES = int(os.getenv('HLS_LADDER_SAMPLES', 5))
+LADDER_SAMPLE_DURATION = float(os.getenv('HLS_LADDER_SAMPLE_DURATION', 4))  # segundos
+LADDER_PROBE_CRF = int(os.getenv('HLS_LADDER_PROBE_CRF', 23))
+LADDER_REFERENCE_KBPS = float(os.getenv('HLS_LADDER_REFERENCE_KBPS', 700))  # sondeo de un contenido "típico"
+LADDER_MIN_FACTOR = float(os.getenv('HLS_LADDER_MIN_FACTOR', 0.5))
+LADDER_MAX_FACTOR = float(os.getenv('HLS_LADDER_MAX_FACTOR', 1.6))
+LADDER_SIMPLE_FACTOR = float(os.getenv('HLS_LADDER_SIMPLE_FACTOR', 0.7))  # por debajo se omiten variantes intermedias
+LADDER_COMPLEX_FACTOR = float(os.getenv('HLS_LADDER_COMPLEX_FACTOR', 1.2))  # por encima se añade una variante 360p
+LADDER_EXTRA_RUNG = (640, 360, '600k')
+# Miniaturas para la barra de progreso (sprites + pista WebVTT)
+TRICKPLAY_INTERVAL = float(os.getenv('HLS_TRICKPLAY_INTERVAL', 10))  # segundos entre miniaturas
+TRICKPLAY_WIDTH = int(os.getenv('HLS_TRICKPLAY_WIDTH', 160))
+TRICKPLAY_GRID = (5, 5)  # columnas x filas de cada sprite
+TRICKPLAY_FORMAT = os.getenv('HLS_TRICKPLAY_FORMAT', 'jpg')  # 'jpg' o 'webp'
+TRICKPLAY_VTT = 'thumbnails.vtt'
+TRICKPLAY_SOURCE = 'thumbnails.json'  # huella de la fuente de la que salieron las miniaturas
+# Presupuesto global de codificación (ver EncodeScheduler)
+ENCODE_THREADS = int(os.getenv('HLS_ENCODE_THREADS', os.cpu_count() or 2))  # hilos de ffmpeg en total
+ENCODE_SLOTS = int(os.getenv('HLS_ENCODE_SLOTS', max(1, (os.cpu_count() or 2) // 4)))  # codificadores CPU simultáneos
+GPU_ENCODE_SLOTS = int(os.getenv('HLS_GPU_ENCODE_SLOTS', 3))  # sesiones NVENC/AMF simultáneas
+SCHEDULER_REDIS_URL = os.getenv('HLS_SCHEDULER_REDIS_URL')  # coordina el presupuesto entre procesos y nodos
+SCHEDULER_LEASE_TTL = int(os.getenv('HLS_SCHEDULER_LEASE_TTL', 6 * 3600))  # segundos, libera slots de procesos caídos
+SCHEDULER_POLL_INTERVAL = 1.0  # segundos entre intentos contra Redis
+# Prioridades: menor valor se atiende antes
+PRIORITY_INTERACTIVE = 0  # subidas sueltas (un episodio nuevo)
+PRIORITY_NORMAL = 5
+PRIORITY_BACKFILL = 10  # subidas masivas y reconversiones
+METRICS_DIR = os.getenv('HLS_METRICS_DIR')  # instantáneas por proceso que agrega /metrics
+METRICS_FLUSH_INTERVAL = float(os.getenv('HLS_METRICS_FLUSH_INTERVAL', 5))  # segundos entre escrituras de la instantánea
+METRICS_STALE_AFTER = 3600  # instantáneas de otros hosts sin actualizar en este tiempo son de procesos muertos
+
+JIT_SOURCE_NAME = '.source'  # copia de la fuente (oculta, no se sirve) para las variantes bajo demanda
+JIT_SEGMENT_RE = re.compile(r'^(\d+p)_(\d+)\.ts$')
+JIT_LOCK_STRIPES = 64  # locks de proceso repartidos por segmento
+
+STREAM_PROBE_BYTES = int(os.getenv('HLS_STREAM_PROBE_BYTES', 8 * 1024 * 1024))  # inicio de la subida que se valida
+STREAM_READ_SIZE = 1024 * 1024  # bytes enviados a ffmpeg en cada escritura
+STREAM_POLL_INTERVAL = 0.5  # segundos entre comprobaciones de un archivo que sigue creciendo
+STREAM_IDLE_TIMEOUT = int(os.getenv('HLS_STREAM_IDLE_TIMEOUT', 900))  # segundos sin datos nuevos antes de abortar
+
+# Al reutilizar una salida (link_hls_output): lo que no se reutiliza y lo que se copia en lugar de enlazar
+LINK_SKIPPED_SUFFIXES = ('.checkpoint.json', '.tmp', '.lock')
+LINK_COPIED_SUFFIXES = ('.m3u8', '.json', '.vtt', '.gz', '.br')
+SERVING_MANIFEST = 'etags.json'  # ETag, tamaño y mtime de cada archivo servido de un título
+PRECOMPRESSED_EXTENSIONS = ('.m3u8', '.vtt')  # se guardan también en .gz (y .br si hay brotli)
+
+# Métricas exportadas en formato Prometheus: tipo, ayuda y buckets de los histogramas
+METRICS = {
+    'cinecloud_stage_seconds': (
+        'histogram', 'Duración de cada etapa de la ingesta',
+        (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600)
+    ),
+    'cinecloud_encode_realtime_factor': (
+        'histogram', 'Segundos de video procesados por segundo de reloj',
+        (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+    ),
+    'cinecloud_transcode_queue_wait_seconds': (
+        'histogram', 'Espera de un trabajo en la cola hasta que un worker lo empieza',
+        (1, 5, 15, 60, 300, 900, 1800, 3600, 7200)
+    ),
+    'cinecloud_retries_total': ('counter', 'Reintentos de ffmpeg y de tareas de transcodificación', None),
+    'cinecloud_fallbacks_total': ('counter', 'Veces que se recurrió a un método de respaldo', None),
+    'cinecloud_hls_cache_requests_total': ('counter', 'Aciertos y fallos de la caché en memoria de HLS', None),
+}
+
+class MetricsRegistry:
+    """Contadores e histogramas del proceso con exportación en formato Prometheus.
+
+    Con ``HLS_METRICS_DIR`` cada proceso (servidor web, workers de Celery)
+    guarda una instantánea de sus métricas en ese directorio y ``render``
+    agrega todas, de modo que ``/metrics`` incluye también lo medido en los
+    workers. La instantánea se escribe como mucho cada ``flush_interval``
+    segundos desde un hilo aparte y al terminar el proceso (``flush``), no en
+    cada medida. ``render`` borra las de procesos que ya no existen, así que
+    sus contadores desaparecen como en un reinicio.
+    """
+    def __init__(self, directory: Optional[str] = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._reset()
+
+    def _reset(self):
+        # También tras un fork: lo medido por el padre ya está en su propia instantánea
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+        self._dirty = False
+        self._saved_at = 0.0
+        self._flusher: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(name: str, labels: Optional[Dict[str, Any]]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        return name, tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+    def inc(self, name: str, labels: Optional[Dict[str, Any]] = None, value: float = 1):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._changed()
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None):
+        buckets = METRICS[name][2]
+        key = self._key(name, labels)
+        with self._lock:
+            # Conteo por bucket (no acumulado), suma y número de observaciones
+            data = self._histograms.setdefault(key, [0] * len(buckets) + [0.0, 0])
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    data[index] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+            self._changed()
+
+    @contextmanager
+    def span(self, stage: str, media_duration: float = 0, **labels):
+        """Mide una etapa; con ``media_duration`` registra también su factor de tiempo real"""
+        timing = {'elapsed': 0.0}
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing['elapsed'] = elapsed = time.perf_counter() - start
+            detail = ', '.join(f'{k}={v}' for k, v in labels.items())
+            logger.info(f"Etapa {stage}{f' ({detail})' if detail else ''}: {elapsed:.2f}s")
+            self.observe('cinecloud_stage_seconds', elapsed, {'stage': stage, **labels})
+            if media_duration > 0 and elapsed > 0:
+                self.observe('cinecloud_encode_realtime_factor', media_duration / elapsed, {'stage': stage, **labels})
+
+    def _snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(data)] for (name, labels), data in self._histograms.items()],
+            }
+
+    def _changed(self):
+        # Llamado con el lock tomado; el hilo de escritura se arranca con la primera medida
+        self._dirty = True
+        if self.directory and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            # Sin cambios se reescribe igualmente de vez en cuando para que no parezca abandonada
+            self.flush(force=time.time() - self._saved_at > METRICS_STALE_AFTER / 2)
+
+    def _snapshot_path(self, pid: Optional[int] = None) -> str:
+        return os.path.join(self.directory, f'metrics_{socket.gethostname()}_{pid or os.getpid()}.json')
+
+    def flush(self, force: bool = False):
+        """Escribe la instantánea del proceso si hay medidas nuevas"""
+        if not self.directory or not (self._dirty or force):
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._snapshot_path()
+            with self._lock:
+                self._dirty = False
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(self._snapshot(), f)
+            os.replace(f'{path}.tmp', path)
+            self._saved_at = time.time()
+        except OSError as e:
+            logger.debug(f"No se pudo guardar la instantánea de métricas: {str(e)}")
+
+    def _is_stale(self, path: str) -> bool:
+        """Indica si la instantánea es de un proceso que ya terminó"""
+        host, _, pid = os.path.basename(path)[len('metrics_'):-len('.json')].rpartition('_')
+        if host == socket.gethostname() and pid.isdigit():
+            if int(pid) == os.getpid():
+                return False
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                pass
+            return False
+        # Los pids de otros hosts no se pueden comprobar: sólo se descartan si nadie las actualiza
+        try:
+            return time.time() - os.path.getmtime(path) > METRICS_STALE_AFTER
+        except OSError:
+            return False
+
+    def render(self) -> str:
+        """Texto de exposición de Prometheus con las métricas de todos los procesos"""
+        snapshots = []
+        if self.directory:
+            self.flush()
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+                if self._is_stale(path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        if not snapshots:
+            snapshots = [self._snapshot()]
+
+        counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, data in snapshot['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                merged = histograms.setdefault(key, [0] * len(data))
+                histograms[key] = [a + b for a, b in zip(merged, data)]
+
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            for (metric, labels), data in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, data):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", "+Inf")])} {data[-1]}')
+                lines.append(f'{name}_sum{format_labels(labels)} {data[-2]}')
+                lines.append(f'{name}_count{format_labels(labels)} {data[-1]}')
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+atexit.register(metrics.flush)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=metrics._reset)
 
 class EncoderSettings:
     """Clase para manejar la configuración de codificadores"""
@@ -32,6 +316,11 @@ class EncoderSettings:
         self.preset = preset
         self.quality = quality
 
+    @property
+    def resource(self) -> str:
+        """Presupuesto del planificador que consume este codificador"""
+        return 'cpu' if self.codec == 'libx264' else 'gpu'
+
     def get_output_args(self) -> Dict[str, str]:
         """Devuelve los argumentos para ffmpeg según el codec configurado"""
         output_args = {'c:v': self.codec}
@@ -45,6 +334,112 @@ class EncoderSettings:
         
         return output_args
 
+class ProgressTracker:
+    """Agrega el progreso de cada variante y lo notifica a un ritmo acotado.
+
+    ``callback`` recibe el progreso global (0-1) y un diccionario con el de cada
+    variante; se invoca como mucho una vez cada ``interval`` segundos, salvo al
+    completar todas las variantes.
+    """
+    def __init__(self, callback: Callable[[float, Dict[str, float]], None], interval: float = 1.0):
+        self.callback = callback
+        self.interval = interval
+        self._renditions: Dict[str, float] = {}
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, renditions: List[str]):
+        """Registra las variantes que se van a convertir para calcular el progreso global"""
+        with self._lock:
+            self._renditions = {name: 0.0 for name in renditions}
+
+    def update(self, rendition: str, fraction: float):
+        with self._lock:
+            self._renditions[rendition] = max(self._renditions.get(rendition, 0.0), fraction)
+            overall = sum(self._renditions.values()) / len(self._renditions)
+            now = time.monotonic()
+            if overall < 1.0 and now - self._last_report < self.interval:
+                return
+            self._last_report = now
+            snapshot = dict(self._renditions)
+        try:
+            self.callback(overall, snapshot)
+        except Exception as e:
+            logger.debug(f"Error al notificar el progreso: {str(e)}")
+
+def _rendition_progress(progress: Optional[ProgressTracker], renditions: List[str]) -> Optional[Callable[[float], None]]:
+    """Devuelve la función que reparte el progreso de un proceso ffmpeg entre sus variantes"""
+    if progress is None:
+        return None
+    def on_progress(fraction: float):
+        for name in renditions:
+            progress.update(name, fraction)
+    return on_progress
+
+def run_ffmpeg(
+    cmd,
+    duration: float = 0,
+    on_progress: Optional[Callable[[float], None]] = None,
+    stderr_lines: int = STDERR_TAIL_LINES,
+    stdin_feed: Optional[Iterable[bytes]] = None
+):
+    """Ejecuta un comando de ffmpeg-python leyendo ``-progress`` de forma incremental.
+
+    El progreso se calcula como ``out_time`` sobre ``duration``. De stderr sólo
+    se conservan las últimas ``stderr_lines`` líneas, que se adjuntan a
+    ``ffmpeg.Error`` si el proceso falla. Con ``stdin_feed`` los bloques que
+    produce se escriben en la entrada estándar de ffmpeg (``pipe:0``); si el
+    iterable falla, el error se propaga aunque ffmpeg termine bien.
+    """
+    args = cmd.global_args('-progress', 'pipe:1', '-nostats').compile(overwrite_output=True)
+    logger.debug(f"Ejecutando: {' '.join(args)}")
+    stdin = subprocess.PIPE if stdin_feed is not None else subprocess.DEVNULL
+    process = subprocess.Popen(args, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Leer stderr en paralelo para que ffmpeg no se bloquee, guardando sólo el final
+    stderr_tail = collections.deque(maxlen=stderr_lines)
+    reader = threading.Thread(target=stderr_tail.extend, args=(process.stderr,), daemon=True)
+    reader.start()
+
+    feed_errors = []
+    if stdin_feed is not None:
+        def feed():
+            try:
+                for data in stdin_feed:
+                    process.stdin.write(data)
+            except BrokenPipeError:
+                pass  # ffmpeg terminó antes; su código de salida indica si fue un error
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+
+    for raw_line in process.stdout:
+        key, _, value = raw_line.decode('utf-8', errors='replace').strip().partition('=')
+        # out_time_ms está en microsegundos igual que out_time_us (herencia de ffmpeg)
+        if key in ('out_time_us', 'out_time_ms') and on_progress and duration > 0:
+            try:
+                seconds = int(value) / 1_000_000
+            except ValueError:
+                continue
+            on_progress(min(1.0, max(0.0, seconds / duration)))
+
+    returncode = process.wait()
+    reader.join()
+    if stdin_feed is not None:
+        writer.join()
+    if feed_errors:
+        raise feed_errors[0]
+    if returncode != 0:
+        raise ffmpeg.Error('ffmpeg', b'', b''.join(stderr_tail))
+    if on_progress:
+        on_progress(1.0)
+
 def safe_execute(func, *args, max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, **kwargs):
     """Ejecuta una función con reintentos en caso de fallo"""
     for attempt in range(max_retries):
@@ -56,6 +451,7 @@ def safe_execute(func, *args, max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY,
                 logger.error(f"Error de ffmpeg: {e.stderr.decode('utf-8', errors='replace')}")
             
             if attempt < max_retries - 1:
+                metrics.inc('cinecloud_retries_total', {'kind': 'ffmpeg'})
                 logger.warning(f"Intento {attempt+1} fallido: {str(e)}. Reintentando en {retry_delay} segundos...")
                 time.sleep(retry_delay)
                 # Aumentamos el tiempo de espera para cada reintento
@@ -65,7 +461,7 @@ def safe_execute(func, *args, max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY,
                 logger.error(traceback.format_exc())
                 raise
 
-def detect_gpus() -> Dict[str, bool]:
+def detect_gpus(ffmpeg_check: Optional[Dict[str, bool]] = None) -> Dict[str, bool]:
     """Detecta GPUs disponibles usando bibliotecas de Python de manera multiplataforma"""
     gpu_info = {
         'nvidia': False,
@@ -74,7 +470,8 @@ def detect_gpus() -> Dict[str, bool]:
     
     # Primero comprobamos si ffmpeg tiene los codificadores disponibles
     # Esta es la manera más confiable de verificar si podemos usar aceleración por hardware
-    ffmpeg_check = _detect_gpus_with_ffmpeg()
+    if ffmpeg_check is None:
+        ffmpeg_check = _detect_gpus_with_ffmpeg()
     gpu_info['nvidia'] = ffmpeg_check.get('nvidia', False)
     gpu_info['amd'] = ffmpeg_check.get('amd', False)
     
@@ -186,6 +583,262 @@ def _detect_gpus_with_ffmpeg() -> Dict[str, bool]:
         logger.debug(f"Error al verificar codificadores en ffmpeg: {str(e)}")
     return gpu_info
 
+class EncoderCapabilityRegistry:
+    """Registro de proceso con las capacidades de codificación detectadas.
+
+    La detección (ffmpeg -encoders, codificaciones de prueba, GPUtil y NVML) se
+    ejecuta una sola vez por proceso y se guarda en disco junto a una huella del
+    binario de ffmpeg. Sólo se repite si caduca el TTL, si cambia ffmpeg o si se
+    invalida tras un fallo del codificador.
+    """
+    def __init__(self, cache_path: str = ENCODER_CACHE_PATH, ttl: int = ENCODER_CACHE_TTL):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._capabilities: Optional[Dict[str, Dict[str, bool]]] = None
+        self._detected_at = 0.0
+
+    def _fingerprint(self) -> Optional[str]:
+        """Huella del binario de ffmpeg (ruta, tamaño y fecha) sin lanzar procesos"""
+        ffmpeg_path = shutil.which('ffmpeg')
+        if not ffmpeg_path:
+            return None
+        real_path = os.path.realpath(ffmpeg_path)
+        st = os.stat(real_path)
+        return f"{real_path}:{st.st_size}:{st.st_mtime_ns}"
+
+    def _load_from_disk(self, fingerprint: Optional[str]) -> Optional[Tuple[Dict[str, Dict[str, bool]], float]]:
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            if data['fingerprint'] != fingerprint or time.time() - data['detected_at'] > self.ttl:
+                return None
+            return {'ffmpeg': data['ffmpeg'], 'gpus': data['gpus']}, data['detected_at']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_to_disk(self, fingerprint: Optional[str], capabilities: Dict[str, Dict[str, bool]], detected_at: float):
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'fingerprint': fingerprint, 'detected_at': detected_at, **capabilities}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la caché de codificadores: {str(e)}")
+
+    def get(self) -> Dict[str, Dict[str, bool]]:
+        """Devuelve las capacidades detectadas, detectándolas sólo si no hay caché válida"""
+        with self._lock:
+            if self._capabilities is not None and time.time() - self._detected_at <= self.ttl:
+                return self._capabilities
+
+            fingerprint = self._fingerprint()
+            cached = self._load_from_disk(fingerprint)
+            if cached is not None:
+                self._capabilities, self._detected_at = cached
+                logger.info("Capacidades de codificación cargadas desde la caché")
+                return self._capabilities
+
+            logger.info("Detectando capacidades de codificación...")
+            ffmpeg_check = _detect_gpus_with_ffmpeg()
+            self._capabilities = {'ffmpeg': ffmpeg_check, 'gpus': detect_gpus(ffmpeg_check)}
+            self._detected_at = time.time()
+            self._save_to_disk(fingerprint, self._capabilities, self._detected_at)
+            return self._capabilities
+
+    def ffmpeg_encoders(self) -> Dict[str, bool]:
+        """Codificadores por hardware verificados en ffmpeg"""
+        return self.get()['ffmpeg']
+
+    def gpus(self) -> Dict[str, bool]:
+        """GPUs detectadas por cualquiera de los métodos disponibles"""
+        return self.get()['gpus']
+
+    def invalidate(self):
+        """Descarta la caché para que la próxima consulta vuelva a detectar"""
+        with self._lock:
+            self._capabilities = None
+            try:
+                os.remove(self.cache_path)
+            except OSError:
+                pass
+        logger.warning("Caché de capacidades de codificación invalidada")
+
+    def warm_up(self) -> threading.Thread:
+        """Lanza la detección en un hilo en segundo plano"""
+        thread = threading.Thread(target=self.get, name='encoder-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+encoder_registry = EncoderCapabilityRegistry()
+
+# Concede un slot sólo al primero de la cola global si cabe en el presupuesto.
+# KEYS: leases, waiters. ARGV: ahora, token, peso, presupuesto, ttl, prefijo de latidos
+_REDIS_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZADD', KEYS[3], now + tonumber(ARGV[6]), ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+while true do
+    local head = redis.call('ZRANGE', KEYS[2], 0, 0)
+    if #head == 0 or redis.call('ZSCORE', KEYS[3], head[1]) then
+        break
+    end
+    redis.call('ZREM', KEYS[2], head[1])
+end
+local head = redis.call('ZRANGE', KEYS[2], 0, 0)
+if head[1] ~= ARGV[2] then
+    return 0
+end
+local used = 0
+for _, lease in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    used = used + tonumber(string.match(lease, ':(%d+)$'))
+end
+if used + tonumber(ARGV[3]) > tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('ZREM', KEYS[3], ARGV[2])
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[5]), ARGV[2] .. ':' .. ARGV[3])
+return 1
+"""
+
+class _RedisSlots:
+    """Semáforo con prioridades compartido por todos los procesos a través de Redis.
+
+    Por recurso se usan tres conjuntos ordenados: permisos concedidos (hasta su
+    caducidad), cola de espera (por prioridad y llegada) y latidos de los que
+    esperan, que el script renueva en cada intento; quien deja de renovarlo
+    (proceso muerto) sale de la cola. Todas las claves se pasan en ``KEYS`` y
+    comparten etiqueta de hash para que el script funcione en Redis Cluster.
+    """
+    def __init__(self, url: str, prefix: str = 'hls:scheduler'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._acquire = self.client.register_script(_REDIS_ACQUIRE_SCRIPT)
+
+    def _keys(self, resource: str) -> List[str]:
+        return [f'{self.prefix}:{{{resource}}}:{name}' for name in ('leases', 'waiters', 'heartbeats')]
+
+    def acquire(self, resource: str, token: str, priority: int, weight: int, budget: int):
+        keys = self._keys(resource)
+        # Orden global: prioridad y, a igual prioridad, llegada
+        self.client.zadd(keys[1], {token: priority * 1e10 + time.time()}, nx=True)
+        while True:
+            args = [time.time(), token, weight, budget, SCHEDULER_LEASE_TTL, SCHEDULER_POLL_INTERVAL * 10 + 1]
+            if self._acquire(keys=keys, args=args):
+                return
+            time.sleep(SCHEDULER_POLL_INTERVAL)
+
+    def release(self, resource: str, token: str, weight: int):
+        self.client.zrem(self._keys(resource)[0], f'{token}:{weight}')
+
+class EncodeScheduler:
+    """Planificador de proceso que reparte un presupuesto fijo de codificadores.
+
+    Cada proceso ffmpeg de codificación pide un permiso (``lease``) indicando
+    el recurso (``cpu`` o ``gpu``), su prioridad y su peso en slots (un grafo
+    que codifica N variantes pesa N). Los permisos se conceden por orden de
+    prioridad y llegada sin superar nunca el presupuesto, y cada uno recibe un
+    número de hilos de ffmpeg proporcional a su peso para no sobresuscribir
+    los núcleos. Con ``HLS_SCHEDULER_REDIS_URL`` el presupuesto es común a
+    todos los procesos y nodos; si no, es por proceso. Un proceso hijo que
+    trabaja bajo un permiso de su padre (ver ``_run_chunks_locally``) marca
+    ``parent_lease`` y no vuelve a pedir slots.
+    """
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, int]] = None,
+        threads: int = ENCODE_THREADS,
+        redis_url: Optional[str] = SCHEDULER_REDIS_URL
+    ):
+        self.budgets = budgets or {'cpu': ENCODE_SLOTS, 'gpu': GPU_ENCODE_SLOTS}
+        self.threads = threads
+        self.redis_url = redis_url
+        self._reset()
+
+    def _reset(self):
+        # También tras un fork: el hijo no hereda los permisos del padre ni un
+        # lock que otro hilo tuviera tomado en ese instante
+        self.parent_lease = False
+        self._condition = threading.Condition()
+        self._waiting: Dict[str, List[Tuple[int, int]]] = {resource: [] for resource in self.budgets}
+        self._in_use = {resource: 0 for resource in self.budgets}
+        self._peak = {resource: 0 for resource in self.budgets}
+        self._sequence = itertools.count()
+        self._redis: Optional[_RedisSlots] = None
+
+    def _redis_slots(self) -> Optional[_RedisSlots]:
+        if self.redis_url and self._redis is None:
+            try:
+                self._redis = _RedisSlots(self.redis_url)
+            except ImportError:
+                logger.warning("redis no está instalado, el presupuesto de codificación será por proceso")
+                self.redis_url = None
+        return self._redis
+
+    def threads_for(self, resource: str, weight: int) -> Optional[int]:
+        """Hilos de ffmpeg para un permiso; los codificadores por hardware no los necesitan"""
+        if resource != 'cpu':
+            return None
+        return max(1, self.threads * weight // self.budgets['cpu'])
+
+    @contextmanager
+    def lease(self, resource: str = 'cpu', priority: int = PRIORITY_NORMAL, weight: int = 1):
+        """Espera un permiso de codificación y devuelve los hilos que puede usar ffmpeg"""
+        budget = self.budgets[resource]
+        weight = max(1, min(weight, budget))
+        if self.parent_lease:
+            # El proceso padre ya ocupa los slots de todo el pool
+            yield self.threads_for(resource, weight)
+            return
+        entry = (priority, next(self._sequence))
+        queue = self._waiting[resource]
+        with self._condition:
+            heapq.heappush(queue, entry)
+            while queue[0] != entry or self._in_use[resource] + weight > budget:
+                self._condition.wait()
+            heapq.heappop(queue)
+            self._in_use[resource] += weight
+            self._peak[resource] = max(self._peak[resource], self._in_use[resource])
+            # Puede haber sitio para el siguiente de la cola
+            self._condition.notify_all()
+
+        token = uuid.uuid4().hex
+        redis_slots = None
+        try:
+            redis_slots = self._redis_slots()
+            if redis_slots is not None:
+                redis_slots.acquire(resource, token, priority, weight, budget)
+            yield self.threads_for(resource, weight)
+        finally:
+            if redis_slots is not None:
+                try:
+                    redis_slots.release(resource, token, weight)
+                except Exception as e:
+                    logger.warning(f"No se pudo liberar el slot en Redis: {str(e)}")
+            with self._condition:
+                self._in_use[resource] -= weight
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Slots en uso, máximo alcanzado y permisos en espera por recurso (en este proceso)"""
+        with self._condition:
+            return {
+                resource: {
+                    'budget': self.budgets[resource],
+                    'in_use': self._in_use[resource],
+                    'peak': self._peak[resource],
+                    'waiting': len(self._waiting[resource]),
+                }
+                for resource in self.budgets
+            }
+
+encode_scheduler = EncodeScheduler()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=encode_scheduler._reset)
+
 def get_video_encoder_settings(force_nvidia=False, force_amd=False, force_cpu=False) -> EncoderSettings:
     """Determina los ajustes de codificación según la disponibilidad de GPU"""
     if force_cpu:
@@ -195,7 +848,7 @@ def get_video_encoder_settings(force_nvidia=False, force_amd=False, force_cpu=Fa
     # Si hay forzado específico, primero intentar verificar que funcione realmente
     if force_nvidia:
         logger.info("Comprobando disponibilidad de codificador NVIDIA forzado")
-        gpu_info = _detect_gpus_with_ffmpeg()
+        gpu_info = encoder_registry.ffmpeg_encoders()
         if gpu_info['nvidia']:
             logger.info("Forzando uso de codificador NVIDIA (verificado)")
             return EncoderSettings(codec='h264_nvenc', preset='p4')
@@ -205,7 +858,7 @@ def get_video_encoder_settings(force_nvidia=False, force_amd=False, force_cpu=Fa
     
     if force_amd:
         logger.info("Comprobando disponibilidad de codificador AMD forzado")
-        gpu_info = _detect_gpus_with_ffmpeg()
+        gpu_info = encoder_registry.ffmpeg_encoders()
         if gpu_info['amd']:
             logger.info("Forzando uso de codificador AMD (verificado)")
             return EncoderSettings(codec='h264_amf', quality='balanced')
@@ -213,8 +866,8 @@ def get_video_encoder_settings(force_nvidia=False, force_amd=False, force_cpu=Fa
             logger.warning("Codificador AMD forzado no está disponible, usando CPU")
             return EncoderSettings(codec='libx264', preset='medium')
     
-    # Si no se fuerza ningún codificador, detectar automáticamente
-    gpu_info = detect_gpus()
+    # Si no se fuerza ningún codificador, usar la detección cacheada
+    gpu_info = encoder_registry.gpus()
     
     if gpu_info['nvidia']:
         logger.info("GPU NVIDIA detectada, usando aceleración por hardware NVENC")
@@ -226,68 +879,377 @@ def get_video_encoder_settings(force_nvidia=False, force_amd=False, force_cpu=Fa
         logger.info("No se detectó GPU compatible, usando codificación por CPU")
         return EncoderSettings(codec='libx264', preset='medium')
 
-def get_video_resolution(input_path: str) -> Tuple[int, int]:
-    """Obtiene la resolución original del video usando ffprobe"""
+@dataclass(frozen=True)
+class MediaInfo:
+    """Metadatos de un archivo multimedia obtenidos con una única llamada a ffprobe"""
+    streams: Tuple[Dict[str, Any], ...]
+    width: int
+    height: int
+    duration: float  # segundos
+    fps: float
+    video_codec: Optional[str]
+    audio_codec: Optional[str]
+    bitrate: int  # bits por segundo
+    has_audio: bool
+
+    @property
+    def has_video(self) -> bool:
+        return self.video_codec is not None
+
+    @property
+    def video_stream(self) -> Optional[Dict[str, Any]]:
+        return next((s for s in self.streams if s.get('codec_type') == 'video'), None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Representación serializable en JSON (para guardarla o enviarla a un worker)"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MediaInfo':
+        return cls(**{**data, 'streams': tuple(data.get('streams', ()))})
+
+def _parse_frame_rate(value: Optional[str]) -> float:
+    """Convierte una tasa de ffprobe del tipo '30000/1001' a float"""
     try:
-        probe = ffmpeg.probe(input_path)
-        video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
-        if video_stream is None:
-            raise ValueError("No se encontró una pista de video en el archivo")
-            
-        width = int(video_stream['width'])
-        height = int(video_stream['height'])
-        logger.info(f"Resolución original del video: {width}x{height}")
-        return width, height
+        num, _, den = (value or '0/1').partition('/')
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def probe_media(input_path: str) -> Optional[MediaInfo]:
+    """Ejecuta ffprobe una sola vez y devuelve los metadatos del archivo, o None si no es legible"""
+    try:
+        with metrics.span('probe'):
+            probe = ffmpeg.probe(input_path)
     except Exception as e:
-        logger.error(f"Error al obtener la resolución del video: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.error(f"Error al analizar el archivo con ffprobe: {str(e)}")
+        return None
+    return _media_info_from_probe(probe)
+
+def _mp4_index_at_end(data: bytes) -> bool:
+    """Indica si un MP4/MOV tiene el índice (``moov``) detrás de los datos (``mdat``).
+
+    Esos archivos son válidos pero no se pueden leer hasta tener el final.
+    """
+    offset = 0
+    while offset + 8 <= len(data):
+        size = int.from_bytes(data[offset:offset + 4], 'big')
+        box = data[offset + 4:offset + 8]
+        if box == b'moov':
+            return False
+        if box == b'mdat':
+            return True
+        if size == 1 and offset + 16 <= len(data):
+            size = int.from_bytes(data[offset + 8:offset + 16], 'big')
+        if size < 8:
+            return False
+        offset += size
+    return False
+
+def validate_prefix(input_path: str, length: int) -> Tuple[bool, Optional[MediaInfo]]:
+    """Analiza los primeros ``length`` bytes de un archivo que aún se está recibiendo.
+
+    Devuelve ``(válido, media_info)``. Un MP4 con el índice al final es válido
+    pero ``media_info`` es None: hay que esperar al archivo completo para
+    convertirlo.
+    """
+    with open(input_path, 'rb') as f:
+        data = f.read(length)
+    cmd = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', '-i', 'pipe:0']
+    try:
+        with metrics.span('probe'):
+            result = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        media_info = _media_info_from_probe(json.loads(result.stdout))
+        if media_info.has_video:
+            return True, media_info
+    except (subprocess.CalledProcessError, ValueError) as e:
+        logger.debug(f"ffprobe no pudo leer el inicio del archivo: {str(e)}")
+    if data[4:8] == b'ftyp' and _mp4_index_at_end(data):
+        logger.info("MP4 con el índice al final: se convertirá cuando termine la subida")
+        return True, None
+    logger.error(f"El inicio del archivo no es un video válido: {input_path}")
+    return False, None
+
+def _media_info_from_probe(probe: Dict[str, Any]) -> MediaInfo:
+    streams = tuple(probe.get('streams', []))
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    fmt = probe.get('format', {})
+
+    duration = float(fmt.get('duration') or (video_stream or {}).get('duration') or 0)
+    fps = 0.0
+    if video_stream:
+        fps = _parse_frame_rate(video_stream.get('avg_frame_rate')) or _parse_frame_rate(video_stream.get('r_frame_rate'))
+
+    media_info = MediaInfo(
+        streams=streams,
+        width=int(video_stream['width']) if video_stream else 0,
+        height=int(video_stream['height']) if video_stream else 0,
+        duration=duration,
+        fps=fps,
+        video_codec=video_stream.get('codec_name') if video_stream else None,
+        audio_codec=audio_stream.get('codec_name') if audio_stream else None,
+        bitrate=int(fmt.get('bit_rate') or 0),
+        has_audio=audio_stream is not None
+    )
+    logger.info(
+        f"Archivo analizado: {media_info.width}x{media_info.height} {media_info.video_codec}, "
+        f"{media_info.duration:.1f}s a {media_info.fps:.2f} fps, audio: {media_info.audio_codec or 'no'}"
+    )
+    return media_info
+
+def get_video_resolution(input_path: str, media_info: Optional[MediaInfo] = None) -> Tuple[int, int]:
+    """Obtiene la resolución original del video usando ffprobe"""
+    media_info = media_info or probe_media(input_path)
+    if media_info is None or not media_info.has_video:
+        logger.error("No se encontró una pista de video en el archivo")
         # Valor predeterminado alto para procesar todas las resoluciones
         logger.warning("Usando resolución predeterminada de 1920x1080")
         return 1920, 1080
 
+    logger.info(f"Resolución original del video: {media_info.width}x{media_info.height}")
+    return media_info.width, media_info.height
+
 def is_low_resolution(width: int, height: int) -> bool:
     """Determina si el video tiene una resolución baja (menor que 480p)"""
     return height < 480 and width < 854
 
-def is_valid_video_file(input_path: str) -> bool:
+def is_valid_video_file(input_path: str, media_info: Optional[MediaInfo] = None) -> bool:
     """Verifica si el archivo de entrada es un video válido"""
+    media_info = media_info or probe_media(input_path)
+    return media_info is not None and media_info.has_video
+
+def _hls_output_args(output_dir: str, resolution_name: str, segment_format: str = 'ts') -> Dict[str, Any]:
+    """Argumentos HLS de salida comunes a todas las variantes.
+
+    Con ``segment_format='fmp4'`` cada variante se escribe en un único archivo
+    MP4 fragmentado (CMAF) y la playlist direcciona cada segmento con
+    ``EXT-X-BYTERANGE``, en lugar de cientos de archivos ``.ts``.
+    """
+    if segment_format not in SEGMENT_FORMATS:
+        raise ValueError(f"Formato de segmento no soportado: {segment_format}")
+    if segment_format == 'fmp4':
+        return {
+            'f': 'hls',
+            'hls_time': str(HLS_TIME),
+            'hls_list_size': '0',
+            'hls_playlist_type': 'vod',
+            'hls_segment_type': 'fmp4',
+            'hls_flags': 'single_file',
+            'hls_segment_filename': os.path.join(output_dir, f'{resolution_name}.mp4')
+        }
+    return {
+        'f': 'hls',
+        'hls_time': str(HLS_TIME),
+        'hls_list_size': '0',
+        'hls_segment_filename': os.path.join(output_dir, f'{resolution_name}_%03d.ts')
+    }
+
+def _is_single_file_playlist(playlist_path: str) -> bool:
+    """Indica si la playlist direcciona rangos de un único archivo (modo fMP4)"""
     try:
-        probe = ffmpeg.probe(input_path, select_streams='v')
-        video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
-        return video_stream is not None
-    except Exception as e:
-        logger.error(f"Error al validar el archivo de video: {str(e)}")
+        with open(playlist_path) as f:
+            return '#EXT-X-BYTERANGE' in f.read()
+    except OSError:
         return False
 
+def _checkpoint_path(output_dir: str, resolution_name: str) -> str:
+    return os.path.join(output_dir, f'{resolution_name}.checkpoint.json')
+
+def _source_fingerprint(input_path: str) -> str:
+    """Identifica el archivo fuente para no reanudar con segmentos de otro video"""
+    st = os.stat(input_path)
+    return f"{os.path.basename(input_path)}:{st.st_size}:{st.st_mtime_ns}"
+
+def _read_playlist_segments(playlist_path: str) -> List[Tuple[float, str]]:
+    """Devuelve (duración, nombre) de cada segmento de una playlist de variante"""
+    segments = []
+    duration = None
+    try:
+        with open(playlist_path) as f:
+            for line in f.read().splitlines():
+                if line.startswith('#EXTINF:'):
+                    duration = float(line[len('#EXTINF:'):].split(',')[0])
+                elif line and not line.startswith('#') and duration is not None:
+                    segments.append((duration, line))
+                    duration = None
+    except (OSError, ValueError):
+        pass
+    return segments
+
+def _write_checkpoint(
+    input_path: str,
+    output_dir: str,
+    resolution_name: str,
+    bitrate: str,
+    segments: List[Dict[str, Any]],
+    complete: bool = False
+):
+    path = _checkpoint_path(output_dir, resolution_name)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump({
+            'source': _source_fingerprint(input_path),
+            'bitrate': bitrate,
+            'complete': complete,
+            'segments': segments
+        }, f)
+    os.replace(f"{path}.tmp", path)
+
+def load_checkpoint(input_path: str, output_dir: str, resolution_name: str, bitrate: str) -> Optional[Dict[str, Any]]:
+    """Lee el manifiesto de checkpoint de una variante si corresponde a esta fuente y bitrate"""
+    try:
+        with open(_checkpoint_path(output_dir, resolution_name)) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get('source') != _source_fingerprint(input_path) or checkpoint.get('bitrate') != bitrate:
+        return None
+
+    # Un checkpoint completo sólo es válido si todos sus segmentos siguen intactos
+    if checkpoint.get('complete'):
+        for segment in checkpoint['segments']:
+            path = os.path.join(output_dir, segment['name'])
+            if not os.path.isfile(path) or os.path.getsize(path) != segment['size']:
+                checkpoint['complete'] = False
+                break
+    return checkpoint
+
+def is_rendition_complete(input_path: str, output_dir: str, resolution_name: str, bitrate: str) -> bool:
+    checkpoint = load_checkpoint(input_path, output_dir, resolution_name, bitrate)
+    return bool(checkpoint and checkpoint['complete'])
+
+def is_rendition_partial(input_path: str, output_dir: str, resolution_name: str, bitrate: str) -> bool:
+    """Indica si una conversión anterior de la variante quedó a medias y puede reanudarse"""
+    checkpoint = load_checkpoint(input_path, output_dir, resolution_name, bitrate)
+    playlist_path = os.path.join(output_dir, f'{resolution_name}.m3u8')
+    return bool(checkpoint and not checkpoint['complete']
+                and not _is_single_file_playlist(playlist_path)
+                and _read_playlist_segments(playlist_path))
+
+def prepare_resume(
+    input_path: str,
+    output_dir: str,
+    resolution_name: str,
+    bitrate: str
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Prepara la conversión de una variante reanudando tras el último segmento verificado.
+
+    Verifica los segmentos de la playlist que ffmpeg fue escribiendo en el
+    intento anterior, guarda el checkpoint y devuelve los argumentos de
+    entrada y salida de ffmpeg para continuar desde ese punto. Si no hay nada
+    que reanudar, registra un checkpoint vacío y la conversión empieza de cero.
+    Las variantes fMP4 de un solo archivo no se pueden ampliar y siempre se
+    rehacen completas.
+    """
+    checkpoint = load_checkpoint(input_path, output_dir, resolution_name, bitrate)
+    verified = []
+    if checkpoint is not None and not _is_single_file_playlist(os.path.join(output_dir, f'{resolution_name}.m3u8')):
+        for duration, name in _read_playlist_segments(os.path.join(output_dir, f'{resolution_name}.m3u8')):
+            path = os.path.join(output_dir, name)
+            if not os.path.isfile(path) or os.path.getsize(path) == 0:
+                break
+            verified.append({'name': name, 'duration': duration, 'size': os.path.getsize(path)})
+
+    _write_checkpoint(input_path, output_dir, resolution_name, bitrate, verified)
+    if not verified:
+        return {}, {}
+
+    # Dejar en la playlist sólo los segmentos verificados para que ffmpeg añada los siguientes
+    resume_time = sum(segment['duration'] for segment in verified)
+    target_duration = math.ceil(max(segment['duration'] for segment in verified))
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{target_duration}', '#EXT-X-MEDIA-SEQUENCE:0']
+    for segment in verified:
+        lines += [f"#EXTINF:{segment['duration']:.6f},", segment['name']]
+    with open(os.path.join(output_dir, f'{resolution_name}.m3u8'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    logger.info(f"Reanudando {resolution_name} desde {resume_time:.1f}s (segmento {len(verified)})")
+    input_args = {'ss': resume_time}
+    output_args = {
+        'output_ts_offset': resume_time,
+        'start_number': len(verified),
+        'hls_flags': 'append_list+discont_start'
+    }
+    return input_args, output_args
+
+def complete_checkpoint(input_path: str, output_dir: str, resolution_name: str, bitrate: str):
+    """Marca la variante como completa registrando todos sus segmentos"""
+    segments = []
+    for duration, name in _read_playlist_segments(os.path.join(output_dir, f'{resolution_name}.m3u8')):
+        if segments and segments[-1]['name'] == name:
+            # fMP4: todos los rangos pertenecen al mismo archivo
+            segments[-1]['duration'] += duration
+            continue
+        path = os.path.join(output_dir, name)
+        segments.append({'name': name, 'duration': duration, 'size': os.path.getsize(path)})
+    _write_checkpoint(input_path, output_dir, resolution_name, bitrate, segments, complete=True)
+
+def original_bitrate(height: int) -> str:
+    """Bitrate con el que se codifica un video en su resolución original"""
+    if height >= 1080:
+        return '5000k'
+    elif height >= 720:
+        return '3000k'
+    elif height >= 480:
+        return '1000k'
+    return '800k'
+
+def standard_ladder(width: int, height: int, rescale: bool = True) -> List[Tuple[int, int, str]]:
+    """Resoluciones estándar y sus bitrates según la resolución original.
+
+    Vacía si no se rescala, si el video es de baja resolución o si es
+    cuadrado o vertical: entonces sólo se procesa la resolución original.
+    """
+    if not rescale or width <= height:
+        return []
+    if height >= 1080:
+        return [(1920, 1080, '5000k'), (1280, 720, '3000k'), (854, 480, '1000k')]
+    elif height >= 720:
+        return [(1280, 720, '3000k'), (854, 480, '1000k')]
+    elif height >= 480:
+        return [(854, 480, '1000k')]
+    return []
+
 def segment_original_video(
     input_path: str, 
     output_dir: str, 
-    encoder_settings: EncoderSettings
+    encoder_settings: EncoderSettings,
+    media_info: Optional[MediaInfo] = None,
+    progress: Optional[ProgressTracker] = None,
+    segment_format: str = 'ts',
+    stream_copy: bool = False,
+    priority: int = PRIORITY_NORMAL
 ) -> Tuple[bool, int, int, str]:
-    """Divide el video original en segmentos HLS sin cambiar la resolución"""
+    """Divide el video original en segmentos HLS sin cambiar la resolución.
+
+    Con ``stream_copy`` la fuente se remultiplexa sin recodificar cuando es
+    compatible (ver ``can_stream_copy``).
+    """
     os.makedirs(output_dir, exist_ok=True)
     
     # Obtener la resolución original
-    width, height = get_video_resolution(input_path)
+    media_info = media_info or probe_media(input_path)
+    duration = media_info.duration if media_info else 0
+    width, height = get_video_resolution(input_path, media_info)
     resolution_name = f"{height}p"
     
     # Obtener un bitrate adecuado según la resolución
-    if height >= 1080:
-        bitrate = '5000k'
-    elif height >= 720:
-        bitrate = '3000k'
-    elif height >= 480:
-        bitrate = '1000k'
-    else:
-        bitrate = '800k'
+    bitrate = original_bitrate(height)
     
     output_path = os.path.join(output_dir, f'{resolution_name}.m3u8')
-    segment_pattern = os.path.join(output_dir, f'{resolution_name}_%03d.ts')
+
+    copy_bitrate = source_video_bitrate(media_info)
+    if stream_copy and copy_bitrate and can_stream_copy(input_path, media_info, (width, height)):
+        if remux_rendition(input_path, output_dir, (width, height), copy_bitrate, media_info, progress, True, segment_format):
+            return True, width, height, copy_bitrate
+        metrics.inc('cinecloud_fallbacks_total', {'kind': 'remux'})
+        logger.warning("El remux sin recodificar falló. Recodificando la resolución original.")
+
+    if is_rendition_complete(input_path, output_dir, resolution_name, bitrate):
+        logger.info(f"La variante {resolution_name} ya estaba completa, se omite")
+        return True, width, height, bitrate
     
     try:
-        # Configurar stream de entrada
-        stream = ffmpeg.input(input_path)
-        
         # Obtener configuración del codificador
         encoder_args = encoder_settings.get_output_args()
         
@@ -296,10 +1258,7 @@ def segment_original_video(
             'b:v': bitrate,
             'c:a': 'aac',
             'b:a': '128k',
-            'f': 'hls',
-            'hls_time': '10',
-            'hls_list_size': '0',
-            'hls_segment_filename': segment_pattern,
+            **_hls_output_args(output_dir, resolution_name, segment_format),
             **encoder_args  # Integrar los argumentos del codificador
         }
         
@@ -308,25 +1267,28 @@ def segment_original_video(
         logger.info(f"Argumentos de salida: {output_args}")
         
         def segment_video():
-            # Generar el comando para poder imprimirlo en caso de error
-            cmd = ffmpeg.output(stream, output_path, **output_args)
-            logger.debug(f"Comando ffmpeg: {cmd.compile()}")
-            
-            try:
-                stdout, stderr = cmd.run(
-                    capture_stdout=True, 
-                    capture_stderr=True,
-                    overwrite_output=True
-                )
-                return stdout, stderr
-            except ffmpeg.Error as e:
-                # Mostrar la salida de error completa de ffmpeg
-                if e.stderr:
-                    logger.error(f"Error de ffmpeg: {e.stderr.decode('utf-8', errors='replace')}")
-                raise
+            # Cada intento continúa tras el último segmento verificado
+            input_args, resume_args = prepare_resume(input_path, output_dir, resolution_name, bitrate)
+            stream = ffmpeg.input(input_path, **input_args)
+
+            with encode_scheduler.lease(encoder_settings.resource, priority) as threads:
+                # Generar el comando para poder imprimirlo en caso de error
+                thread_args = {'threads': threads} if threads else {}
+                cmd = ffmpeg.output(stream, output_path, **output_args, **resume_args, **thread_args)
+                logger.debug(f"Comando ffmpeg: {cmd.compile()}")
+                
+                try:
+                    run_ffmpeg(cmd, duration, _rendition_progress(progress, [resolution_name]))
+                except ffmpeg.Error as e:
+                    # Mostrar la salida de error completa de ffmpeg
+                    if e.stderr:
+                        logger.error(f"Error de ffmpeg: {e.stderr.decode('utf-8', errors='replace')}")
+                    raise
         
         # Ejecutar con reintentos
-        safe_execute(segment_video)
+        with metrics.span('encode', duration, rendition=resolution_name):
+            safe_execute(segment_video)
+        complete_checkpoint(input_path, output_dir, resolution_name, bitrate)
         return True, width, height, bitrate
     except Exception as e:
         logger.error(f"Error durante la segmentación: {str(e)}")
@@ -338,37 +1300,35 @@ def convert_to_resolution(
     output_dir: str, 
     resolution: Tuple[int, int], 
     bitrate: str, 
-    encoder_settings: EncoderSettings
+    encoder_settings: EncoderSettings,
+    media_info: Optional[MediaInfo] = None,
+    progress: Optional[ProgressTracker] = None,
+    include_audio: bool = True,
+    segment_format: str = 'ts',
+    priority: int = PRIORITY_NORMAL
 ) -> bool:
-    """Convierte el video a una resolución específica usando el codificador disponible"""
+    """Convierte el video a una resolución específica usando el codificador disponible.
+
+    Con ``include_audio=False`` se genera una variante sólo de video que usa la
+    pista de audio compartida.
+    """
     width, height = resolution
     resolution_name = f"{height}p"
     os.makedirs(output_dir, exist_ok=True)
     
     output_path = os.path.join(output_dir, f'{resolution_name}.m3u8')
-    segment_pattern = os.path.join(output_dir, f'{resolution_name}_%03d.ts')
+
+    if is_rendition_complete(input_path, output_dir, resolution_name, bitrate):
+        logger.info(f"La variante {resolution_name} ya estaba completa, se omite")
+        return True
     
     try:
-        # Configurar stream de entrada
-        stream = ffmpeg.input(input_path)
-        
         # Verificar si el stream de entrada tiene audio
-        has_audio = False
-        try:
-            probe = ffmpeg.probe(input_path)
-            for stream_info in probe['streams']:
-                if stream_info['codec_type'] == 'audio':
-                    has_audio = True
-                    break
-        except Exception as e:
-            logger.warning(f"No se pudo verificar la presencia de audio: {str(e)}")
-        
-        # Separar los streams de video y audio si hay audio
-        video_stream = stream.video
-        
-        # Aplicar escala manteniendo la relación de aspecto (solo al video)
-        scaled_stream = video_stream.filter('scale', width=width, height=height, force_original_aspect_ratio='decrease')
-        padded_stream = scaled_stream.filter('pad', width=width, height=height, x='(ow-iw)/2', y='(oh-ih)/2')
+        media_info = media_info or probe_media(input_path)
+        has_audio = include_audio and media_info is not None and media_info.has_audio
+        duration = media_info.duration if media_info else 0
+        if not has_audio and include_audio:
+            logger.warning(f"No se detectó audio en el video. Procesando solo video.")
         
         # Obtener configuración del codificador
         encoder_args = encoder_settings.get_output_args()
@@ -376,75 +1336,894 @@ def convert_to_resolution(
         # Configurar los argumentos de salida
         output_args = {
             'b:v': bitrate,
-            'f': 'hls',
-            'hls_time': '10',
-            'hls_list_size': '0',
-            'hls_segment_filename': segment_pattern,
+            **_hls_output_args(output_dir, resolution_name, segment_format),
             **encoder_args  # Integrar los argumentos del codificador
         }
         
         # Añadir configuración de audio si existe
         if has_audio:
-            audio_stream = stream.audio
             output_args['c:a'] = 'aac'
             output_args['b:a'] = '128k'
             
-            def convert_with_audio():
-                cmd = ffmpeg.output(padded_stream, audio_stream, output_path, **output_args)
+        def convert():
+            # Cada intento continúa tras el último segmento verificado
+            input_args, resume_args = prepare_resume(input_path, output_dir, resolution_name, bitrate)
+            stream = ffmpeg.input(input_path, **input_args)
+
+            # Aplicar escala manteniendo la relación de aspecto (solo al video)
+            scaled_stream = stream.video.filter('scale', width=width, height=height, force_original_aspect_ratio='decrease')
+            padded_stream = scaled_stream.filter('pad', width=width, height=height, x='(ow-iw)/2', y='(oh-ih)/2')
+
+            streams = [padded_stream, stream.audio] if has_audio else [padded_stream]
+            with encode_scheduler.lease(encoder_settings.resource, priority) as threads:
+                thread_args = {'threads': threads} if threads else {}
+                cmd = ffmpeg.output(*streams, output_path, **output_args, **resume_args, **thread_args)
                 logger.debug(f"Comando ffmpeg: {cmd.compile()}")
                 
                 try:
-                    stdout, stderr = cmd.run(
-                        capture_stdout=True, 
-                        capture_stderr=True,
-                        overwrite_output=True
-                    )
-                    return stdout, stderr
+                    run_ffmpeg(cmd, duration, _rendition_progress(progress, [resolution_name]))
                 except ffmpeg.Error as e:
                     if e.stderr:
                         logger.error(f"Error de ffmpeg: {e.stderr.decode('utf-8', errors='replace')}")
                     raise
-            
-            # Ejecutar con reintentos
-            safe_execute(convert_with_audio)
+        
+        # Ejecutar con reintentos
+        with metrics.span('encode', duration, rendition=resolution_name):
+            safe_execute(convert)
+        complete_checkpoint(input_path, output_dir, resolution_name, bitrate)
+        return True
+    except Exception as e:
+        logger.error(f"Error durante la conversión a {resolution_name}: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+def source_video_bitrate(media_info: Optional[MediaInfo]) -> Optional[str]:
+    """Bitrate del video de la fuente en el formato de la escalera ('4500k')"""
+    if media_info is None or media_info.video_stream is None:
+        return None
+    bps = int(media_info.video_stream.get('bit_rate') or media_info.bitrate or 0)
+    return f"{max(1, bps // 1000)}k" if bps else None
+
+def _simulate_segments(keyframes: List[float], duration: float, hls_time: float = HLS_TIME) -> List[float]:
+    """Duraciones de los segmentos que produciría el muxer HLS cortando sólo en fotogramas clave"""
+    if not keyframes:
+        return [duration]
+    durations = []
+    segment_start = keyframes[0]
+    for keyframe in keyframes[1:]:
+        if keyframe - segment_start >= hls_time:
+            durations.append(keyframe - segment_start)
+            segment_start = keyframe
+    durations.append(max(0.0, duration - segment_start))
+    return durations
+
+def can_stream_copy(
+    input_path: str,
+    media_info: Optional[MediaInfo],
+    resolution: Tuple[int, int],
+    max_bitrate: Optional[str] = None
+) -> bool:
+    """Indica si el video se puede segmentar con ``-c copy`` para la variante indicada.
+
+    Requiere códec, perfil y formato de píxel reproducibles en cualquier
+    cliente HLS, la misma resolución que la variante y fotogramas clave lo
+    bastante regulares para que ningún segmento se aleje de ``HLS_TIME`` más
+    de ``COPY_SEGMENT_TOLERANCE``.
+    """
+    video = media_info.video_stream if media_info else None
+    if video is None or (media_info.width, media_info.height) != tuple(resolution):
+        return False
+    if video.get('codec_name') not in COPY_VIDEO_CODECS:
+        return False
+    if video.get('profile') not in COPY_PROFILES or video.get('pix_fmt') not in COPY_PIX_FMTS:
+        logger.info(f"Perfil {video.get('profile')} / {video.get('pix_fmt')} no apto para remux")
+        return False
+
+    bitrate = source_video_bitrate(media_info)
+    if max_bitrate and bitrate and int(bitrate[:-1]) > int(max_bitrate[:-1]) * COPY_MAX_BITRATE_RATIO:
+        logger.info(f"Bitrate de la fuente ({bitrate}) demasiado alto para sustituir a {max_bitrate}")
+        return False
+
+    try:
+        keyframes = get_keyframe_times(input_path)
+    except Exception as e:
+        logger.warning(f"No se pudieron leer los fotogramas clave: {str(e)}")
+        return False
+    durations = _simulate_segments(keyframes, media_info.duration)
+    # El último segmento también cuenta: sin fotogramas clave al final, ffmpeg lo alarga hasta el final del video
+    longest = max(durations)
+    if longest > HLS_TIME * (1 + COPY_SEGMENT_TOLERANCE):
+        logger.info(f"Fotogramas clave demasiado espaciados para remux (segmento de {longest:.1f}s)")
+        return False
+    return True
+
+def remux_rendition(
+    input_path: str,
+    output_dir: str,
+    resolution: Tuple[int, int],
+    bitrate: str,
+    media_info: Optional[MediaInfo] = None,
+    progress: Optional[ProgressTracker] = None,
+    include_audio: bool = True,
+    segment_format: str = 'ts'
+) -> bool:
+    """Segmenta el video sin recodificarlo (``-c:v copy``) como variante de la escalera"""
+    width, height = resolution
+    resolution_name = f"{height}p"
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f'{resolution_name}.m3u8')
+
+    if is_rendition_complete(input_path, output_dir, resolution_name, bitrate):
+        logger.info(f"La variante {resolution_name} ya estaba completa, se omite")
+        return True
+
+    media_info = media_info or probe_media(input_path)
+    duration = media_info.duration if media_info else 0
+    has_audio = include_audio and media_info is not None and media_info.has_audio
+
+    output_args = {
+        'c:v': 'copy',
+        **_hls_output_args(output_dir, resolution_name, segment_format)
+    }
+    if has_audio:
+        # El audio AAC se copia; cualquier otro códec se convierte (es barato frente al video)
+        if media_info.audio_codec == 'aac':
+            output_args['c:a'] = 'copy'
         else:
-            logger.warning(f"No se detectó audio en el video. Procesando solo video.")
-            
-            def convert_without_audio():
-                cmd = ffmpeg.output(padded_stream, output_path, **output_args)
+            output_args['c:a'] = 'aac'
+            output_args['b:a'] = '128k'
+
+    def remux():
+        input_args, resume_args = prepare_resume(input_path, output_dir, resolution_name, bitrate)
+        stream = ffmpeg.input(input_path, **input_args)
+        streams = [stream.video, stream.audio] if has_audio else [stream.video]
+        cmd = ffmpeg.output(*streams, output_path, **output_args, **resume_args)
+        logger.debug(f"Comando ffmpeg: {cmd.compile()}")
+
+        try:
+            run_ffmpeg(cmd, duration, _rendition_progress(progress, [resolution_name]))
+        except ffmpeg.Error as e:
+            if e.stderr:
+                logger.error(f"Error de ffmpeg: {e.stderr.decode('utf-8', errors='replace')}")
+            raise
+
+    try:
+        logger.info(f"Remux de {resolution_name} sin recodificar el video...")
+        with metrics.span('remux', duration, rendition=resolution_name):
+            safe_execute(remux)
+        complete_checkpoint(input_path, output_dir, resolution_name, bitrate)
+        return True
+    except Exception as e:
+        logger.error(f"Error durante el remux de {resolution_name}: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+def _rendition_names(
+    resolutions: List[Tuple[int, int, str]],
+    audio_renditions: Optional[List[Tuple[str, str]]] = None
+) -> List[Tuple[str, str]]:
+    """Nombre y bitrate de cada playlist de variante (video y audio)"""
+    return [(f"{height}p", bitrate) for _, height, bitrate in resolutions] + list(audio_renditions or [])
+
+def _audio_output(output_dir: str, name: str, bitrate: str, segment_format: str = 'ts') -> Tuple[str, Dict[str, Any]]:
+    """Ruta de la playlist y argumentos de salida de una pista HLS sólo de audio"""
+    output_args = {
+        'c:a': 'aac',
+        'b:a': bitrate,
+        **_hls_output_args(output_dir, name, segment_format)
+    }
+    return os.path.join(output_dir, f'{name}.m3u8'), output_args
+
+def encode_audio_rendition(
+    input_path: str,
+    output_dir: str,
+    name: str,
+    bitrate: str,
+    media_info: Optional[MediaInfo] = None,
+    progress: Optional[ProgressTracker] = None,
+    segment_format: str = 'ts'
+) -> bool:
+    """Codifica la pista de audio compartida por las variantes de video"""
+    os.makedirs(output_dir, exist_ok=True)
+    if is_rendition_complete(input_path, output_dir, name, bitrate):
+        logger.info(f"La pista {name} ya estaba completa, se omite")
+        return True
+
+    media_info = media_info or probe_media(input_path)
+    duration = media_info.duration if media_info else 0
+    output_path, output_args = _audio_output(output_dir, name, bitrate, segment_format)
+
+    def encode():
+        input_args, resume_args = prepare_resume(input_path, output_dir, name, bitrate)
+        stream = ffmpeg.input(input_path, **input_args)
+        cmd = ffmpeg.output(stream.audio, output_path, **output_args, **resume_args)
+        logger.debug(f"Comando ffmpeg: {cmd.compile()}")
+
+        try:
+            run_ffmpeg(cmd, duration, _rendition_progress(progress, [name]))
+        except ffmpeg.Error as e:
+            if e.stderr:
+                logger.error(f"Error de ffmpeg: {e.stderr.decode('utf-8', errors='replace')}")
+            raise
+
+    try:
+        with metrics.span('audio', duration, rendition=name):
+            safe_execute(encode)
+        complete_checkpoint(input_path, output_dir, name, bitrate)
+        return True
+    except Exception as e:
+        logger.error(f"Error durante la codificación de la pista {name}: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+def _trickplay_size(media_info: Optional[MediaInfo]) -> Tuple[int, int]:
+    """Tamaño de cada miniatura manteniendo la relación de aspecto de la fuente"""
+    if media_info is None or not media_info.width or not media_info.height:
+        return TRICKPLAY_WIDTH, TRICKPLAY_WIDTH * 9 // 16
+    height = max(2, round(TRICKPLAY_WIDTH * media_info.height / media_info.width / 2) * 2)
+    return TRICKPLAY_WIDTH, height
+
+def _trickplay_output(video_stream, output_dir: str, media_info: Optional[MediaInfo]):
+    """Rama del grafo de ffmpeg que escribe los sprites de miniaturas"""
+    width, height = _trickplay_size(media_info)
+    columns, rows = TRICKPLAY_GRID
+    output_args = {'f': 'image2', 'start_number': 0}
+    if TRICKPLAY_FORMAT == 'webp':
+        output_args.update({'c:v': 'libwebp', 'quality': 75})
+    else:
+        output_args['q:v'] = 5
+    sprites = (
+        video_stream
+        .filter('fps', fps=f'1/{TRICKPLAY_INTERVAL:g}')
+        .filter('scale', width, height)
+        .filter('tile', f'{columns}x{rows}')
+    )
+    return ffmpeg.output(sprites, os.path.join(output_dir, f'sprite_%03d.{TRICKPLAY_FORMAT}'), **output_args)
+
+def _remove_trickplay(output_dir: str):
+    paths = [os.path.join(output_dir, TRICKPLAY_VTT), os.path.join(output_dir, TRICKPLAY_SOURCE)]
+    for path in paths + glob.glob(os.path.join(output_dir, 'sprite_[0-9]*.*')):
+        if os.path.exists(path):
+            os.remove(path)
+
+def trickplay_complete(output_dir: str, input_path: str) -> bool:
+    """Indica si las miniaturas de ``output_dir`` están completas y salieron de ``input_path``"""
+    # La pista WebVTT se escribe al final, cuando los sprites ya están completos
+    if not os.path.isfile(os.path.join(output_dir, TRICKPLAY_VTT)):
+        return False
+    try:
+        with open(os.path.join(output_dir, TRICKPLAY_SOURCE)) as f:
+            return json.load(f).get('source') == _source_fingerprint(input_path)
+    except (OSError, ValueError, AttributeError):
+        return False
+
+def write_trickplay_vtt(output_dir: str, media_info: Optional[MediaInfo], input_path: Optional[str] = None) -> bool:
+    """Escribe la pista WebVTT que indexa cada miniatura dentro de su sprite.
+
+    Con ``input_path`` se guarda antes la huella de la fuente para que
+    ``trickplay_complete`` no dé por buenas las miniaturas de otro video.
+    """
+    sheets = sorted(glob.glob(os.path.join(output_dir, f'sprite_[0-9]*.{TRICKPLAY_FORMAT}')))
+    if not sheets or media_info is None or media_info.duration <= 0:
+        return False
+
+    def timestamp(seconds):
+        hours, rest = divmod(seconds, 3600)
+        minutes, seconds = divmod(rest, 60)
+        return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+    width, height = _trickplay_size(media_info)
+    columns, rows = TRICKPLAY_GRID
+    per_sheet = columns * rows
+    count = min(math.ceil(media_info.duration / TRICKPLAY_INTERVAL), len(sheets) * per_sheet)
+    lines = ['WEBVTT', '']
+    for index in range(count):
+        start = index * TRICKPLAY_INTERVAL
+        end = min(start + TRICKPLAY_INTERVAL, media_info.duration)
+        sheet = os.path.basename(sheets[index // per_sheet])
+        column, row = (index % per_sheet) % columns, (index % per_sheet) // columns
+        lines += [
+            f"{timestamp(start)} --> {timestamp(end)}",
+            f"{sheet}#xywh={column * width},{row * height},{width},{height}",
+            ''
+        ]
+    if input_path and os.path.isfile(input_path):
+        with open(os.path.join(output_dir, TRICKPLAY_SOURCE), 'w') as f:
+            json.dump({'source': _source_fingerprint(input_path)}, f)
+    vtt_path = os.path.join(output_dir, TRICKPLAY_VTT)
+    with open(f"{vtt_path}.tmp", 'w') as f:
+        f.write('\n'.join(lines))
+    os.replace(f"{vtt_path}.tmp", vtt_path)
+    return True
+
+def generate_trickplay(input_path: str, output_dir: str, media_info: Optional[MediaInfo] = None) -> bool:
+    """Genera los sprites y su pista WebVTT en una pasada aparte.
+
+    Se usa cuando la conversión no pasó por el grafo de decodificación única
+    (remux, por fragmentos o por resolución). Sólo se decodifican los
+    fotogramas clave, por lo que cada miniatura corresponde al fotograma
+    clave más cercano.
+    """
+    media_info = media_info or probe_media(input_path)
+    _remove_trickplay(output_dir)
+    stream = ffmpeg.input(input_path, skip_frame='nokey')
+    cmd = _trickplay_output(stream.video, output_dir, media_info)
+    try:
+        with metrics.span('trickplay'):
+            run_ffmpeg(cmd)
+        return write_trickplay_vtt(output_dir, media_info, input_path)
+    except Exception as e:
+        logger.error(f"Error al generar las miniaturas: {str(e)}")
+        return False
+
+def convert_all_resolutions(
+    input_path: str,
+    output_dir: str,
+    resolutions: List[Tuple[int, int, str]],
+    encoder_settings: EncoderSettings,
+    media_info: Optional[MediaInfo] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    name_suffix: str = '',
+    threads: Optional[int] = None,
+    progress: Optional[ProgressTracker] = None,
+    audio_renditions: Optional[List[Tuple[str, str]]] = None,
+    segment_format: str = 'ts',
+    trickplay: bool = False,
+    priority: int = PRIORITY_NORMAL,
+    input_feed: Optional[Iterable[bytes]] = None
+) -> bool:
+    """Convierte el video a todas las resoluciones en un único proceso ffmpeg.
+
+    El video se decodifica una sola vez y se reparte con el filtro ``split``
+    entre una rama scale/pad por resolución, escribiendo cada playlist de
+    variante en la misma ejecución. Con ``start``/``end`` sólo se convierte ese
+    tramo del video (modo por fragmentos), manteniendo las marcas de tiempo
+    originales en los segmentos. Si se indican ``audio_renditions`` las
+    variantes de video no llevan audio y éste se codifica una sola vez en
+    cada pista de audio indicada. Con ``trickplay`` la misma decodificación
+    alimenta también los sprites de miniaturas. El proceso ocupa en el
+    planificador un slot por variante de video. Con ``input_feed`` el video
+    se lee por la entrada estándar a medida que llega (ver ``process_stream``)
+    y las playlists se publican como ``EVENT`` mientras crecen; requiere
+    ``media_info`` y no deja checkpoints.
+    """
+    if not resolutions:
+        return False
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        # Configurar stream de entrada
+        input_args = {}
+        if start:
+            input_args['ss'] = start
+        if end is not None:
+            input_args['to'] = end
+        stream = ffmpeg.input('pipe:0' if input_feed is not None else input_path, **input_args)
+
+        # Verificar si el stream de entrada tiene audio
+        media_info = media_info or probe_media(input_path)
+        has_audio = media_info is not None and media_info.has_audio
+        duration = media_info.duration if media_info else 0
+        live_args = {'hls_playlist_type': 'event'} if input_feed is not None else {}
+        checkpoints = not name_suffix and input_feed is None
+
+        # Una sola decodificación repartida entre todas las ramas
+        trickplay = trickplay and not name_suffix
+        branches = stream.video.filter_multi_output('split', len(resolutions) + (1 if trickplay else 0))
+        encoder_args = encoder_settings.get_output_args()
+
+        # Las salidas de video se crean al ejecutar, con los hilos del permiso del planificador
+        video_outputs = []
+        outputs = []
+        for index, (width, height, bitrate) in enumerate(resolutions):
+            resolution_name = f"{height}p{name_suffix}"
+            output_path = os.path.join(output_dir, f'{resolution_name}.m3u8')
+
+            scaled_stream = branches.stream(index).filter('scale', width=width, height=height, force_original_aspect_ratio='decrease')
+            padded_stream = scaled_stream.filter('pad', width=width, height=height, x='(ow-iw)/2', y='(oh-ih)/2')
+
+            output_args = {
+                'b:v': bitrate,
+                **_hls_output_args(output_dir, resolution_name, segment_format),
+                **live_args,
+                **encoder_args
+            }
+            if start:
+                output_args['output_ts_offset'] = start
+
+            streams = [padded_stream]
+            if has_audio and audio_renditions is None:
+                streams.append(stream.audio)
+                output_args['c:a'] = 'aac'
+                output_args['b:a'] = '128k'
+            video_outputs.append((streams, output_path, output_args))
+
+        # Pistas de audio compartidas, codificadas una sola vez
+        if has_audio:
+            for name, audio_bitrate in audio_renditions or []:
+                audio_path, audio_args = _audio_output(output_dir, f"{name}{name_suffix}", audio_bitrate, segment_format)
+                if start:
+                    audio_args['output_ts_offset'] = start
+                outputs.append(ffmpeg.output(stream.audio, audio_path, **audio_args, **live_args))
+        renditions = _rendition_names(resolutions, audio_renditions if has_audio else None)
+
+        if trickplay:
+            _remove_trickplay(output_dir)
+            outputs.append(_trickplay_output(branches.stream(len(resolutions)), output_dir, media_info))
+
+        # Los fragmentos se ejecutan en otros procesos y no informan de su progreso
+        on_progress = None if name_suffix else _rendition_progress(progress, [name for name, _ in renditions])
+
+        def convert_all():
+            with encode_scheduler.lease(encoder_settings.resource, priority, len(resolutions)) as lease_threads:
+                # Los hilos del permiso se reparten entre las variantes del grafo
+                variant_threads = threads or (max(1, lease_threads // len(resolutions)) if lease_threads else None)
+                thread_args = {'threads': variant_threads} if variant_threads else {}
+                cmd = ffmpeg.merge_outputs(*[
+                    ffmpeg.output(*streams, output_path, **output_args, **thread_args)
+                    for streams, output_path, output_args in video_outputs
+                ], *outputs)
                 logger.debug(f"Comando ffmpeg: {cmd.compile()}")
-                
+
                 try:
-                    stdout, stderr = cmd.run(
-                        capture_stdout=True, 
-                        capture_stderr=True,
-                        overwrite_output=True
-                    )
-                    return stdout, stderr
+                    run_ffmpeg(cmd, duration, on_progress, stdin_feed=input_feed)
                 except ffmpeg.Error as e:
                     if e.stderr:
                         logger.error(f"Error de ffmpeg: {e.stderr.decode('utf-8', errors='replace')}")
                     raise
-            
-            # Ejecutar con reintentos
-            safe_execute(convert_without_audio)
-        
+
+        # Checkpoints vacíos: si el proceso se interrumpe, cada variante se reanuda por separado
+        if checkpoints:
+            for name, bitrate in renditions:
+                _write_checkpoint(input_path, output_dir, name, bitrate, [])
+
+        logger.info(f"Convirtiendo a {', '.join(f'{r[1]}p' for r in resolutions)} con una sola decodificación...")
+        # Un único intento: si el grafo falla se recurre al método por resolución
+        with metrics.span('chunk' if name_suffix else 'encode', (end or duration) - (start or 0), rendition='all'):
+            safe_execute(convert_all, max_retries=1)
+        if checkpoints:
+            for name, bitrate in renditions:
+                complete_checkpoint(input_path, output_dir, name, bitrate)
+        if trickplay:
+            write_trickplay_vtt(output_dir, media_info, input_path)
         return True
     except Exception as e:
-        logger.error(f"Error durante la conversión a {resolution_name}: {str(e)}")
+        logger.error(f"Error durante la conversión con decodificación única: {str(e)}")
         logger.error(traceback.format_exc())
         return False
 
+def get_keyframe_times(input_path: str) -> List[float]:
+    """Obtiene los instantes (en segundos) de los fotogramas clave del video sin decodificarlo"""
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', input_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    keyframes = []
+    for line in result.stdout.decode().splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+def plan_chunks(
+    keyframes: List[float],
+    duration: float,
+    num_chunks: int
+) -> List[Tuple[float, Optional[float]]]:
+    """Divide la duración en tramos de tamaño similar que empiezan en fotogramas clave"""
+    boundaries = [0.0]
+    for index in range(1, num_chunks):
+        target = duration * index / num_chunks
+        keyframe = min(keyframes, key=lambda t: abs(t - target), default=None)
+        if keyframe is not None and keyframe - boundaries[-1] >= MIN_CHUNK_DURATION and duration - keyframe >= MIN_CHUNK_DURATION:
+            boundaries.append(keyframe)
+    # El último tramo llega hasta el final del archivo
+    return list(zip(boundaries, boundaries[1:] + [None]))
+
+def encode_chunk(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte un tramo del video a todas las resoluciones.
+
+    Recibe y devuelve sólo datos serializables en JSON para poder ejecutarse en
+    un ``ProcessPoolExecutor`` o enviarse a un worker remoto con acceso al mismo
+    almacenamiento.
+    """
+    success = convert_all_resolutions(
+        chunk['input_path'],
+        chunk['output_dir'],
+        [tuple(r) for r in chunk['resolutions']],
+        EncoderSettings(**chunk['encoder']),
+        MediaInfo.from_dict(chunk['media_info']) if chunk.get('media_info') else None,
+        start=chunk['start'],
+        end=chunk['end'],
+        name_suffix=f"_c{chunk['index']:03d}",
+        threads=chunk.get('threads'),
+        audio_renditions=[tuple(a) for a in chunk['audio_renditions']] if chunk.get('audio_renditions') is not None else None,
+        priority=chunk.get('priority', PRIORITY_NORMAL)
+    )
+    return {'index': chunk['index'], 'success': success}
+
+def _use_parent_lease():
+    encode_scheduler.parent_lease = True
+
+def _run_chunks_locally(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Ejecuta los fragmentos en paralelo en un pool de procesos.
+
+    El permiso del planificador lo pide este proceso para todo el pool: cada
+    fragmento codifica todas sus variantes a la vez, así que sólo se ejecutan
+    simultáneamente los fragmentos que caben en los slots concedidos.
+    """
+    resource = EncoderSettings(**chunks[0]['encoder']).resource
+    variants = len(chunks[0]['resolutions'])
+    budget = encode_scheduler.budgets[resource]
+    workers = max(1, min(len(chunks), budget // variants))
+    with encode_scheduler.lease(resource, chunks[0].get('priority', PRIORITY_NORMAL), workers * variants) as threads:
+        if threads:
+            chunks = [{**chunk, 'threads': max(1, threads // (workers * variants))} for chunk in chunks]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_use_parent_lease) as executor:
+            return list(executor.map(encode_chunk, chunks))
+
+def stitch_chunk_playlists(output_dir: str, resolution_name: str, num_chunks: int) -> bool:
+    """Une las playlists de los fragmentos en una única playlist de variante.
+
+    Los segmentos se renombran con numeración global (``{resolution_name}_%03d.ts``)
+    para que la secuencia sea continua, y se marca ``EXT-X-DISCONTINUITY`` en
+    cada cambio de fragmento porque el codificador se reinicia en ese punto.
+    """
+    segments = []
+    for index in range(num_chunks):
+        chunk_playlist = os.path.join(output_dir, f'{resolution_name}_c{index:03d}.m3u8')
+        if not os.path.exists(chunk_playlist):
+            logger.error(f"Falta la playlist del fragmento {chunk_playlist}")
+            return False
+        with open(chunk_playlist) as f:
+            duration = None
+            for line in f.read().splitlines():
+                if line.startswith('#EXTINF:'):
+                    duration = float(line[len('#EXTINF:'):].split(',')[0])
+                elif line and not line.startswith('#') and duration is not None:
+                    segments.append((index, duration, line))
+                    duration = None
+
+    if not segments:
+        return False
+
+    target_duration = math.ceil(max(duration for _, duration, _ in segments))
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{target_duration}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD'
+    ]
+    previous_chunk = segments[0][0]
+    for sequence, (chunk_index, duration, uri) in enumerate(segments):
+        if chunk_index != previous_chunk:
+            lines.append('#EXT-X-DISCONTINUITY')
+            previous_chunk = chunk_index
+        segment_name = f'{resolution_name}_{sequence:03d}.ts'
+        os.replace(os.path.join(output_dir, uri), os.path.join(output_dir, segment_name))
+        lines.append(f'#EXTINF:{duration:.6f},')
+        lines.append(segment_name)
+    lines.append('#EXT-X-ENDLIST')
+
+    with open(os.path.join(output_dir, f'{resolution_name}.m3u8'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    for index in range(num_chunks):
+        os.remove(os.path.join(output_dir, f'{resolution_name}_c{index:03d}.m3u8'))
+    return True
+
+def convert_in_chunks(
+    input_path: str,
+    output_dir: str,
+    resolutions: List[Tuple[int, int, str]],
+    encoder_settings: EncoderSettings,
+    media_info: MediaInfo,
+    num_chunks: int,
+    chunk_runner: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+    audio_renditions: Optional[List[Tuple[str, str]]] = None,
+    priority: int = PRIORITY_NORMAL
+) -> bool:
+    """Convierte el video por tramos en paralelo y une el resultado en playlists continuas.
+
+    ``chunk_runner`` recibe la lista de fragmentos y devuelve sus resultados; por
+    defecto se usa un pool de procesos local, pero puede sustituirse por uno que
+    reparta los fragmentos entre varios nodos. Cada fragmento lleva su parte
+    de los núcleos en ``threads``; los slots de codificación los concede el
+    planificador (ver ``_run_chunks_locally``).
+    """
+    try:
+        keyframes = get_keyframe_times(input_path)
+    except Exception as e:
+        logger.error(f"No se pudieron obtener los fotogramas clave: {str(e)}")
+        return False
+
+    ranges = plan_chunks(keyframes, media_info.duration, num_chunks)
+    if len(ranges) < 2:
+        logger.info("El video es demasiado corto para dividirlo en fragmentos")
+        return False
+
+    # Repartir los núcleos entre los fragmentos para no sobresuscribir la CPU
+    cpu_count = os.cpu_count() or 2
+    threads = max(1, cpu_count // min(len(ranges), cpu_count))
+    chunks = [
+        {
+            'index': index,
+            'input_path': input_path,
+            'output_dir': output_dir,
+            'start': start,
+            'end': end,
+            'resolutions': [list(r) for r in resolutions],
+            'audio_renditions': [list(a) for a in audio_renditions] if audio_renditions is not None else None,
+            'encoder': {'codec': encoder_settings.codec, 'preset': encoder_settings.preset, 'quality': encoder_settings.quality},
+            'media_info': media_info.to_dict(),
+            'threads': threads,
+            'priority': priority
+        }
+        for index, (start, end) in enumerate(ranges)
+    ]
+
+    logger.info(f"Convirtiendo el video en {len(chunks)} fragmentos en paralelo...")
+    try:
+        results = (chunk_runner or _run_chunks_locally)(chunks)
+        failed = [r['index'] for r in results if not r['success']]
+        if failed:
+            logger.error(f"Fragmentos fallidos: {failed}")
+        else:
+            renditions = _rendition_names(resolutions, audio_renditions)
+            with metrics.span('stitch'):
+                stitched = all(stitch_chunk_playlists(output_dir, name, len(chunks)) for name, _ in renditions)
+            if stitched:
+                for name, bitrate in renditions:
+                    complete_checkpoint(input_path, output_dir, name, bitrate)
+                return True
+    except Exception as e:
+        logger.error(f"Error al ejecutar los fragmentos: {str(e)}")
+        logger.error(traceback.format_exc())
+
+    # Eliminar los restos de los fragmentos antes de recurrir a otro método
+    for path in glob.glob(os.path.join(output_dir, '*_c[0-9][0-9][0-9]*')):
+        os.remove(path)
+    return False
+
+def _jit_manifest_path(output_dir: str, resolution_name: str) -> str:
+    return os.path.join(output_dir, f'{resolution_name}.jit.json')
+
+def _keep_jit_source(input_path: str, output_dir: str) -> str:
+    """Conserva la fuente junto a la salida (enlace duro o copia) y devuelve su nombre"""
+    name = JIT_SOURCE_NAME + os.path.splitext(input_path)[1].lower()
+    target = os.path.join(output_dir, name)
+    if not os.path.exists(target):
+        try:
+            os.link(input_path, target)
+        except OSError:
+            shutil.copy2(input_path, target)
+    return name
+
+def prepare_jit_renditions(
+    input_path: str,
+    output_dir: str,
+    top_resolution: Tuple[int, int, str],
+    resolutions: List[Tuple[int, int, str]]
+) -> List[Tuple[int, int, str]]:
+    """Publica variantes cuyos segmentos se codifican la primera vez que se piden.
+
+    Las playlists se sintetizan a partir de la de ``top_resolution``: cada
+    segmento cubre exactamente el mismo intervalo que en la variante superior,
+    así el reproductor puede cambiar de calidad en cualquier frontera. Cada
+    variante guarda en ``{nombre}.jit.json`` el intervalo de sus segmentos
+    (ver ``generate_jit_segment``). Devuelve las variantes publicadas.
+    """
+    top_name = f"{top_resolution[1]}p"
+    top_playlist = os.path.join(output_dir, f'{top_name}.m3u8')
+    try:
+        with open(top_playlist) as f:
+            lines = f.read().splitlines()
+    except OSError as e:
+        logger.error(f"No se pudo leer la playlist de {top_name}: {str(e)}")
+        return []
+    if '#EXT-X-ENDLIST' not in lines or _is_single_file_playlist(top_playlist):
+        logger.warning(f"La playlist de {top_name} no admite variantes bajo demanda")
+        return []
+
+    try:
+        source = _keep_jit_source(input_path, output_dir)
+    except OSError as e:
+        logger.error(f"No se pudo conservar la fuente para las variantes bajo demanda: {str(e)}")
+        return []
+
+    segment_re = re.compile(rf'^{re.escape(top_name)}_(\d+)\.ts$')
+    published = []
+    for width, height, bitrate in resolutions:
+        name = f"{height}p"
+        playlist = []
+        segments = {}
+        start = 0.0
+        duration = None
+        for line in lines:
+            if line.startswith('#EXTINF:'):
+                duration = float(line[len('#EXTINF:'):].split(',')[0])
+            match = segment_re.match(line)
+            if match and duration is not None:
+                line = f'{name}_{match.group(1)}.ts'
+                segments[line] = [round(start, 6), duration]
+                start += duration
+                duration = None
+            playlist.append(line)
+
+        # Los segmentos de una codificación anterior pueden tener otro bitrate
+        for path in glob.glob(os.path.join(output_dir, f'{name}_[0-9]*.ts')):
+            os.remove(path)
+        with open(_jit_manifest_path(output_dir, name), 'w') as f:
+            json.dump({'source': source, 'width': width, 'height': height, 'bitrate': bitrate, 'segments': segments}, f)
+        with open(os.path.join(output_dir, f'{name}.m3u8'), 'w') as f:
+            f.write('\n'.join(playlist) + '\n')
+        published.append((width, height, bitrate))
+        logger.info(f"Variante {name} publicada bajo demanda ({len(segments)} segmentos)")
+    return published
+
+_jit_locks = [threading.Lock() for _ in range(JIT_LOCK_STRIPES)]
+
+@contextmanager
+def _coalesce(path: str):
+    """Serializa la generación de ``path`` entre hilos y, con flock, entre procesos.
+
+    El archivo ``{path}.lock`` no se borra al terminar: si desapareciera, quien
+    ya esperaba sobre él y quien abriera uno nuevo podrían entrar a la vez.
+    """
+    with _jit_locks[hash(path) % JIT_LOCK_STRIPES]:
+        try:
+            import fcntl
+        except ImportError:
+            # Sin flock (Windows) sólo se agrupan las peticiones del mismo proceso
+            yield
+            return
+        lock_path = f'{path}.lock'
+        with open(lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+def generate_jit_segment(
+    output_dir: str,
+    filename: str,
+    encoder_settings: Optional[EncoderSettings] = None
+) -> bool:
+    """Codifica un segmento de una variante bajo demanda si aún no existe.
+
+    Las peticiones simultáneas del mismo segmento esperan a una única
+    codificación. El segmento se codifica desde la fuente conservada con las
+    marcas de tiempo desplazadas a su inicio, de modo que encaja en la
+    línea temporal de la variante.
+    """
+    match = JIT_SEGMENT_RE.match(filename)
+    target = os.path.join(output_dir, filename)
+    if match is None or os.path.exists(target):
+        return match is not None
+    try:
+        with open(_jit_manifest_path(output_dir, match.group(1))) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if filename not in manifest['segments']:
+        return False
+
+    name = match.group(1)
+    start, duration = manifest['segments'][filename]
+    width, height = manifest['width'], manifest['height']
+    with _coalesce(target):
+        if os.path.exists(target):
+            return True
+        # Temporal propio de este intento: nunca se escribe sobre el de otro proceso
+        temp_path = f'{target}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+        try:
+            encoder_settings = encoder_settings or get_video_encoder_settings()
+            stream = ffmpeg.input(os.path.join(output_dir, manifest['source']), ss=start, t=duration)
+            scaled_stream = stream.video.filter('scale', width=width, height=height, force_original_aspect_ratio='decrease')
+            padded_stream = scaled_stream.filter('pad', width=width, height=height, x='(ow-iw)/2', y='(oh-ih)/2')
+            output_args = {
+                'b:v': manifest['bitrate'],
+                **encoder_settings.get_output_args(),
+                'f': 'mpegts',
+                'output_ts_offset': start
+            }
+            # Alguien está esperando el segmento: se antepone a las codificaciones de ingesta
+            with metrics.span('jit', duration, rendition=name), \
+                    encode_scheduler.lease(encoder_settings.resource, PRIORITY_INTERACTIVE) as threads:
+                thread_args = {'threads': threads} if threads else {}
+                run_ffmpeg(ffmpeg.output(padded_stream, temp_path, **output_args, **thread_args))
+            os.replace(temp_path, target)
+            return True
+        except Exception as e:
+            stderr = e.stderr.decode('utf-8', errors='replace') if isinstance(e, ffmpeg.Error) and e.stderr else str(e)
+            logger.error(f"Error al codificar bajo demanda {filename}: {stderr}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+
+def _avc1_codec(profile: Optional[str], level: int) -> str:
+    """Valor ``avc1.PPCCLL`` de un flujo H.264; ffprobe da el nivel multiplicado por 10"""
+    return f"avc1.{AVC_PROFILE_CODES.get(profile, AVC_PROFILE_CODES['High'])}{level:02X}"
+
+def _default_avc_level(height: int) -> int:
+    """Nivel suficiente para una variante de esta altura hasta 60 fps (si no se puede analizar)"""
+    for max_height, level in ((480, 31), (720, 32), (1080, 42), (1440, 51)):
+        if height <= max_height:
+            return level
+    return 52
+
+def _first_segment(playlist_path: str) -> Optional[str]:
+    """Primer archivo multimedia de una playlist de variante (el init de EXT-X-MAP en fMP4)"""
+    try:
+        with open(playlist_path) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('#EXT-X-MAP:') and 'URI="' in line:
+                    return os.path.join(os.path.dirname(playlist_path), line.split('URI="', 1)[1].split('"', 1)[0])
+                if line and not line.startswith('#'):
+                    return os.path.join(os.path.dirname(playlist_path), line)
+    except OSError:
+        pass
+    return None
+
+def _variant_codecs(output_dir: str, height: int, audio_group: bool, probe: bool = True) -> Optional[str]:
+    """Valor del atributo CODECS de una variante de video del master playlist.
+
+    El perfil y el nivel se leen del primer segmento de la variante. Si no se
+    puede analizar (variantes bajo demanda o en curso) se declara H.264 High con
+    un nivel suficiente para su altura, o nada si tampoco se sabe qué audio lleva.
+    """
+    video = audio = None
+    segment = _first_segment(os.path.join(output_dir, f'{height}p.m3u8')) if probe else None
+    if segment and os.path.exists(segment):
+        try:
+            streams = ffmpeg.probe(segment)['streams']
+            video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+            audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        except Exception as e:
+            logger.debug(f"No se pudo analizar {segment}: {str(e)}")
+
+    if video is not None and video.get('codec_name') == 'h264' and int(video.get('level') or 0) > 0:
+        codecs = [_avc1_codec(video.get('profile'), int(video['level']))]
+    elif audio_group:
+        codecs = [_avc1_codec('High', _default_avc_level(height))]
+    else:
+        return None
+    if audio_group:
+        codecs.append('mp4a.40.2')  # las pistas del grupo se codifican en AAC-LC
+    elif audio is not None and audio.get('codec_name') == 'aac':
+        codecs.append(AAC_CODECS.get(audio.get('profile'), 'mp4a.40.2'))
+    return ','.join(codecs)
+
 def create_master_playlist(
     output_dir: str, 
-    available_resolutions: List[Tuple[int, int, str]]
+    available_resolutions: List[Tuple[int, int, str]],
+    audio_renditions: Optional[List[Tuple[str, str]]] = None,
+    check_files: bool = True
 ) -> bool:
-    """Crea el archivo master playlist.m3u8 con las resoluciones disponibles"""
+    """Crea el archivo master playlist.m3u8 con las resoluciones disponibles.
+
+    Con ``audio_renditions`` la primera pista se declara con ``EXT-X-MEDIA`` y
+    las variantes de video la referencian; el resto se publican como variantes
+    sólo de audio. Cada variante de video declara ``CODECS`` con el perfil y el
+    nivel H.264 de su primer segmento. Con ``check_files=False`` se incluyen
+    variantes cuya playlist aún no existe (conversiones en curso).
+    """
     if not available_resolutions:
         logger.error("No hay resoluciones disponibles para crear el master playlist")
         return False
     
     master_playlist = "#EXTM3U\n"
+
+    audio_group = ''
+    audio_bitrate_value = 0
+    audio_only_variants = []
+    if audio_renditions:
+        audio_name, audio_bitrate = audio_renditions[0]
+        audio_bitrate_value = int(audio_bitrate.replace('k', '000'))
+        audio_group = ',AUDIO="audio"'
+        master_playlist += f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio",NAME="Principal",DEFAULT=YES,AUTOSELECT=YES,URI="{audio_name}.m3u8"\n'
+        audio_only_variants = audio_renditions[1:]
     
     # Ordenar resoluciones de mayor a menor para el playlist
     resolutions_sorted = sorted(available_resolutions, key=lambda x: x[1], reverse=True)
@@ -455,19 +2234,25 @@ def create_master_playlist(
         
         # Verificar que el archivo de la resolución específica existe
         resolution_file = os.path.join(output_dir, f'{height}p.m3u8')
-        if not os.path.exists(resolution_file):
+        if check_files and not os.path.exists(resolution_file):
             logger.warning(f"El archivo {resolution_file} no existe, se omitirá del master playlist")
             continue
         
-        master_playlist += f"#EXT-X-STREAM-INF:BANDWIDTH={bitrate_value},RESOLUTION={width}x{height}\n"
+        codecs = _variant_codecs(output_dir, height, bool(audio_group), probe=check_files)
+        codecs = f',CODECS="{codecs}"' if codecs else ''
+        master_playlist += f"#EXT-X-STREAM-INF:BANDWIDTH={bitrate_value + audio_bitrate_value},RESOLUTION={width}x{height}{codecs}{audio_group}\n"
         master_playlist += f"{height}p.m3u8\n"
+
+    for name, bitrate in audio_only_variants:
+        master_playlist += f'#EXT-X-STREAM-INF:BANDWIDTH={int(bitrate.replace("k", "000"))},CODECS="mp4a.40.2"\n'
+        master_playlist += f"{name}.m3u8\n"
     
     os.makedirs(output_dir, exist_ok=True)
     logger.info("Creando playlist master...")
     playlist_path = os.path.join(output_dir, 'playlist.m3u8')
     
     try:
-        with open(playlist_path, 'w') as f:
+        with metrics.span('playlist'), open(playlist_path, 'w') as f:
             f.write(master_playlist)
         logger.info(f"Master playlist creado en: {playlist_path}")
         return True
@@ -479,15 +2264,20 @@ def create_master_playlist(
 def fallback_to_original(
     input_path: str, 
     output_dir: str, 
-    encoder_settings: EncoderSettings
+    encoder_settings: EncoderSettings,
+    media_info: Optional[MediaInfo] = None,
+    progress: Optional[ProgressTracker] = None,
+    segment_format: str = 'ts',
+    priority: int = PRIORITY_NORMAL
 ) -> bool:
     """Función de respaldo que intenta procesar el video en su resolución original"""
+    metrics.inc('cinecloud_fallbacks_total', {'kind': 'original'})
     logger.warning("Usando método de respaldo para procesar el video con libx264 (CPU)")
     try:
         # Usar explícitamente el codificador de CPU
         cpu_encoder = EncoderSettings(codec='libx264', preset='medium')
         
-        success, width, height, bitrate = segment_original_video(input_path, output_dir, cpu_encoder)
+        success, width, height, bitrate = segment_original_video(input_path, output_dir, cpu_encoder, media_info, progress, segment_format, priority=priority)
         if success:
             create_master_playlist(output_dir, [(width, height, bitrate)])
             logger.info("El método de respaldo se completó correctamente")
@@ -496,7 +2286,7 @@ def fallback_to_original(
             # Intentar con el codificador más básico posible
             logger.warning("Intentando con codificador de último recurso...")
             basic_encoder = EncoderSettings(codec='libx264', preset='ultrafast')
-            success, width, height, bitrate = segment_original_video(input_path, output_dir, basic_encoder)
+            success, width, height, bitrate = segment_original_video(input_path, output_dir, basic_encoder, media_info, progress, segment_format, priority=priority)
             if success:
                 create_master_playlist(output_dir, [(width, height, bitrate)])
                 logger.info("El método de respaldo con codificador básico se completó correctamente")
@@ -509,89 +2299,334 @@ def fallback_to_original(
         logger.error(traceback.format_exc())
         return False
 
+def _ladder_cache_path(output_dir: str) -> str:
+    return os.path.join(output_dir, 'ladder.json')
+
+def measure_complexity(input_path: str, media_info: Optional[MediaInfo] = None) -> Optional[float]:
+    """Estima la complejidad del contenido con una codificación CRF rápida a 360p.
+
+    Codifica ``LADDER_SAMPLES`` muestras repartidas por el video y devuelve el
+    bitrate medio resultante respecto a ``LADDER_REFERENCE_KBPS``: menos de 1
+    para contenido estático y más de 1 para contenido con mucho movimiento o
+    detalle. Devuelve None si el análisis falla.
+    """
+    media_info = media_info or probe_media(input_path)
+    if media_info is None or media_info.duration <= 0:
+        return None
+
+    duration = media_info.duration
+    sample_duration = min(LADDER_SAMPLE_DURATION, duration)
+    samples = max(1, min(LADDER_SAMPLES, int(duration // sample_duration)))
+    total_bits = 0
+    total_seconds = 0.0
+    with tempfile.TemporaryDirectory(prefix='hls_ladder_') as tmp:
+        for index in range(samples):
+            start = max(0.0, duration * (index + 0.5) / samples - sample_duration / 2)
+            sample_path = os.path.join(tmp, f'sample_{index}.h264')
+            stream = ffmpeg.input(input_path, ss=start, t=sample_duration)
+            cmd = ffmpeg.output(
+                stream.video.filter('scale', -2, 360), sample_path,
+                vcodec='libx264', preset='veryfast', crf=LADDER_PROBE_CRF, an=None, f='h264'
+            )
+            try:
+                run_ffmpeg(cmd)
+            except ffmpeg.Error as e:
+                logger.warning(f"Falló la codificación de sondeo en {start:.1f}s: {e.stderr.decode('utf-8', errors='replace') if e.stderr else e}")
+                continue
+            total_bits += os.path.getsize(sample_path) * 8
+            total_seconds += sample_duration
+
+    if not total_seconds:
+        return None
+    kbps = total_bits / total_seconds / 1000
+    complexity = kbps / LADDER_REFERENCE_KBPS
+    logger.info(f"Complejidad del contenido: {complexity:.2f} (sondeo a {kbps:.0f} kbps)")
+    return complexity
+
+def per_title_ladder(
+    input_path: str,
+    output_dir: str,
+    resolutions: List[Tuple[int, int, str]],
+    media_info: Optional[MediaInfo] = None
+) -> List[Tuple[int, int, str]]:
+    """Ajusta la escalera fija a la complejidad del título.
+
+    Los bitrates se escalan por la complejidad medida (limitada entre
+    ``LADDER_MIN_FACTOR`` y ``LADDER_MAX_FACTOR``). El contenido simple omite
+    las variantes intermedias, que apenas aportan calidad, y el complejo
+    añade ``LADDER_EXTRA_RUNG`` para las conexiones lentas. El resultado se
+    guarda en ``ladder.json`` para que una conversión reanudada use los mismos
+    bitrates que sus checkpoints.
+    """
+    cache_path = _ladder_cache_path(output_dir)
+    source = _source_fingerprint(input_path)
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached.get('source') == source and cached.get('base') == [list(r) for r in resolutions]:
+            return [tuple(r) for r in cached['resolutions']]
+    except (OSError, ValueError):
+        pass
+
+    with metrics.span('ladder'):
+        complexity = measure_complexity(input_path, media_info)
+    if complexity is None:
+        logger.warning("No se pudo analizar la complejidad. Se usa la escalera fija.")
+        return resolutions
+    factor = min(LADDER_MAX_FACTOR, max(LADDER_MIN_FACTOR, complexity))
+
+    rungs = list(resolutions)
+    if factor < LADDER_SIMPLE_FACTOR and len(rungs) > 2:
+        rungs = [rungs[0], rungs[-1]]
+    elif factor > LADDER_COMPLEX_FACTOR and rungs[-1][1] > LADDER_EXTRA_RUNG[1]:
+        rungs.append(LADDER_EXTRA_RUNG)
+    ladder = [(width, height, f"{round(int(bitrate[:-1]) * factor)}k") for width, height, bitrate in rungs]
+
+    logger.info(f"Escalera por título (factor {factor:.2f}): {', '.join(f'{h}p@{b}' for _, h, b in ladder)}")
+    os.makedirs(output_dir, exist_ok=True)
+    with open(cache_path, 'w') as f:
+        json.dump({
+            'source': source,
+            'complexity': complexity,
+            'factor': factor,
+            'base': [list(r) for r in resolutions],
+            'resolutions': [list(r) for r in ladder]
+        }, f)
+    return ladder
+
 def process_video(
     input_path: str, 
     output_dir: str, 
     rescale: bool = True,
     force_nvidia: bool = False,
     force_amd: bool = False,
-    force_cpu: bool = False
+    force_cpu: bool = False,
+    single_decode: bool = True,
+    media_info: Optional[MediaInfo] = None,
+    chunks: int = 0,
+    chunk_runner: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+    progress_callback: Optional[Callable[[float, Dict[str, float]], None]] = None,
+    progress_interval: float = 1.0,
+    shared_audio: bool = True,
+    audio_only_variant: bool = False,
+    segment_format: str = 'ts',
+    stream_copy: bool = True,
+    per_title: bool = True,
+    trickplay: bool = True,
+    priority: int = PRIORITY_NORMAL,
+    encoder_settings: Optional[EncoderSettings] = None,
+    jit: bool = False
 ) -> bool:
-    """Procesa el video para las resoluciones apropiadas según la resolución original"""
+    """Procesa el video para las resoluciones apropiadas según la resolución original.
+
+    Si se recibe ``media_info`` (por ejemplo el resultado de ``probe_media`` ya
+    calculado por la vista) no se vuelve a ejecutar ffprobe. Con ``chunks`` > 1
+    el video se divide en ese número de tramos que se convierten en paralelo
+    (ver ``convert_in_chunks``). ``progress_callback`` recibe el progreso real
+    de la codificación (ver ``ProgressTracker``). Con ``shared_audio`` la
+    escalera de resoluciones usa una única pista de audio (``EXT-X-MEDIA``) y
+    ``audio_only_variant`` añade una variante sólo de audio de bajo bitrate.
+    ``segment_format='fmp4'`` escribe un único archivo CMAF por variante
+    direccionado por rangos de bytes (ver ``_hls_output_args``). Con
+    ``stream_copy`` la variante de la misma resolución que una fuente
+    compatible se remultiplexa sin recodificar y sólo se codifican las demás.
+    Con ``per_title`` los bitrates y variantes se ajustan a la complejidad
+    del contenido (ver ``per_title_ladder``). Con ``trickplay`` se generan
+    además sprites de miniaturas y su pista ``thumbnails.vtt``. ``priority``
+    ordena las codificaciones en el planificador global (``EncodeScheduler``).
+    ``encoder_settings`` fija el codificador en lugar de detectarlo. Con
+    ``jit`` sólo se codifica la variante superior y las demás se publican bajo
+    demanda (ver ``prepare_jit_renditions``); requiere segmentos TS y audio
+    compartido.
+    """
+    # Las miniaturas de una conversión anterior de otro contenido no deben seguir publicándose
+    if not trickplay_complete(output_dir, input_path):
+        _remove_trickplay(output_dir)
+    with metrics.span('process'):
+        success, media_info = _process_renditions(
+            input_path, output_dir, rescale, force_nvidia, force_amd, force_cpu, single_decode, media_info,
+            chunks, chunk_runner, progress_callback, progress_interval, shared_audio, audio_only_variant,
+            segment_format, stream_copy, per_title, trickplay, priority, encoder_settings, jit
+        )
+    # Las rutas que no pasan por el grafo de decodificación única generan las miniaturas aparte
+    if success and trickplay and not trickplay_complete(output_dir, input_path):
+        generate_trickplay(input_path, output_dir, media_info)
+    if success:
+        write_serving_manifest(output_dir)
+    return success
+
+def _process_renditions(
+    input_path: str, 
+    output_dir: str, 
+    rescale: bool = True,
+    force_nvidia: bool = False,
+    force_amd: bool = False,
+    force_cpu: bool = False,
+    single_decode: bool = True,
+    media_info: Optional[MediaInfo] = None,
+    chunks: int = 0,
+    chunk_runner: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+    progress_callback: Optional[Callable[[float, Dict[str, float]], None]] = None,
+    progress_interval: float = 1.0,
+    shared_audio: bool = True,
+    audio_only_variant: bool = False,
+    segment_format: str = 'ts',
+    stream_copy: bool = True,
+    per_title: bool = True,
+    trickplay: bool = True,
+    priority: int = PRIORITY_NORMAL,
+    encoder_settings: Optional[EncoderSettings] = None,
+    jit: bool = False
+) -> Tuple[bool, Optional[MediaInfo]]:
+    """Genera las variantes HLS y el master playlist (ver ``process_video``).
+
+    Devuelve también el ``MediaInfo`` usado, para no volver a analizar la fuente.
+    """
+    progress = ProgressTracker(progress_callback, progress_interval) if progress_callback else None
     try:
         # Validar que el archivo de entrada existe
         if not os.path.exists(input_path):
             logger.error(f"El archivo de entrada no existe: {input_path}")
-            return False
+            return False, media_info
         
+        # Analizar el archivo una sola vez para todas las etapas
+        media_info = media_info or probe_media(input_path)
+
         # Validar que el archivo de entrada es un video válido
-        if not is_valid_video_file(input_path):
+        if not is_valid_video_file(input_path, media_info):
             logger.error(f"El archivo no es un video válido: {input_path}")
-            return False
+            return False, media_info
         
         os.makedirs(output_dir, exist_ok=True)
         
         # Obtener la resolución original del video
-        original_width, original_height = get_video_resolution(input_path)
+        original_width, original_height = get_video_resolution(input_path, media_info)
         
-        # Obtener la configuración del codificador
-        encoder_settings = get_video_encoder_settings(force_nvidia, force_amd, force_cpu)
+        # Obtener la configuración del codificador, salvo que se indique una concreta
+        if encoder_settings is None:
+            encoder_settings = get_video_encoder_settings(force_nvidia, force_amd, force_cpu)
         
-        # Si el usuario forzó CPU, asegurarnos de usar libx264
-        if force_cpu:
-            encoder_settings = EncoderSettings(codec='libx264', preset='medium')
+            # Si el usuario forzó CPU, asegurarnos de usar libx264
+            if force_cpu:
+                encoder_settings = EncoderSettings(codec='libx264', preset='medium')
         
         # Verificar si es un video de baja resolución
         if is_low_resolution(original_width, original_height):
             logger.info("Video de baja resolución detectado, procesando solo en resolución original")
-            success, width, height, bitrate = segment_original_video(input_path, output_dir, encoder_settings)
+            if progress:
+                progress.start([f"{original_height}p"])
+            success, width, height, bitrate = segment_original_video(input_path, output_dir, encoder_settings, media_info, progress, segment_format, stream_copy, priority)
             if success:
                 # Crear master playlist con la única resolución disponible
                 create_master_playlist(output_dir, [(width, height, bitrate)])
                 logger.info("¡Segmentación del video original completada!")
-                return True
+                return True, media_info
             else:
                 logger.error("Error al segmentar el video de baja resolución. Intentando método alternativo.")
-                return fallback_to_original(input_path, output_dir, encoder_settings)
+                return fallback_to_original(input_path, output_dir, encoder_settings, media_info, progress, segment_format, priority), media_info
             
         # Definir las resoluciones estándar y sus bitrates para videos normales
-        standard_resolutions = []
         logger.info("Rescalado activado" if rescale else "Rescalado desactivado")
-        
-        # Agregar resoluciones basadas en la resolución original
-        if original_height >= 1080 and rescale:
-            standard_resolutions.extend([
-                (1920, 1080, '5000k'),
-                (1280, 720, '3000k'),
-                (854, 480, '1000k')
-            ])
-        elif original_height >= 720 and rescale:
-            standard_resolutions.extend([
-                (1280, 720, '3000k'),
-                (854, 480, '1000k')
-            ])
-        elif original_height >= 480 and rescale:
-            standard_resolutions.append(
-                (854, 480, '1000k')
-            )
+        standard_resolutions = standard_ladder(original_width, original_height, rescale)
             
         # Si no hay resoluciones estándar o el video es cuadrado/vertical, procesar solo la original
-        if not standard_resolutions or original_width <= original_height:
+        if not standard_resolutions:
             logger.info("Video con formato especial o rescalado desactivado, procesando solo en resolución original")
-            success, width, height, bitrate = segment_original_video(input_path, output_dir, encoder_settings)
+            if progress:
+                progress.start([f"{original_height}p"])
+            success, width, height, bitrate = segment_original_video(input_path, output_dir, encoder_settings, media_info, progress, segment_format, stream_copy, priority)
             if success:
                 create_master_playlist(output_dir, [(width, height, bitrate)])
-                return True
+                return True, media_info
             else:
                 logger.error("Error al segmentar el video con formato especial. Intentando método alternativo.")
-                return fallback_to_original(input_path, output_dir, encoder_settings)
+                return fallback_to_original(input_path, output_dir, encoder_settings, media_info, progress, segment_format, priority), media_info
             
+        # Pistas de audio compartidas: el audio se codifica una vez y no en cada variante
+        audio_renditions = []
+        if shared_audio and media_info is not None and media_info.has_audio:
+            audio_renditions.append(AUDIO_RENDITION)
+            if audio_only_variant:
+                audio_renditions.append(AUDIO_LOW_RENDITION)
+        shared_audio = bool(audio_renditions)
+
+        # Ajustar la escalera al contenido del título
+        if per_title:
+            standard_resolutions = per_title_ladder(input_path, output_dir, standard_resolutions, media_info)
+
+        # Variantes bajo demanda: en la ingesta sólo se codifica la superior
+        jit_resolutions = []
+        if jit and shared_audio and segment_format == 'ts' and len(standard_resolutions) > 1:
+            standard_resolutions, jit_resolutions = standard_resolutions[:1], standard_resolutions[1:]
+        elif jit:
+            logger.info("Las variantes bajo demanda requieren segmentos TS y audio compartido, se codifican todas")
+
+        def publish(resolutions, audio):
+            # Sintetiza las variantes bajo demanda a partir de la superior y crea el master playlist
+            if jit_resolutions and resolutions:
+                resolutions = resolutions + prepare_jit_renditions(input_path, output_dir, resolutions[0], jit_resolutions)
+            return create_master_playlist(output_dir, resolutions, audio)
+
+        # Remux de la variante superior si la fuente ya es compatible
+        width, height, bitrate = standard_resolutions[0]
+        copy_bitrate = source_video_bitrate(media_info)
+        if stream_copy and copy_bitrate and can_stream_copy(input_path, media_info, (width, height), bitrate):
+            if remux_rendition(input_path, output_dir, (width, height), copy_bitrate, media_info, None, not shared_audio, segment_format):
+                standard_resolutions[0] = (width, height, copy_bitrate)
+            else:
+                metrics.inc('cinecloud_fallbacks_total', {'kind': 'remux'})
+                logger.warning(f"El remux de {height}p falló. Se recodificará.")
+
+        # Omitir las variantes ya completas y reanudar las que quedaron a medias
+        renditions = _rendition_names(standard_resolutions, audio_renditions)
+        pending = {
+            name for name, bitrate in renditions
+            if not is_rendition_complete(input_path, output_dir, name, bitrate)
+        }
+        pending_resolutions = [r for r in standard_resolutions if f"{r[1]}p" in pending]
+        pending_audio = [a for a in audio_renditions if a[0] in pending]
+        if not pending:
+            logger.info("Todas las variantes estaban completas")
+            return publish(standard_resolutions, audio_renditions), media_info
+        if progress:
+            progress.start([name for name, _ in renditions])
+            for name, _ in renditions:
+                if name not in pending:
+                    progress.update(name, 1.0)
+        resuming = any(
+            is_rendition_partial(input_path, output_dir, name, bitrate)
+            for name, bitrate in renditions if name in pending
+        )
+        if resuming:
+            logger.info("Reanudando una conversión interrumpida por resolución")
+        audio_outputs = pending_audio if shared_audio else None
+
+        # Modo por fragmentos: convertir tramos del video en paralelo
+        if chunks > 1 and segment_format != 'ts':
+            logger.info("El modo por fragmentos sólo admite segmentos TS, se convierte el video completo")
+        elif chunks > 1 and not resuming and pending_resolutions and media_info is not None and media_info.duration > 0:
+            if convert_in_chunks(input_path, output_dir, pending_resolutions, encoder_settings, media_info, chunks, chunk_runner, audio_outputs, priority):
+                if progress:
+                    for name in pending:
+                        progress.update(name, 1.0)
+                return publish(standard_resolutions, audio_renditions), media_info
+            metrics.inc('cinecloud_fallbacks_total', {'kind': 'chunks'})
+            logger.warning("La conversión por fragmentos falló. Procesando el video completo.")
+
+        # Intentar primero todas las resoluciones con una sola decodificación
+        if single_decode and not resuming and pending_resolutions and len(pending) > 1:
+            if convert_all_resolutions(input_path, output_dir, pending_resolutions, encoder_settings, media_info, progress=progress, audio_renditions=audio_outputs, segment_format=segment_format, trickplay=trickplay, priority=priority):
+                return publish(standard_resolutions, audio_renditions), media_info
+            metrics.inc('cinecloud_fallbacks_total', {'kind': 'single_decode'})
+            logger.warning("La conversión con decodificación única falló. Reanudando cada resolución por separado.")
+
         # Ejecutar conversiones en paralelo
         successful_resolutions = []
         failed_conversions = []
+        successful_audio = []
         
-        # Determinar el número óptimo de workers según el hardware disponible
-        max_workers = min(3, os.cpu_count() or 2)
+        # Todas las variantes se encolan a la vez; el planificador global limita cuántas codifican
+        max_workers = len(standard_resolutions) + len(audio_renditions)
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = []
@@ -602,9 +2637,18 @@ def process_video(
                     output_dir,
                     (width, height),
                     bitrate,
-                    encoder_settings
+                    encoder_settings,
+                    media_info,
+                    progress,
+                    not shared_audio,
+                    segment_format,
+                    priority
                 )
                 futures.append((future, (width, height, bitrate)))
+            audio_futures = [
+                (executor.submit(encode_audio_rendition, input_path, output_dir, name, bitrate, media_info, progress, segment_format), (name, bitrate))
+                for name, bitrate in audio_renditions
+            ]
                 
             # Esperar a que todas las conversiones terminen
             for future, resolution in futures:
@@ -617,6 +2661,19 @@ def process_video(
                 except Exception as e:
                     logger.error(f"Error en la conversión a {resolution[1]}p: {str(e)}")
                     failed_conversions.append(resolution)
+            for future, audio in audio_futures:
+                try:
+                    if future.result():
+                        successful_audio.append(audio)
+                except Exception as e:
+                    logger.error(f"Error en la pista de audio {audio[0]}: {str(e)}")
+
+        # Sin la pista de audio principal las variantes de video quedarían mudas
+        if shared_audio and AUDIO_RENDITION not in successful_audio:
+            metrics.inc('cinecloud_fallbacks_total', {'kind': 'shared_audio'})
+            logger.warning("La pista de audio compartida falló. Se descartan las variantes sin audio.")
+            failed_conversions.extend(successful_resolutions)
+            successful_resolutions = []
         
         # Registro de resultados
         if successful_resolutions:
@@ -627,32 +2684,226 @@ def process_video(
         # Si todas las conversiones fallaron, intentar con el video original
         if not successful_resolutions:
             logger.warning("Todas las conversiones fallaron. Procesando solo el video original.")
+
+            # Si falló un codificador por hardware, volver a detectar en la próxima subida
+            if encoder_settings.codec != 'libx264':
+                encoder_registry.invalidate()
             
             # Intentar con el codificador de CPU para mayor compatibilidad
+            metrics.inc('cinecloud_fallbacks_total', {'kind': 'cpu'})
             cpu_encoder = EncoderSettings(codec='libx264', preset='medium')
             logger.info("Cambiando a codificador CPU para mayor compatibilidad")
             
-            success, width, height, bitrate = segment_original_video(input_path, output_dir, cpu_encoder)
+            success, width, height, bitrate = segment_original_video(input_path, output_dir, cpu_encoder, media_info, progress, segment_format, priority=priority)
             if success:
                 create_master_playlist(output_dir, [(width, height, bitrate)])
-                return True
+                return True, media_info
             else:
                 logger.error("No se pudo procesar el video ni siquiera en su resolución original con CPU.")
-                return fallback_to_original(input_path, output_dir, cpu_encoder)
+                return fallback_to_original(input_path, output_dir, cpu_encoder, media_info, progress, segment_format, priority), media_info
                 
         # Crear el archivo master playlist con las resoluciones que fueron convertidas exitosamente
         if successful_resolutions:
-            success = create_master_playlist(output_dir, successful_resolutions)
-            return success
+            success = publish(successful_resolutions, successful_audio)
+            return success, media_info
         else:
             logger.error("No se completó ninguna conversión exitosamente.")
-            return False
+            return False, media_info
             
     except Exception as e:
         logger.error(f"Error durante el procesamiento del video: {str(e)}")
         logger.error(traceback.format_exc())
         # Intentar método de respaldo
-        return fallback_to_original(input_path, output_dir, get_video_encoder_settings(force_nvidia, force_amd, force_cpu))
+        return fallback_to_original(input_path, output_dir, get_video_encoder_settings(force_nvidia, force_amd, force_cpu), media_info, progress, segment_format, priority), media_info
+
+class GrowingFile:
+    """Itera los bytes de un archivo que se sigue escribiendo (una subida en curso).
+
+    ``available`` devuelve ``(bytes_disponibles, terminado)``: cuántos bytes
+    contiguos desde el inicio ya se pueden leer y si el archivo está completo.
+    La iteración espera a que lleguen más datos y falla con ``TimeoutError``
+    si no llegan en ``idle_timeout`` segundos.
+    """
+    def __init__(
+        self,
+        path: str,
+        available: Callable[[], Tuple[int, bool]],
+        poll_interval: float = STREAM_POLL_INTERVAL,
+        idle_timeout: float = STREAM_IDLE_TIMEOUT
+    ):
+        self.path = path
+        self.available = available
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+
+    def __iter__(self) -> Iterator[bytes]:
+        offset = 0
+        last_data = time.monotonic()
+        # Sin búfer: un lector con búfer leería por adelantado bytes que aún no han llegado
+        # y los devolvería después aunque el bloque ya se haya escrito
+        with open(self.path, 'rb', buffering=0) as f:
+            while True:
+                limit, finished = self.available()
+                if offset < limit:
+                    f.seek(offset)
+                    data = f.read(min(STREAM_READ_SIZE, limit - offset))
+                    offset += len(data)
+                    last_data = time.monotonic()
+                    yield data
+                elif finished:
+                    return
+                elif time.monotonic() - last_data > self.idle_timeout:
+                    raise TimeoutError(f"No llegaron datos nuevos en {self.idle_timeout}s")
+                else:
+                    time.sleep(self.poll_interval)
+
+def process_stream(
+    input_path: str,
+    output_dir: str,
+    available: Callable[[], Tuple[int, bool]],
+    media_info: MediaInfo,
+    rescale: bool = True,
+    force_nvidia: bool = False,
+    force_amd: bool = False,
+    force_cpu: bool = False,
+    progress_callback: Optional[Callable[[float, Dict[str, float]], None]] = None,
+    progress_interval: float = 1.0,
+    audio_only_variant: bool = False,
+    segment_format: str = 'ts',
+    trickplay: bool = True,
+    priority: int = PRIORITY_NORMAL,
+    encoder_settings: Optional[EncoderSettings] = None
+) -> bool:
+    """Convierte a HLS un video mientras se recibe (ver ``GrowingFile``).
+
+    ``media_info`` es el análisis del inicio del archivo (``validate_prefix``).
+    Todas las variantes y la pista de audio compartida salen de una única
+    lectura secuencial del archivo, y los segmentos se escriben a medida que
+    llegan los datos: el master playlist se publica al empezar y las playlists
+    de variante (``EVENT``) crecen con cada segmento. Sin acceso aleatorio a la
+    fuente no hay escalera por título, remux, variantes bajo demanda ni
+    reanudación; si falla, el llamador puede repetir la conversión con
+    ``process_video`` cuando el archivo esté completo.
+    """
+    progress = ProgressTracker(progress_callback, progress_interval) if progress_callback else None
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        if encoder_settings is None:
+            encoder_settings = get_video_encoder_settings(force_nvidia, force_amd, force_cpu)
+            if force_cpu:
+                encoder_settings = EncoderSettings(codec='libx264', preset='medium')
+
+        width, height = media_info.width, media_info.height
+        resolutions = [] if is_low_resolution(width, height) else standard_ladder(width, height, rescale)
+        if not resolutions:
+            resolutions = [(width, height, original_bitrate(height))]
+        audio_renditions = []
+        if media_info.has_audio:
+            audio_renditions.append(AUDIO_RENDITION)
+            if audio_only_variant:
+                audio_renditions.append(AUDIO_LOW_RENDITION)
+        if progress:
+            progress.start([name for name, _ in _rendition_names(resolutions, audio_renditions)])
+
+        # El reproductor puede empezar en cuanto aparezcan los primeros segmentos
+        create_master_playlist(output_dir, resolutions, audio_renditions, check_files=False)
+        logger.info("Convirtiendo el video mientras se recibe...")
+        feed = GrowingFile(input_path, available)
+        if not convert_all_resolutions(
+            input_path, output_dir, resolutions, encoder_settings, media_info, progress=progress,
+            audio_renditions=audio_renditions, segment_format=segment_format, trickplay=trickplay,
+            priority=priority, input_feed=feed
+        ):
+            return False
+        return create_master_playlist(output_dir, resolutions, audio_renditions) and write_serving_manifest(output_dir)
+    except Exception as e:
+        logger.error(f"Error durante la conversión del video en recepción: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+def _serving_files(output_dir: str) -> List[str]:
+    """Archivos de la salida que se sirven a los reproductores"""
+    skipped = ('.json', '.gz', '.br', '.lock', '.tmp')
+    return sorted(
+        name for name in os.listdir(output_dir)
+        if not name.startswith('.') and not name.endswith(skipped) and os.path.isfile(os.path.join(output_dir, name))
+    )
+
+def _precompress(path: str):
+    """Guarda junto al archivo sus versiones comprimidas para servirlas sin comprimir en cada petición"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+        variants.append(('.br', lambda: brotli.compress(data)))
+    except ImportError:
+        pass
+    for suffix, compress in variants:
+        with open(f'{path}{suffix}.tmp', 'wb') as f:
+            f.write(compress())
+        os.replace(f'{path}{suffix}.tmp', f'{path}{suffix}')
+
+def write_serving_manifest(output_dir: str) -> bool:
+    """Calcula una vez los ETag fuertes de la salida y comprime las playlists.
+
+    ``etags.json`` guarda para cada archivo su ETag (hash del contenido), su
+    tamaño y su mtime; el servidor sólo usa el ETag si el archivo no ha
+    cambiado desde entonces (ver ``serving.file_etag``).
+    """
+    try:
+        entries = {}
+        for name in _serving_files(output_dir):
+            path = os.path.join(output_dir, name)
+            if name.endswith(PRECOMPRESSED_EXTENSIONS):
+                _precompress(path)
+            hasher = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(block)
+            st = os.stat(path)
+            entries[name] = [hasher.hexdigest()[:32], st.st_size, st.st_mtime_ns]
+        manifest_path = os.path.join(output_dir, SERVING_MANIFEST)
+        with open(f'{manifest_path}.tmp', 'w') as f:
+            json.dump(entries, f)
+        os.replace(f'{manifest_path}.tmp', manifest_path)
+        return True
+    except OSError as e:
+        logger.error(f"No se pudo escribir el manifiesto de ETags: {str(e)}")
+        return False
+
+def link_hls_output(source_dir: str, output_dir: str) -> bool:
+    """Reutiliza una salida HLS existente en otro directorio.
+
+    Los segmentos, sprites y la fuente conservada no cambian una vez escritos
+    y se enlazan (enlace duro, o copia en otro sistema de archivos). Las
+    playlists y los metadatos se pueden reescribir en su sitio (variantes bajo
+    demanda, master playlist, miniaturas) y se copian para que cada título
+    evolucione por separado. Checkpoints, locks y temporales no se reutilizan.
+    """
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        for name in os.listdir(source_dir):
+            source = os.path.join(source_dir, name)
+            target = os.path.join(output_dir, name)
+            if not os.path.isfile(source) or name.endswith(LINK_SKIPPED_SUFFIXES):
+                continue
+            if os.path.exists(target):
+                os.remove(target)
+            if name.endswith(LINK_COPIED_SUFFIXES):
+                shutil.copy2(source, target)
+                continue
+            try:
+                os.link(source, target)
+            except OSError:
+                # Distinto sistema de archivos: copiar
+                shutil.copy2(source, target)
+        logger.info(f"Salida HLS reutilizada de {source_dir} en {output_dir}")
+        return True
+    except Exception as e:
+        logger.error(f"Error al reutilizar la salida HLS: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
 
 def verify_ffmpeg_installed() -> bool:
     """Verifica que ffmpeg esté instalado en el sistema"""
@@ -689,6 +2940,16 @@ def main():
     parser.add_argument('--force-amd', action='store_true', help='Forzar uso de codificador AMD')
     parser.add_argument('--force-cpu', action='store_true', help='Forzar uso de codificador CPU')
     parser.add_argument('--no-rescale', action='store_true', help='No rescalar a resoluciones estándar')
+    parser.add_argument('--no-single-decode', action='store_true', help='Lanzar un proceso ffmpeg por resolución en lugar de decodificar una sola vez')
+    parser.add_argument('--chunks', type=int, default=0, help='Dividir el video en N fragmentos que se convierten en paralelo')
+    parser.add_argument('--muxed-audio', action='store_true', help='Incluir el audio en cada variante en lugar de una pista compartida')
+    parser.add_argument('--audio-only-variant', action='store_true', help='Añadir una variante sólo de audio de bajo bitrate')
+    parser.add_argument('--segment-format', choices=SEGMENT_FORMATS, default='ts', help='Segmentos .ts sueltos o un único archivo fMP4 (CMAF) por variante')
+    parser.add_argument('--no-stream-copy', action='store_true', help='Recodificar siempre, aunque la fuente se pueda segmentar sin recodificar')
+    parser.add_argument('--fixed-ladder', action='store_true', help='Usar la escalera fija de bitrates en lugar de ajustarla al contenido')
+    parser.add_argument('--no-trickplay', action='store_true', help='No generar sprites de miniaturas ni su pista WebVTT')
+    parser.add_argument('--priority', type=int, default=PRIORITY_NORMAL, help='Prioridad en el planificador de codificación (menor se atiende antes)')
+    parser.add_argument('--jit', action='store_true', help='Codificar sólo la variante superior y generar las demás bajo demanda')
     parser.add_argument('--install-deps', action='store_true', help='Instalar dependencias necesarias')
     parser.add_argument('--verbose', '-v', action='store_true', help='Mostrar información detallada')
     
@@ -722,7 +2983,17 @@ def main():
         rescale=not args.no_rescale,
         force_nvidia=args.force_nvidia,
         force_amd=args.force_amd,
-        force_cpu=args.force_cpu
+        force_cpu=args.force_cpu,
+        single_decode=not args.no_single_decode,
+        chunks=args.chunks,
+        shared_audio=not args.muxed_audio,
+        audio_only_variant=args.audio_only_variant,
+        segment_format=args.segment_format,
+        stream_copy=not args.no_stream_copy,
+        per_title=not args.fixed_ladder,
+        trickplay=not args.no_trickplay,
+        priority=args.priority,
+        jit=args.jit
     )
     
     if success:
@@ -0,0 +1,218 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from cinecloud.hls_utils import process_video
+from cinecloud.serving import serve_file
+import glob
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+# Opciones fijas en las comparaciones de modos para medir sólo la estrategia de
+# decodificación: sin remux, sin escalera por título ni miniaturas
+BASE_OPTIONS = {'stream_copy': False, 'per_title': False, 'trickplay': False}
+
+
+def run_benchmark(input_path, inspect=None, **kwargs):
+    """Ejecuta process_video y mide el tiempo real y los segundos de CPU de ffmpeg.
+
+    ``inspect`` recibe el directorio de salida antes de borrarlo y sus
+    métricas se añaden al resultado.
+    """
+    output_dir = tempfile.mkdtemp(prefix='hls_bench_')
+    try:
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        success = process_video(input_path, output_dir, **kwargs)
+        wall = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        result = {'success': success, 'wall': wall, 'cpu': cpu}
+        if inspect is not None and success:
+            result.update(inspect(output_dir))
+        return result
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def playlist_requests(output_dir):
+    """Peticiones (archivo, rango) que haría un reproductor para ver todas las variantes"""
+    requests = []
+    for playlist in glob.glob(os.path.join(output_dir, '*.m3u8')):
+        if os.path.basename(playlist) == 'playlist.m3u8':
+            continue
+        requests.append((playlist, None))
+        byte_range = None
+        offset = 0
+        with open(playlist) as f:
+            for line in f.read().splitlines():
+                if line.startswith('#EXT-X-MAP:'):
+                    attrs = dict(
+                        attr.split('=', 1) for attr in line[len('#EXT-X-MAP:'):].split(',') if '=' in attr
+                    )
+                    uri = attrs['URI'].strip('"')
+                    init_range = attrs.get('BYTERANGE', '').strip('"')
+                    if init_range:
+                        length, start = init_range.split('@')
+                        requests.append((os.path.join(output_dir, uri), (int(start), int(start) + int(length) - 1)))
+                    else:
+                        requests.append((os.path.join(output_dir, uri), None))
+                elif line.startswith('#EXT-X-BYTERANGE:'):
+                    length, _, start = line[len('#EXT-X-BYTERANGE:'):].partition('@')
+                    offset = int(start) if start else offset
+                    byte_range = (offset, offset + int(length) - 1)
+                    offset += int(length)
+                elif line and not line.startswith('#'):
+                    requests.append((os.path.join(output_dir, line), byte_range))
+                    byte_range = None
+    return requests
+
+
+def inspect_renditions(output_dir):
+    """Bytes de cada variante y bitrates anunciados en el master playlist"""
+    renditions = {}
+    for playlist in sorted(glob.glob(os.path.join(output_dir, '*.m3u8'))):
+        name = os.path.splitext(os.path.basename(playlist))[0]
+        if name == 'playlist':
+            continue
+        files = glob.glob(os.path.join(output_dir, f'{name}_[0-9]*.ts')) + glob.glob(os.path.join(output_dir, f'{name}.mp4'))
+        renditions[name] = sum(os.path.getsize(path) for path in files)
+
+    with open(os.path.join(output_dir, 'playlist.m3u8')) as f:
+        bandwidths = [line.split('BANDWIDTH=')[1].split(',')[0] for line in f if 'BANDWIDTH=' in line]
+    return {'renditions': renditions, 'total_bytes': sum(renditions.values()), 'bandwidths': bandwidths}
+
+
+def inspect_output(output_dir):
+    """Inodos y bytes en disco de la salida, y rendimiento al servirla con serve_file"""
+    files = [os.path.join(output_dir, name) for name in os.listdir(output_dir)]
+    disk_bytes = sum(os.stat(path).st_blocks * 512 for path in files)
+
+    factory = RequestFactory()
+    served = 0
+    start = time.perf_counter()
+    for path, byte_range in playlist_requests(output_dir):
+        headers = {'HTTP_RANGE': f'bytes={byte_range[0]}-{byte_range[1]}'} if byte_range else {}
+        response = serve_file(factory.get('/hls/', **headers), path)
+        # Las playlists y los primeros segmentos pueden salir de la caché en memoria
+        served += sum(len(chunk) for chunk in response.streaming_content) if response.streaming else len(response.content)
+    elapsed = time.perf_counter() - start
+    return {
+        'inodes': len(files),
+        'disk_bytes': disk_bytes,
+        'served_bytes': served,
+        'throughput': served / elapsed if elapsed else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = "Compara los modos de transcodificación HLS (por resolución, decodificación única, por fragmentos)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('inputs', nargs='+', help='Videos de entrada (por ejemplo fuentes 1080p)')
+        parser.add_argument('--force-cpu', action='store_true', help='Forzar uso de codificador CPU')
+        parser.add_argument('--scaling', action='store_true', help='Medir la aceleración del modo por fragmentos según el número de núcleos')
+        parser.add_argument('--formats', action='store_true', help='Comparar segmentos TS con archivos fMP4 por rangos (inodos, disco y servicio)')
+        parser.add_argument('--ladder', action='store_true', help='Comparar los bytes de la escalera por título con la escalera fija')
+
+    def handle(self, *args, **options):
+        if options['scaling']:
+            return self.handle_scaling(options)
+        if options['formats']:
+            return self.handle_formats(options)
+        if options['ladder']:
+            return self.handle_ladder(options)
+
+        modes = [
+            ('por resolución', {'single_decode': False}),
+            ('decodificación única', {'single_decode': True}),
+        ]
+        for input_path in options['inputs']:
+            if not os.path.exists(input_path):
+                raise CommandError(f"El archivo de entrada no existe: {input_path}")
+
+            self.stdout.write(f"\n{os.path.basename(input_path)}")
+            results = {}
+            for label, kwargs in modes:
+                result = run_benchmark(input_path, force_cpu=options['force_cpu'], **BASE_OPTIONS, **kwargs)
+                results[label] = result
+                self.stdout.write(
+                    f"  {label:<22} tiempo real: {result['wall']:8.2f}s  "
+                    f"CPU: {result['cpu']:8.2f}s  {'OK' if result['success'] else 'FALLO'}"
+                )
+
+            base, single = results['por resolución'], results['decodificación única']
+            self.stdout.write(self.style.SUCCESS(
+                f"  Ahorro: {base['wall'] - single['wall']:.2f}s de tiempo real, "
+                f"{base['cpu'] - single['cpu']:.2f}s de CPU"
+            ))
+
+    def handle_scaling(self, options):
+        cpu_count = os.cpu_count() or 1
+        workers = [1]
+        while workers[-1] * 2 <= cpu_count:
+            workers.append(workers[-1] * 2)
+        if workers[-1] != cpu_count:
+            workers.append(cpu_count)
+
+        for input_path in options['inputs']:
+            if not os.path.exists(input_path):
+                raise CommandError(f"El archivo de entrada no existe: {input_path}")
+
+            self.stdout.write(f"\n{os.path.basename(input_path)} ({cpu_count} núcleos)")
+            baseline = None
+            for count in workers:
+                result = run_benchmark(input_path, force_cpu=options['force_cpu'], chunks=count, **BASE_OPTIONS)
+                baseline = baseline or result['wall']
+                self.stdout.write(
+                    f"  {count:>3} fragmentos  tiempo real: {result['wall']:8.2f}s  "
+                    f"CPU: {result['cpu']:8.2f}s  aceleración: {baseline / result['wall']:5.2f}x  "
+                    f"{'OK' if result['success'] else 'FALLO'}"
+                )
+
+    def handle_formats(self, options):
+        for input_path in options['inputs']:
+            if not os.path.exists(input_path):
+                raise CommandError(f"El archivo de entrada no existe: {input_path}")
+
+            self.stdout.write(f"\n{os.path.basename(input_path)}")
+            for segment_format in ('ts', 'fmp4'):
+                result = run_benchmark(
+                    input_path, inspect=inspect_output, force_cpu=options['force_cpu'], segment_format=segment_format
+                )
+                if not result['success']:
+                    self.stdout.write(f"  {segment_format:<5} FALLO")
+                    continue
+                self.stdout.write(
+                    f"  {segment_format:<5} inodos: {result['inodes']:6d}  "
+                    f"disco: {result['disk_bytes'] / 1e6:9.2f} MB  "
+                    f"servido: {result['throughput'] / 1e6:8.2f} MB/s  "
+                    f"tiempo real: {result['wall']:8.2f}s"
+                )
+
+    def handle_ladder(self, options):
+        for input_path in options['inputs']:
+            if not os.path.exists(input_path):
+                raise CommandError(f"El archivo de entrada no existe: {input_path}")
+
+            self.stdout.write(f"\n{os.path.basename(input_path)}")
+            results = {}
+            for label, per_title in (('fija', False), ('por título', True)):
+                result = run_benchmark(
+                    input_path, inspect=inspect_renditions, force_cpu=options['force_cpu'], per_title=per_title
+                )
+                results[label] = result
+                if not result['success']:
+                    self.stdout.write(f"  {label:<11} FALLO")
+                    continue
+                detail = ', '.join(f"{name} {size / 1e6:.1f} MB" for name, size in result['renditions'].items())
+                self.stdout.write(
+                    f"  {label:<11} total: {result['total_bytes'] / 1e6:9.2f} MB  "
+                    f"BANDWIDTH: {'/'.join(result['bandwidths'])}  ({detail})"
+                )
+
+            fixed, adapted = results['fija'], results['por título']
+            if fixed['success'] and adapted['success'] and fixed['total_bytes']:
+                ratio = adapted['total_bytes'] / fixed['total_bytes']
+                self.stdout.write(self.style.SUCCESS(f"  Por título ocupa el {ratio * 100:.1f}% de la escalera fija"))
@@ -0,0 +1,120 @@
+from django.core.management.base import BaseCommand, CommandError
+from urllib.parse import urlsplit
+import asyncio
+import json
+import ssl
+import time
+
+READ_SIZE = 256 * 1024
+
+
+async def fetch(url, headers, timeout):
+    """Descarga una URL con HTTP/1.1 y devuelve (estado, bytes del cuerpo)"""
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    target = parts.path or '/'
+    if parts.query:
+        target += f'?{parts.query}'
+
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if secure else None),
+        timeout
+    )
+    try:
+        lines = [f'GET {target} HTTP/1.1', f'Host: {parts.netloc}', 'Connection: close']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        await writer.drain()
+
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+        status = int(head.split(b' ', 2)[1])
+        received = 0
+        while True:
+            data = await asyncio.wait_for(reader.read(READ_SIZE), timeout)
+            if not data:
+                break
+            received += len(data)
+        return status, received
+    finally:
+        writer.close()
+
+
+async def run_load(url, headers, concurrency, duration, timeout):
+    # concurrency clientes piden el segmento en bucle durante duration segundos
+    latencies = []
+    errors = 0
+    received = 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors, received
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                status, size = await fetch(url, headers, timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errors += 1
+                continue
+            if status not in (200, 206):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            received += size
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(value):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * value))] if latencies else None
+
+    return {
+        'concurrency': concurrency,
+        'streams': len(latencies),
+        'streams_per_second': len(latencies) / elapsed,
+        'throughput': received / elapsed,
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'errors': errors,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga de la entrega de segmentos: muchos clientes concurrentes contra un servidor en marcha. "
+        "Ejecutarla con MEDIA_ASYNC_STREAMING=True y False en el servidor para comparar"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='URL de un segmento, por ejemplo http://localhost:8000/hls/<titulo>/720p_000.ts')
+        parser.add_argument('--concurrency', default='1,8,32,128,512', help='Clientes concurrentes a probar')
+        parser.add_argument('--duration', type=float, default=10, help='Segundos de carga por nivel de concurrencia')
+        parser.add_argument('--timeout', type=float, default=30, help='Segundos sin respuesta antes de contar un error')
+        parser.add_argument('--range', help='Pedir sólo un rango, por ejemplo 0-1048575')
+        parser.add_argument('--header', action='append', default=[], help='Cabecera adicional "Nombre: valor"')
+        parser.add_argument('--json', action='store_true', help='Imprimir los resultados en JSON')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+            headers = dict(header.split(':', 1) for header in options['header'])
+        except ValueError as e:
+            raise CommandError(f"Opción no válida: {e}")
+        headers = {name.strip(): value.strip() for name, value in headers.items()}
+        if options['range']:
+            headers['Range'] = f"bytes={options['range']}"
+
+        results = []
+        for concurrency in levels:
+            result = asyncio.run(run_load(options['url'], headers, concurrency, options['duration'], options['timeout']))
+            results.append(result)
+            if not options['json']:
+                self.stdout.write(
+                    f"  {concurrency:>5} clientes  {result['streams_per_second']:8.1f} segmentos/s  "
+                    f"{result['throughput'] / 1e6:8.2f} MB/s  "
+                    f"p50: {result['p50'] or 0:6.3f}s  p95: {result['p95'] or 0:6.3f}s  errores: {result['errors']}"
+                )
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
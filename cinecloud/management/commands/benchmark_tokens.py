@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signing import TimestampSigner
+from django.test import RequestFactory
+from cinecloud.serving import serve_file
+from cinecloud.tokens import _unsign_legacy, _verify, make_token, verify_signed_path, verify_token
+import os
+import time
+
+
+def per_call(function, iterations):
+    # Microsegundos por llamada
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+class Command(BaseCommand):
+    help = "Mide el coste por segmento de verificar tokens HLS (con y sin caché) frente a la firma TimestampSigner"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000, help='Verificaciones por caso')
+        parser.add_argument('--segment', help='Segmento HLS con el que comparar el coste de servirlo con serve_file')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        prefix = 'hls/pelicula/benchmark'
+        path = f'{prefix}/720p_000.ts'
+        expires = int(time.time()) + 3600
+        token = make_token(prefix, expires, user_id=1)
+        signature = TimestampSigner().sign(f'{path}:{expires}')
+
+        def verify_cold():
+            _verify.cache_clear()
+            verify_token(token, path)
+
+        def verify_legacy_cold():
+            _unsign_legacy.cache_clear()
+            verify_signed_path(path, expires, signature)
+
+        def unsign_before():
+            # Lo que hacía signed_media en cada petición
+            TimestampSigner().unsign(signature, max_age=expires - int(time.time()))
+
+        results = {
+            'token HMAC sin caché': per_call(verify_cold, iterations),
+            'token HMAC con caché': per_call(lambda: verify_token(token, path), iterations),
+            'firma de archivo sin caché': per_call(verify_legacy_cold, iterations),
+            'firma de archivo con caché': per_call(lambda: verify_signed_path(path, expires, signature), iterations),
+            'TimestampSigner (antes)': per_call(unsign_before, iterations),
+        }
+
+        serve = None
+        if options['segment']:
+            if not os.path.isfile(options['segment']):
+                raise CommandError(f"El segmento no existe: {options['segment']}")
+            factory = RequestFactory()
+
+            def serve_segment():
+                response = serve_file(factory.get('/hls/'), options['segment'])
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+            serve = per_call(serve_segment, max(1, iterations // 100))
+
+        for label, micros in results.items():
+            line = f"  {label:<28} {micros:9.2f} µs/segmento"
+            if serve:
+                line += f"  ({micros / serve * 100:6.3f}% de servirlo)"
+            self.stdout.write(line)
+        if serve:
+            self.stdout.write(f"  {'serve_file':<28} {serve:9.2f} µs/segmento")
@@ -0,0 +1,140 @@
+from django.core.management.base import BaseCommand, CommandError
+from cinecloud.hls_utils import EncoderSettings, encoder_registry
+from cinecloud.management.commands.benchmark_hls import BASE_OPTIONS, run_benchmark, inspect_renditions
+from datetime import datetime, timezone
+import ffmpeg
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+
+# Configuraciones de codificador comparadas; las de hardware sólo si ffmpeg las soporta
+ENCODERS = {
+    'libx264-veryfast': ({'codec': 'libx264', 'preset': 'veryfast'}, None),
+    'libx264-medium': ({'codec': 'libx264', 'preset': 'medium'}, None),
+    'h264_nvenc-p4': ({'codec': 'h264_nvenc', 'preset': 'p4'}, 'nvidia'),
+    'h264_amf-balanced': ({'codec': 'h264_amf', 'quality': 'balanced'}, 'amd'),
+}
+
+MODES = {
+    'per_rendition': {'single_decode': False},
+    'single_decode': {'single_decode': True},
+    'chunks': {'chunks': 4},
+}
+
+SIZES = {'480': (854, 480), '720': (1280, 720), '1080': (1920, 1080)}
+
+def generate_source(directory, width, height, duration):
+    """Genera un video sintético (testsrc2 + tono) con ffmpeg lavfi"""
+    path = os.path.join(directory, f'lavfi_{height}p_{duration}s.mp4')
+    if os.path.exists(path):
+        return path
+    video = ffmpeg.input(f'testsrc2=size={width}x{height}:rate=30:duration={duration}', f='lavfi')
+    audio = ffmpeg.input(f'sine=frequency=440:sample_rate=48000:duration={duration}', f='lavfi')
+    (
+        ffmpeg
+        .output(video, audio, path, vcodec='libx264', preset='ultrafast', crf=18, pix_fmt='yuv420p', acodec='aac')
+        .run(quiet=True, overwrite_output=True)
+    )
+    return path
+
+
+def _run_case(connection, input_path, encoder, options):
+    # Se ejecuta en un proceso aparte para que el pico de memoria sea el de este caso
+    try:
+        result = run_benchmark(input_path, inspect=inspect_renditions, encoder_settings=EncoderSettings(**encoder), **options)
+        result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        result['python_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    connection.send(result)
+    connection.close()
+
+
+def run_case(input_path, encoder, options):
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context('fork').Process(target=_run_case, args=(sender, input_path, encoder, options))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {'success': False, 'error': f'El proceso terminó con código {process.exitcode}'}
+    process.join()
+    return result
+
+
+def ffmpeg_version():
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return output.stdout.decode().splitlines()[0]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Mide codificadores y modos de process_video sobre fuentes sintéticas y guarda los resultados en JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='480,720,1080', help='Alturas de las fuentes sintéticas (480, 720, 1080)')
+        parser.add_argument('--durations', default='10,60,300', help='Duraciones de las fuentes en segundos')
+        parser.add_argument('--encoders', default=','.join(ENCODERS), help='Configuraciones de codificador a medir')
+        parser.add_argument('--modes', default=','.join(MODES), help='Modos de process_video a medir')
+        parser.add_argument('--output', help='Archivo JSON de resultados (por defecto, salida estándar)')
+        parser.add_argument('--keep-sources', help='Directorio donde generar y conservar las fuentes sintéticas')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [SIZES[size] for size in options['sizes'].split(',')]
+            durations = [int(duration) for duration in options['durations'].split(',')]
+            encoders = {name: ENCODERS[name] for name in options['encoders'].split(',')}
+            modes = {name: MODES[name] for name in options['modes'].split(',')}
+        except (KeyError, ValueError) as e:
+            raise CommandError(f"Opción no válida: {e}")
+
+        available = encoder_registry.ffmpeg_encoders()
+        for name, (_, hardware) in list(encoders.items()):
+            if hardware and not available.get(hardware):
+                self.stderr.write(f"Se omite {name}: codificador no disponible")
+                del encoders[name]
+
+        source_dir = options['keep_sources'] or tempfile.mkdtemp(prefix='hls_lavfi_')
+        os.makedirs(source_dir, exist_ok=True)
+        results = []
+        try:
+            for width, height in sizes:
+                for duration in durations:
+                    source = generate_source(source_dir, width, height, duration)
+                    for encoder_name, (encoder, _) in encoders.items():
+                        for mode_name, mode in modes.items():
+                            result = run_case(source, encoder, {**BASE_OPTIONS, **mode})
+                            if result.get('wall'):
+                                result['realtime_factor'] = duration / result['wall']
+                            results.append({
+                                'source': {'width': width, 'height': height, 'duration': duration},
+                                'encoder': encoder_name,
+                                'mode': mode_name,
+                                **result
+                            })
+                            self.stderr.write(
+                                f"{height}p {duration}s {encoder_name:<18} {mode_name:<14} "
+                                + (f"{result['wall']:8.2f}s  x{result['realtime_factor']:.2f}" if result.get('success') else 'FALLO')
+                            )
+        finally:
+            if not options['keep_sources']:
+                shutil.rmtree(source_dir, ignore_errors=True)
+
+        report = json.dumps({
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'host': {'cpu_count': os.cpu_count(), 'platform': platform.platform(), 'ffmpeg': ffmpeg_version()},
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,113 @@
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from cinecloud.uploads import save_upload
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+CHUNK_SIZE = 1024 * 1024
+
+# temp_file: subida volcada a disco por Django (se mueve); stream: copia por bloques;
+# read: el comportamiento anterior, ContentFile(archivo.read())
+MODES = ('temp_file', 'stream', 'read')
+
+
+def write_synthetic(f, size):
+    block = os.urandom(CHUNK_SIZE)
+    remaining = size
+    while remaining > 0:
+        f.write(block[:min(CHUNK_SIZE, remaining)])
+        remaining -= CHUNK_SIZE
+    f.flush()
+    f.seek(0)
+
+
+def _run_case(connection, mode, size, directory):
+    # En un proceso aparte para que el pico de memoria sea sólo el de este caso
+    try:
+        storage = FileSystemStorage(location=os.path.join(directory, 'storage'))
+        if mode == 'temp_file':
+            upload = TemporaryUploadedFile('video.mp4', 'video/mp4', size, None)
+            write_synthetic(upload, size)
+        else:
+            upload = File(open(os.path.join(directory, 'source.bin'), 'wb+'), name='video.mp4')
+            write_synthetic(upload, size)
+
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        if mode == 'read':
+            path = storage.save('videos/video.mp4', ContentFile(upload.read()))
+            stored = storage.size(path)
+        else:
+            path, _, stored = save_upload(upload, 'videos/video.mp4', storage)
+        wall = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        upload.close()
+        result = {
+            'success': stored == size,
+            'wall': wall,
+            'peak_rss_growth_kb': peak - baseline,
+        }
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    connection.send(result)
+    connection.close()
+
+
+def run_case(mode, size):
+    directory = tempfile.mkdtemp(prefix='upload_bench_')
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context('fork').Process(target=_run_case, args=(sender, mode, size, directory))
+    try:
+        process.start()
+        sender.close()
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = {'success': False, 'error': f'El proceso terminó con código {process.exitcode}'}
+        process.join()
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class Command(BaseCommand):
+    help = "Mide el tiempo y el pico de memoria al guardar subidas grandes sintéticas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='256,1024', help='Tamaños de las subidas en MB')
+        parser.add_argument('--modes', default=','.join(MODES), help='Modos de guardado a medir')
+        parser.add_argument('--max-rss-mb', type=float, help='Fallar si save_upload supera este crecimiento de memoria')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) * 1024 * 1024 for size in options['sizes'].split(',')]
+        except ValueError as e:
+            raise CommandError(f"Tamaño no válido: {e}")
+        modes = options['modes'].split(',')
+        if any(mode not in MODES for mode in modes):
+            raise CommandError(f"Modos disponibles: {', '.join(MODES)}")
+
+        exceeded = []
+        for size in sizes:
+            for mode in modes:
+                result = run_case(mode, size)
+                if not result['success']:
+                    self.stdout.write(f"  {size // (1024 * 1024):>6} MB  {mode:<10} FALLO {result.get('error', '')}")
+                    continue
+                growth_mb = result['peak_rss_growth_kb'] / 1024
+                self.stdout.write(
+                    f"  {size // (1024 * 1024):>6} MB  {mode:<10} tiempo: {result['wall']:7.2f}s  "
+                    f"memoria: +{growth_mb:8.1f} MB"
+                )
+                if mode != 'read' and options['max_rss_mb'] is not None and growth_mb > options['max_rss_mb']:
+                    exceeded.append(f"{mode} {size // (1024 * 1024)} MB")
+
+        if exceeded:
+            raise CommandError(f"Crecimiento de memoria por encima del límite: {', '.join(exceeded)}")
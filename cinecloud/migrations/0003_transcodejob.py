@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinecloud', '0002_categoria_descripcion_categoria_icono'),
+        ('movies', '0001_initial'),
+        ('series', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=255)),
+                ('video', models.CharField(help_text='Ruta del archivo fuente', max_length=1024)),
+                ('output_dir', models.CharField(help_text='Directorio de salida HLS', max_length=1024)),
+                ('rescale', models.BooleanField(default=True)),
+                ('media_info', models.JSONField(blank=True, help_text='Resultado de ffprobe', null=True)),
+                ('estado', models.CharField(choices=[('pending', 'Pendiente'), ('processing', 'Procesando'), ('completed', 'Completado'), ('failed', 'Fallido')], default='pending', max_length=20)),
+                ('progreso', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('episodio', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trabajos', to='series.episodio')),
+                ('pelicula', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trabajos', to='movies.pelicula')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de transcodificación',
+                'verbose_name_plural': 'Trabajos de transcodificación',
+                'ordering': ['-creado'],
+            },
+        ),
+    ]
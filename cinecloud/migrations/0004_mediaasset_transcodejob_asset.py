@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinecloud', '0003_transcodejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('tamano', models.BigIntegerField(help_text='Tamaño en bytes')),
+                ('hls_dir', models.CharField(blank=True, help_text='Directorio HLS de referencia', max_length=1024)),
+                ('estado', models.CharField(choices=[('pending', 'Pendiente'), ('processing', 'Procesando'), ('completed', 'Completado'), ('failed', 'Fallido')], default='pending', max_length=20)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('trabajo', models.ForeignKey(blank=True, help_text='Trabajo que está convirtiendo el contenido', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cinecloud.transcodejob')),
+            ],
+            options={
+                'verbose_name': 'Recurso multimedia',
+                'verbose_name_plural': 'Recursos multimedia',
+            },
+        ),
+        migrations.AddField(
+            model_name='transcodejob',
+            name='asset',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trabajos', to='cinecloud.mediaasset'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinecloud', '0004_mediaasset_transcodejob_asset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcodejob',
+            name='prioridad',
+            field=models.PositiveSmallIntegerField(default=5, help_text='Prioridad en el planificador de codificación (menor se atiende antes)'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinecloud', '0005_transcodejob_prioridad'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumableUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nombre', models.CharField(help_text='Nombre del archivo original', max_length=255)),
+                ('tamano', models.BigIntegerField(help_text='Tamaño total en bytes')),
+                ('tamano_bloque', models.PositiveIntegerField(help_text='Tamaño de cada bloque en bytes (salvo el último)')),
+                ('recibidos', models.JSONField(default=list, help_text='Índices de los bloques recibidos y verificados')),
+                ('ruta', models.CharField(help_text='Archivo parcial o, al completarse, ruta en el almacenamiento', max_length=1024)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('estado', models.CharField(choices=[('pending', 'Pendiente'), ('processing', 'Procesando'), ('completed', 'Completado'), ('failed', 'Fallido')], default='pending', max_length=20)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Subida reanudable',
+                'verbose_name_plural': 'Subidas reanudables',
+            },
+        ),
+    ]
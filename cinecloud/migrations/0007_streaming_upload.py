@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinecloud', '0006_resumableupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumableupload',
+            name='media_info',
+            field=models.JSONField(blank=True, help_text='Análisis del inicio del archivo', null=True),
+        ),
+        migrations.AddField(
+            model_name='resumableupload',
+            name='transmisible',
+            field=models.BooleanField(help_text='Si se puede convertir mientras se recibe (None: aún sin validar)', null=True),
+        ),
+        migrations.AddField(
+            model_name='transcodejob',
+            name='subida',
+            field=models.ForeignKey(blank=True, help_text='Subida en curso que se convierte mientras se recibe', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trabajos', to='cinecloud.resumableupload'),
+        ),
+    ]
@@ -1,4 +1,7 @@
+from django.conf import settings
 from django.db import models
+import os
+import uuid
 
 class Categoria(models.Model):
     icono = models.CharField(max_length=100, blank=True, null=True)
@@ -11,4 +14,124 @@ class Categoria(models.Model):
         verbose_name_plural = "Categorías"
     
     def __str__(self):
-        return self.nombre
\ No newline at end of file
+        return self.nombre
+
+
+class EstadoProcesamiento(models.TextChoices):
+    PENDIENTE = 'pending', 'Pendiente'
+    PROCESANDO = 'processing', 'Procesando'
+    COMPLETADO = 'completed', 'Completado'
+    FALLIDO = 'failed', 'Fallido'
+
+
+class MediaAsset(models.Model):
+    """Contenido de un video subido, identificado por su hash, cuya salida HLS se reutiliza"""
+    Estado = EstadoProcesamiento
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    tamano = models.BigIntegerField(help_text="Tamaño en bytes")
+    hls_dir = models.CharField(max_length=1024, blank=True, help_text="Directorio HLS de referencia")
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    trabajo = models.ForeignKey('TranscodeJob', null=True, blank=True, on_delete=models.SET_NULL, related_name='+', help_text="Trabajo que está convirtiendo el contenido")
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Recurso multimedia"
+        verbose_name_plural = "Recursos multimedia"
+
+    def __str__(self):
+        return self.sha256
+
+    def find_output_dir(self):
+        # Directorio con una salida HLS completa de este contenido, si sigue existiendo
+        candidates = [self.hls_dir] + list(
+            self.trabajos.filter(estado=self.Estado.COMPLETADO).values_list('output_dir', flat=True)
+        )
+        for candidate in candidates:
+            if candidate and os.path.exists(os.path.join(candidate, 'playlist.m3u8')):
+                return candidate
+        return None
+
+
+class TranscodeJob(models.Model):
+    Estado = EstadoProcesamiento
+
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    pelicula = models.ForeignKey('movies.Pelicula', null=True, blank=True, on_delete=models.CASCADE, related_name='trabajos')
+    episodio = models.ForeignKey('series.Episodio', null=True, blank=True, on_delete=models.CASCADE, related_name='trabajos')
+    asset = models.ForeignKey(MediaAsset, null=True, blank=True, on_delete=models.SET_NULL, related_name='trabajos')
+    subida = models.ForeignKey('ResumableUpload', null=True, blank=True, on_delete=models.SET_NULL, related_name='trabajos', help_text="Subida en curso que se convierte mientras se recibe")
+    titulo = models.CharField(max_length=255)
+    video = models.CharField(max_length=1024, help_text="Ruta del archivo fuente")
+    output_dir = models.CharField(max_length=1024, help_text="Directorio de salida HLS")
+    rescale = models.BooleanField(default=True)
+    prioridad = models.PositiveSmallIntegerField(default=5, help_text="Prioridad en el planificador de codificación (menor se atiende antes)")
+    media_info = models.JSONField(null=True, blank=True, help_text="Resultado de ffprobe")
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    progreso = models.IntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Trabajo de transcodificación"
+        verbose_name_plural = "Trabajos de transcodificación"
+        ordering = ['-creado']
+
+    def __str__(self):
+        return f"{self.titulo} ({self.estado})"
+
+    def actualizar_estado(self, estado, progreso=None, error=None):
+        self.estado = estado
+        if progreso is not None:
+            self.progreso = progreso
+        if error is not None:
+            self.error = error
+        self.save(update_fields=['estado', 'progreso', 'error', 'actualizado'])
+
+
+class ResumableUpload(models.Model):
+    """Subida por bloques que se puede reanudar; los bloques llegan en cualquier orden y en paralelo"""
+    Estado = EstadoProcesamiento
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='subidas')
+    nombre = models.CharField(max_length=255, help_text="Nombre del archivo original")
+    tamano = models.BigIntegerField(help_text="Tamaño total en bytes")
+    tamano_bloque = models.PositiveIntegerField(help_text="Tamaño de cada bloque en bytes (salvo el último)")
+    recibidos = models.JSONField(default=list, help_text="Índices de los bloques recibidos y verificados")
+    ruta = models.CharField(max_length=1024, help_text="Archivo parcial o, al completarse, ruta en el almacenamiento")
+    sha256 = models.CharField(max_length=64, blank=True)
+    media_info = models.JSONField(null=True, blank=True, help_text="Análisis del inicio del archivo")
+    transmisible = models.BooleanField(null=True, help_text="Si se puede convertir mientras se recibe (None: aún sin validar)")
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Subida reanudable"
+        verbose_name_plural = "Subidas reanudables"
+
+    def __str__(self):
+        return f"{self.nombre} ({len(self.recibidos)}/{self.num_bloques})"
+
+    @property
+    def num_bloques(self):
+        return max(1, -(-self.tamano // self.tamano_bloque))
+
+    def rango_bloque(self, indice):
+        # (inicio, longitud) del bloque dentro del archivo
+        inicio = indice * self.tamano_bloque
+        return inicio, min(self.tamano_bloque, self.tamano - inicio)
+
+    def contiguos(self):
+        # Bytes recibidos sin huecos desde el inicio del archivo
+        recibidos = set(self.recibidos)
+        indice = 0
+        while indice in recibidos:
+            indice += 1
+        return min(indice * self.tamano_bloque, self.tamano)
+
+    def faltantes(self):
+        recibidos = set(self.recibidos)
+        return [indice for indice in range(self.num_bloques) if indice not in recibidos]
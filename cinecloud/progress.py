@@ -0,0 +1,16 @@
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+
+
+def send_progress_update(user_id, message, progress, status="info"):
+    channel_layer = get_channel_layer()
+    print(f"Sending progress update to user {user_id}: {message}, {progress}, {status}")
+    async_to_sync(channel_layer.group_send)(
+        f"progress_{user_id}",
+        {
+            "type": "progress_message",
+            "message": message,
+            "progress": progress,
+            "status": status
+        }
+    )
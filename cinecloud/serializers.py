@@ -1,4 +1,4 @@
-from .models import Categoria
+from .models import Categoria, TranscodeJob
 from rest_framework import serializers
 class CategoriaSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,4 +9,9 @@ class CategoriaSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         cantidad = instance.pelicula_set.count() + instance.serie_set.count()
         representation['cantidad'] = cantidad
-        return representation
\ No newline at end of file
+        return representation
+
+class TranscodeJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TranscodeJob
+        exclude = ['media_info', 'video', 'output_dir']
@@ -0,0 +1,442 @@
+import asyncio
+import functools
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+from .hls_utils import PRECOMPRESSED_EXTENSIONS, SERVING_MANIFEST, TRICKPLAY_VTT, generate_jit_segment, metrics
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+# Bloques mayores en la lectura asíncrona: cada bloque es un salto al pool de hilos
+ASYNC_CHUNK_SIZE = 256 * 1024
+
+# Los segmentos y sprites no cambian una vez escritos; las playlists sí (conversiones en curso)
+IMMUTABLE_EXTENSIONS = ('.ts', '.m4s', '.mp4', '.jpg', '.webp')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+SERVE_BACKENDS = ('python', 'nginx', 'sendfile')
+# Segmentos numerados de cada variante (720p_000.ts, audio_003.ts, ...)
+SEGMENT_INDEX_RE = re.compile(r'_(\d+)\.(?:ts|m4s)$')
+
+CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+    '.mp4': 'video/mp4',
+    '.m4s': 'video/iso.segment',
+    '.vtt': 'text/vtt',
+    '.jpg': 'image/jpeg',
+    '.webp': 'image/webp',
+}
+
+
+def content_type_for(path):
+    extension = os.path.splitext(path)[1].lower()
+    return CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def resolve_path(root, relative_path):
+    # Ruta absoluta dentro de root; rechaza cualquier intento de salir del directorio
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, relative_path))
+    # Los archivos ocultos (la fuente conservada para las variantes bajo demanda) no se sirven
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path) or os.path.basename(path).startswith('.'):
+        raise Http404("Archivo no encontrado.")
+    return path
+
+
+def ensure_jit_segment(root, relative_path):
+    # Codifica en el momento los segmentos de variantes bajo demanda que aún no existen
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, relative_path))
+    if os.path.commonpath([root, path]) == root and not os.path.exists(path):
+        generate_jit_segment(os.path.dirname(path), os.path.basename(path))
+
+
+def trickplay_url(video):
+    # Pista WebVTT de miniaturas junto al playlist.m3u8 del video, si se generó
+    if not video:
+        return None
+    hls_dir = os.path.join(settings.MEDIA_ROOT, video.lstrip('/'))
+    if not os.path.isfile(os.path.join(hls_dir, TRICKPLAY_VTT)):
+        return None
+    return f"{video.rstrip('/')}/{TRICKPLAY_VTT}"
+
+
+def parse_range(header, size):
+    # Devuelve (inicio, fin) inclusivos de una cabecera Range de un solo rango,
+    # None si no hay rango aplicable y ValueError si no se puede satisfacer
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Sufijo: los últimos N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("Rango vacío")
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("Rango fuera del archivo")
+    return start, end
+
+
+@functools.lru_cache(maxsize=256)
+def _load_manifest(path, mtime_ns):
+    # El mtime forma parte de la clave: un manifiesto reescrito se vuelve a leer
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def file_etag(path, stat):
+    # ETag fuerte calculado al convertir (etags.json) si el archivo no cambió desde
+    # entonces; si no, uno derivado del mtime y el tamaño
+    manifest_path = os.path.join(os.path.dirname(path), SERVING_MANIFEST)
+    try:
+        entry = _load_manifest(manifest_path, os.stat(manifest_path).st_mtime_ns).get(os.path.basename(path))
+    except OSError:
+        entry = None
+    if entry and entry[1] == stat.st_size and entry[2] == stat.st_mtime_ns:
+        return f'"{entry[0]}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def etag_matches(header, etag):
+    # Comparación débil de If-None-Match (RFC 9110): ignora el prefijo W/
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in (tag.strip().removeprefix('W/') for tag in header.split(','))
+
+
+def if_range_matches(header, etag, mtime):
+    # If-Range (RFC 9110): ETag con comparación fuerte o la fecha exacta de Last-Modified
+    header = header.strip()
+    if header.startswith(('"', 'W/')):
+        return header == etag
+    return parse_http_date_safe(header) == int(mtime)
+
+
+def cache_control_for(path, public=True):
+    scope = 'public' if public else 'private'
+    if path.lower().endswith(IMMUTABLE_EXTENSIONS):
+        return f'{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'{scope}, max-age={settings.HLS_PLAYLIST_MAX_AGE}'
+
+
+def precompressed_variant(request, path, stat):
+    # Versión comprimida (.br/.gz) de una playlist si el cliente la acepta y está al día
+    if not path.lower().endswith(PRECOMPRESSED_EXTENSIONS):
+        return None
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    for encoding, suffix in ENCODINGS:
+        try:
+            encoded_stat = os.stat(path + suffix)
+        except OSError:
+            continue
+        if encoding in accepted and encoded_stat.st_mtime_ns >= stat.st_mtime_ns:
+            return encoding, path + suffix, encoded_stat
+    return None
+
+
+class HLSCache:
+    """Caché LRU en memoria, limitada en bytes, de playlists y primeros segmentos.
+
+    Cada entrada guarda el mtime y el tamaño del archivo y sólo se usa si
+    coinciden con el ``stat`` de la petición, así que una conversión que
+    reescribe el título (aunque sea en otro proceso) la invalida sin avisos.
+    Cuando cambia el ``etags.json`` de un título (``process_video`` terminó)
+    la primera petición que falla carga de golpe sus playlists y sus primeros
+    segmentos. Los aciertos y fallos se acumulan y se vuelcan a ``metrics``
+    como mucho una vez por segundo (o al pedir ``/metrics``).
+    """
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, max_bytes, segments):
+        self.max_bytes = max_bytes
+        self.segments = segments
+        # Un único archivo no puede ocupar más de 1/8 del presupuesto
+        self.max_entry = max_bytes // 8
+        self.size = 0
+        self._entries = OrderedDict()  # ruta -> (mtime_ns, tamaño, bytes)
+        self._generations = {}  # directorio -> mtime de su etags.json al calentarlo
+        self._lock = threading.Lock()
+        self._counts = {'hit': 0, 'miss': 0}
+        self._flushed = time.monotonic()
+
+    def cacheable(self, path):
+        name = os.path.basename(path)
+        for _, suffix in ENCODINGS:
+            name = name.removesuffix(suffix)
+        if name.startswith('.'):
+            return False
+        if name.lower().endswith(PRECOMPRESSED_EXTENSIONS):
+            return True
+        match = SEGMENT_INDEX_RE.search(name)
+        return match is not None and int(match.group(1)) < self.segments
+
+    def get(self, path, stat):
+        """Contenido de ``path`` desde memoria, cargándolo si falta; None si no se cachea"""
+        if not self.max_bytes or not self.cacheable(path) or stat.st_size > self.max_entry:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+            hit = entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size
+            if hit:
+                self._entries.move_to_end(path)
+            self._counts['hit' if hit else 'miss'] += 1
+        if time.monotonic() - self._flushed >= self.FLUSH_INTERVAL:
+            self.flush_metrics()
+        if hit:
+            return entry[2]
+
+        self._maybe_warm(os.path.dirname(path))
+        return self._load(path, stat)
+
+    def _load(self, path, stat):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(stat.st_size + 1)
+        except OSError:
+            return None
+        if len(data) != stat.st_size:
+            # El archivo cambió entre el stat y la lectura: no se guarda
+            return None
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= len(old[2])
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+        return data
+
+    def _maybe_warm(self, directory):
+        try:
+            generation = os.stat(os.path.join(directory, SERVING_MANIFEST)).st_mtime_ns
+        except OSError:
+            return
+        with self._lock:
+            if self._generations.get(directory) == generation:
+                return
+            self._generations[directory] = generation
+        self.warm(directory)
+
+    def warm(self, directory):
+        """Carga las playlists y los primeros segmentos de cada variante de un título"""
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        # Primero las playlists, después los segmentos en orden de reproducción
+        names = sorted(
+            (name for name in names if self.cacheable(name)),
+            key=lambda name: (SEGMENT_INDEX_RE.search(name) is not None, name)
+        )
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size <= self.max_entry:
+                self._load(path, stat)
+
+    def invalidate(self, directory):
+        """Descarta todo lo cacheado bajo ``directory`` (al borrar un título)"""
+        prefix = os.path.join(os.path.realpath(directory), '')
+        with self._lock:
+            for path in [path for path in self._entries if path.startswith(prefix)]:
+                self.size -= len(self._entries.pop(path)[2])
+            for path in [path for path in self._generations if os.path.join(path, '').startswith(prefix)]:
+                del self._generations[path]
+
+    def flush_metrics(self):
+        with self._lock:
+            counts, self._counts = self._counts, {'hit': 0, 'miss': 0}
+            self._flushed = time.monotonic()
+        for result, value in counts.items():
+            if value:
+                metrics.inc('cinecloud_hls_cache_requests_total', {'result': result}, value)
+
+
+hls_cache = HLSCache(settings.HLS_CACHE_BYTES, settings.HLS_CACHE_SEGMENTS)
+
+
+def offload_response(path, content_type):
+    """Respuesta vacía que delega el envío del archivo en el proxy frontal.
+
+    ``MEDIA_SERVE_BACKEND='nginx'`` emite ``X-Accel-Redirect`` hacia la
+    location interna ``MEDIA_ACCEL_PREFIX`` (alias de ``MEDIA_ROOT``);
+    ``'sendfile'`` emite ``X-Sendfile`` con la ruta absoluta (Apache
+    mod_xsendfile, lighttpd). El proxy resuelve Range y la compresión
+    (``gzip_static``). Devuelve None si el archivo está fuera de ``MEDIA_ROOT``
+    o el backend es ``'python'``.
+    """
+    backend = settings.MEDIA_SERVE_BACKEND
+    if backend not in SERVE_BACKENDS:
+        raise ValueError(f"MEDIA_SERVE_BACKEND no soportado: {backend}")
+    if backend == 'python':
+        return None
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    if os.path.commonpath([media_root, path]) != media_root:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    if backend == 'nginx':
+        relative = os.path.relpath(path, media_root).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = quote(f"{settings.MEDIA_ACCEL_PREFIX.rstrip('/')}/{relative}")
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def read_range(path, start, length, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+async def aread_range(path, start, length, chunk_size=ASYNC_CHUNK_SIZE):
+    # Igual que read_range pero sin bloquear el bucle de eventos: cada pread se
+    # ejecuta en el pool por defecto y el hilo se libera entre bloques
+    loop = asyncio.get_running_loop()
+    fd = await loop.run_in_executor(None, os.open, path, os.O_RDONLY)
+    try:
+        while length > 0:
+            data = await loop.run_in_executor(None, os.pread, fd, min(chunk_size, length), start)
+            if not data:
+                break
+            start += len(data)
+            length -= len(data)
+            yield data
+    finally:
+        os.close(fd)
+
+
+def serve_file(request, path, public=True, reader=read_range):
+    """Sirve un archivo con validadores, política de caché y peticiones Range.
+
+    - ``ETag`` fuerte (ver ``file_etag``), ``Last-Modified`` y ``304`` con
+      ``If-None-Match``.
+    - ``206`` con un solo rango, condicionado por ``If-Range`` (ETag o fecha); necesario para
+      las variantes fMP4, que se piden como rangos de bytes.
+    - Segmentos inmutables en caché un año; playlists ``HLS_PLAYLIST_MAX_AGE``.
+      Con ``public=False`` (URLs firmadas) la caché es sólo del cliente.
+    - Playlists precomprimidas según ``Accept-Encoding`` (sin Range).
+    - Playlists y primeros segmentos desde memoria (ver ``HLSCache``).
+
+    Con ``MEDIA_SERVE_BACKEND`` distinto de ``'python'`` Django sólo valida y
+    responde 304; los bytes los envía el proxy (ver ``offload_response``).
+    """
+    stat = os.stat(path)
+    etag = file_etag(path, stat)
+    cache_control = cache_control_for(path, public)
+    content_type = content_type_for(path)
+    last_modified = http_date(stat.st_mtime)
+    compressible = path.lower().endswith(PRECOMPRESSED_EXTENSIONS)
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and if_range and not if_range_matches(if_range, etag, stat.st_mtime):
+        # El recurso cambió desde que el cliente obtuvo la primera parte: se envía completo
+        range_header = None
+
+    if settings.MEDIA_SERVE_BACKEND != 'python' and not etag_matches(request.headers.get('If-None-Match'), etag):
+        response = offload_response(path, content_type)
+        if response is not None:
+            response['ETag'] = etag
+            response['Cache-Control'] = cache_control
+            if compressible:
+                response['Vary'] = 'Accept-Encoding'
+            return response
+
+    encoded = None if range_header else precompressed_variant(request, path, stat)
+    if encoded is not None:
+        encoding, path, stat = encoded
+        etag = f'{etag[:-1]}-{encoding}"'
+
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        response['Cache-Control'] = cache_control
+        if compressible:
+            response['Vary'] = 'Accept-Encoding'
+        return response
+
+    size = stat.st_size
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    cached = hls_cache.get(path, stat)
+    if cached is not None:
+        response = HttpResponse(cached[start:start + length], content_type=content_type)
+    else:
+        response = StreamingHttpResponse(reader(path, start, length), content_type=content_type)
+    if byte_range is not None:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if encoded is not None:
+        response['Content-Encoding'] = encoded[0]
+    if compressible:
+        response['Vary'] = 'Accept-Encoding'
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = cache_control
+    return response
+
+
+@sync_to_async(thread_sensitive=False)
+def _prepare_response(request, root, relative_path, public):
+    ensure_jit_segment(root, relative_path)
+    path = resolve_path(root, relative_path)
+    reader = aread_range if settings.MEDIA_ASYNC_STREAMING else read_range
+    return serve_file(request, path, public, reader=reader)
+
+
+async def aserve_file(request, root, relative_path, public=True):
+    """Versión para vistas asíncronas de ``ensure_jit_segment`` + ``resolve_path`` + ``serve_file``.
+
+    La preparación (que puede codificar un segmento bajo demanda) ocupa un hilo
+    sólo hasta tener las cabeceras; el cuerpo se envía con ``aread_range``, así
+    que una transferencia lenta no retiene ningún hilo. Con
+    ``MEDIA_ASYNC_STREAMING=False`` se usa el iterador síncrono anterior, que
+    Django consume entero en un hilo antes de enviarlo (útil para comparar).
+    """
+    return await _prepare_response(request, root, relative_path, public)
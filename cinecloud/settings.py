@@ -75,6 +75,59 @@ CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/0
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Ejecuta las tareas en el propio proceso (útil en tests con CELERY_BROKER_URL=memory://)
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_TASK_EAGER_PROPAGATES = CELERY_TASK_ALWAYS_EAGER
+CELERY_TASK_ACKS_LATE = True
+# Si un worker muere a mitad de una conversión, el trabajo vuelve a la cola y se reanuda
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Los fragmentos van a su propia cola para que un trabajo que espera a sus
+# fragmentos no ocupe los workers que deben procesarlos
+CELERY_TASK_ROUTES = {
+    'cinecloud.tasks.encode_video_chunk': {'queue': 'hls_chunks'},
+}
+
+# Número de fragmentos en que se divide cada video para convertirlo en paralelo (0 = desactivado)
+HLS_CHUNKS = int(os.getenv('HLS_CHUNKS', 0))
+# Segundos mínimos entre dos notificaciones de progreso de una misma conversión
+HLS_PROGRESS_INTERVAL = float(os.getenv('HLS_PROGRESS_INTERVAL', 2))
+# Añadir una variante sólo de audio de bajo bitrate al master playlist
+HLS_AUDIO_ONLY_VARIANT = os.getenv('HLS_AUDIO_ONLY_VARIANT', 'False') == 'True'
+# Formato de los segmentos HLS: 'ts' (un archivo por segmento) o 'fmp4' (un archivo CMAF por variante)
+HLS_SEGMENT_FORMAT = os.getenv('HLS_SEGMENT_FORMAT', 'ts')
+# Ajustar bitrates y variantes a la complejidad de cada título (ver HLS_LADDER_* en hls_utils)
+HLS_PER_TITLE = os.getenv('HLS_PER_TITLE', 'True') == 'True'
+# Segundos entre comprobaciones de un trabajo que espera a otra conversión del mismo contenido
+HLS_DEDUPE_POLL_INTERVAL = int(os.getenv('HLS_DEDUPE_POLL_INTERVAL', 60))
+# Segundos sin progreso tras los que otro trabajo se hace cargo de una conversión del mismo contenido
+HLS_DEDUPE_STALE_AFTER = int(os.getenv('HLS_DEDUPE_STALE_AFTER', 2 * 3600))
+# Codificar en la ingesta sólo la variante superior; las demás se generan al pedir cada segmento
+HLS_JIT_RENDITIONS = os.getenv('HLS_JIT_RENDITIONS', 'False') == 'True'
+# Segundos que clientes y CDN pueden reutilizar una playlist HLS (los segmentos son inmutables)
+HLS_PLAYLIST_MAX_AGE = int(os.getenv('HLS_PLAYLIST_MAX_AGE', 5))
+# Caché en memoria (por proceso) de playlists y de los primeros segmentos de cada variante;
+# HLS_CACHE_BYTES=0 la desactiva
+HLS_CACHE_BYTES = int(os.getenv('HLS_CACHE_BYTES', 64 * 1024 * 1024))
+HLS_CACHE_SEGMENTS = int(os.getenv('HLS_CACHE_SEGMENTS', 3))
+# Exige un token de título (ver /hls-token/) en las rutas /hls/
+HLS_REQUIRE_TOKEN = os.getenv('HLS_REQUIRE_TOKEN', 'False') == 'True'
+# Validez máxima (segundos) de un token HLS y SameSite de su cookie ('None' si el reproductor está en otro dominio)
+HLS_TOKEN_MAX_AGE = int(os.getenv('HLS_TOKEN_MAX_AGE', 6 * 3600))
+HLS_TOKEN_COOKIE_SAMESITE = os.getenv('HLS_TOKEN_COOKIE_SAMESITE', 'Lax')
+# Envía los segmentos con lecturas asíncronas (sin retener un hilo por transferencia)
+MEDIA_ASYNC_STREAMING = os.getenv('MEDIA_ASYNC_STREAMING', 'True') == 'True'
+# Quién envía los bytes de HLS y media firmada: 'python' (Django), 'nginx' (X-Accel-Redirect)
+# o 'sendfile' (X-Sendfile); Django sólo autoriza y resuelve la ruta
+MEDIA_SERVE_BACKEND = os.getenv('MEDIA_SERVE_BACKEND', 'python')
+# Location interna de nginx que apunta a MEDIA_ROOT (ver nginx.conf)
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Subidas reanudables: tamaño de bloque por defecto y límites que puede pedir el cliente (bytes)
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+UPLOAD_MIN_CHUNK_SIZE = 256 * 1024
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Token Bearer exigido por /metrics (vacío = sin autenticación)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
 
 ASGI_APPLICATION = "cinecloud.asgi.application"
 DATA_UPLOAD_MAX_MEMORY_SIZE = 1000000  # Sin límite
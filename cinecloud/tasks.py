@@ -0,0 +1,243 @@
+import logging
+import os
+import time
+from celery import shared_task, group
+from celery.signals import worker_process_shutdown
+from django.utils import timezone
+from django.conf import settings
+from django.db import transaction
+from .hls_utils import process_video, process_stream, encode_chunk, link_hls_output, metrics, MediaInfo, STREAM_IDLE_TIMEOUT, STREAM_POLL_INTERVAL
+from .models import MediaAsset, ResumableUpload, TranscodeJob
+from .progress import send_progress_update
+
+logger = logging.getLogger(__name__)
+
+
+@worker_process_shutdown.connect
+def _flush_metrics(**kwargs):
+    # Los procesos del pool de Celery terminan sin pasar por atexit
+    metrics.flush()
+
+
+def _finish_job(job, success, error=None):
+    # Elimina la fuente del trabajo y notifica el resultado al usuario
+    with metrics.span('cleanup'):
+        # Una subida en curso conserva el archivo hasta que complete_upload verifique su hash
+        receiving = job.subida_id and ResumableUpload.objects.filter(
+            pk=job.subida_id, estado=ResumableUpload.Estado.PENDIENTE
+        ).exists()
+        if not receiving and os.path.isfile(job.video):
+            os.remove(job.video)
+
+    if success:
+        job.actualizar_estado(TranscodeJob.Estado.COMPLETADO, progreso=100)
+        if job.usuario_id:
+            send_progress_update(job.usuario_id, f"✅ '{job.titulo}' lista", 100)
+    else:
+        job.actualizar_estado(TranscodeJob.Estado.FALLIDO, error=error)
+        if job.usuario_id:
+            send_progress_update(job.usuario_id, f"❌ Error al procesar '{job.titulo}': {error}", 0, "error")
+
+
+def _upload_available(upload_id):
+    # Bytes contiguos ya recibidos de una subida en curso y si está completa
+    def available():
+        upload = ResumableUpload.objects.get(pk=upload_id)
+        if upload.estado == ResumableUpload.Estado.FALLIDO:
+            raise IOError("La subida se canceló o no es válida")
+        contiguous = upload.contiguos()
+        return contiguous, contiguous >= upload.tamano
+    return available
+
+
+def _wait_for_upload(upload_id, ready):
+    # Espera a que la subida cumpla ready(upload); None si falla, se cancela o deja de avanzar
+    last_change = time.monotonic()
+    received = None
+    while True:
+        upload = ResumableUpload.objects.filter(pk=upload_id).first()
+        if upload is None or upload.estado == ResumableUpload.Estado.FALLIDO:
+            return None
+        if ready(upload):
+            return upload
+        if upload.recibidos != received:
+            received, last_change = upload.recibidos, time.monotonic()
+        elif time.monotonic() - last_change > STREAM_IDLE_TIMEOUT:
+            return None
+        time.sleep(STREAM_POLL_INTERVAL)
+
+
+def _owner_active(owner, job):
+    # La conversión del propietario sigue en marcha: no terminó, informó de progreso
+    # hace poco y no es un reintento del propio trabajo (que vuelve a PENDIENTE)
+    if owner.estado not in (TranscodeJob.Estado.PENDIENTE, TranscodeJob.Estado.PROCESANDO):
+        return False
+    if owner.pk == job.pk and owner.estado == TranscodeJob.Estado.PENDIENTE:
+        return False
+    return (timezone.now() - owner.actualizado).total_seconds() < settings.HLS_DEDUPE_STALE_AFTER
+
+
+def _claim_asset(job):
+    # Decide bajo bloqueo si el trabajo reutiliza una salida existente, espera a otra
+    # conversión del mismo contenido o se encarga él mismo de convertirlo. Si el
+    # propietario falló, se borró o dejó de avanzar (worker muerto), se hace cargo
+    with transaction.atomic():
+        asset = MediaAsset.objects.select_for_update().get(pk=job.asset_id)
+        source_dir = asset.find_output_dir()
+        if source_dir is not None:
+            return 'link', source_dir
+        owner = TranscodeJob.objects.filter(pk=asset.trabajo_id).first() if asset.estado == MediaAsset.Estado.PROCESANDO else None
+        if owner is not None and _owner_active(owner, job):
+            return 'wait', None
+        if owner is not None and owner.pk != job.pk:
+            logger.warning(f"El trabajo {job.id} se hace cargo del contenido que convertía el trabajo {owner.id}")
+        asset.estado = MediaAsset.Estado.PROCESANDO
+        asset.trabajo = job
+        asset.save(update_fields=['estado', 'trabajo'])
+        # Dentro del bloqueo: otra ejecución del mismo trabajo lo verá como propietario activo
+        job.actualizar_estado(TranscodeJob.Estado.PROCESANDO, progreso=0)
+        return 'encode', None
+
+
+def _release_asset(job, success):
+    # Publica el resultado de la conversión y atiende a los trabajos que esperaban el mismo contenido
+    with transaction.atomic():
+        asset = MediaAsset.objects.select_for_update().get(pk=job.asset_id)
+        asset.trabajo = None
+        if success:
+            asset.estado = MediaAsset.Estado.COMPLETADO
+            asset.hls_dir = job.output_dir
+        else:
+            asset.estado = MediaAsset.Estado.FALLIDO
+        asset.save(update_fields=['estado', 'trabajo', 'hls_dir'])
+        waiting = list(asset.trabajos.filter(estado=TranscodeJob.Estado.PENDIENTE).exclude(pk=job.pk).order_by('creado', 'pk'))
+
+    if success:
+        for other in waiting:
+            _finish_job(other, link_hls_output(job.output_dir, other.output_dir), "No se pudo reutilizar la salida HLS")
+    elif waiting:
+        # El trabajo que más tiempo lleva esperando se encarga de la conversión; el resto seguirá esperándolo
+        transcode_video.delay(waiting[0].id)
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=30)
+def transcode_video(self, job_id):
+    # Convierte a HLS el video de un trabajo e informa de cada cambio de estado.
+    # Los reintentos reanudan desde los checkpoints de cada variante.
+    try:
+        job = TranscodeJob.objects.get(pk=job_id)
+    except TranscodeJob.DoesNotExist:
+        return
+    if job.estado in (TranscodeJob.Estado.COMPLETADO, TranscodeJob.Estado.FALLIDO):
+        return job.estado
+
+    user_id = job.usuario_id
+    if not self.request.retries:
+        metrics.observe('cinecloud_transcode_queue_wait_seconds', (timezone.now() - job.creado).total_seconds())
+
+    # Deduplicación por contenido: el mismo archivo sólo se convierte una vez
+    if job.asset_id:
+        action, source_dir = _claim_asset(job)
+        if action == 'link':
+            if user_id:
+                send_progress_update(user_id, f"♻️ '{job.titulo}' ya estaba convertido, reutilizando HLS...", 50)
+            _finish_job(job, link_hls_output(source_dir, job.output_dir), "No se pudo reutilizar la salida HLS")
+            return job.estado
+        if action == 'wait':
+            if job.progreso != 30:
+                # Sólo se avisa la primera vez, no en cada comprobación
+                TranscodeJob.objects.filter(pk=job.pk).update(progreso=30)
+                if user_id:
+                    send_progress_update(user_id, f"⏳ '{job.titulo}' espera a una conversión idéntica en curso", 30)
+            # Se vuelve a comprobar aunque el propietario no llegue a avisar (worker muerto)
+            transcode_video.apply_async((job.id,), countdown=settings.HLS_DEDUPE_POLL_INTERVAL)
+            return job.estado
+
+    if job.estado != TranscodeJob.Estado.PROCESANDO:
+        # _claim_asset ya lo marcó al hacerse cargo del contenido
+        job.actualizar_estado(TranscodeJob.Estado.PROCESANDO, progreso=0)
+    if user_id:
+        send_progress_update(user_id, f"⚙️ Procesando HLS de '{job.titulo}'...", 0)
+
+    def report_progress(overall, renditions):
+        # Progreso real de ffmpeg, ya limitado en frecuencia por ProgressTracker
+        percent = int(overall * 100)
+        # actualizado sirve de latido para los trabajos que esperan el mismo contenido
+        TranscodeJob.objects.filter(pk=job.pk).update(progreso=percent, actualizado=timezone.now())
+        if user_id:
+            detail = ', '.join(f"{name} {int(value * 100)}%" for name, value in renditions.items())
+            send_progress_update(user_id, f"⚙️ Procesando '{job.titulo}': {detail}", percent)
+
+    media_info = MediaInfo.from_dict(job.media_info) if job.media_info else None
+    streaming = False
+    if job.subida_id:
+        # Subida en curso: convertir mientras llega si el inicio del archivo lo permite;
+        # si no (o al reintentar) esperar al archivo completo
+        upload = _wait_for_upload(job.subida_id, lambda u: u.transmisible is not None)
+        streaming = upload is not None and upload.transmisible and not self.request.retries
+        if upload is not None and not streaming:
+            upload = _wait_for_upload(job.subida_id, lambda u: u.contiguos() >= u.tamano)
+        if upload is None:
+            _finish_job(job, False, "La subida no se completó")
+            return job.estado
+        # El análisis del inicio sólo sirve para convertir en recepción; con el archivo completo se repite
+        media_info = MediaInfo.from_dict(upload.media_info) if streaming else None
+    try:
+        if streaming:
+            success = process_stream(
+                job.video,
+                job.output_dir,
+                _upload_available(job.subida_id),
+                media_info,
+                job.rescale,
+                progress_callback=report_progress,
+                progress_interval=settings.HLS_PROGRESS_INTERVAL,
+                audio_only_variant=settings.HLS_AUDIO_ONLY_VARIANT,
+                segment_format=settings.HLS_SEGMENT_FORMAT,
+                priority=job.prioridad
+            )
+        else:
+            success = process_video(
+                job.video,
+                job.output_dir,
+                job.rescale,
+                media_info=media_info,
+                chunks=settings.HLS_CHUNKS,
+                chunk_runner=run_chunks_on_workers,
+                progress_callback=report_progress,
+                progress_interval=settings.HLS_PROGRESS_INTERVAL,
+                audio_only_variant=settings.HLS_AUDIO_ONLY_VARIANT,
+                segment_format=settings.HLS_SEGMENT_FORMAT,
+                per_title=settings.HLS_PER_TITLE,
+                priority=job.prioridad,
+                jit=settings.HLS_JIT_RENDITIONS
+            )
+        error = None if success else "No se pudo generar ninguna resolución HLS"
+    except Exception as e:
+        logger.exception(f"Error al convertir el trabajo {job.id} ('{job.titulo}')")
+        success, error = False, str(e)
+
+    # Conservar la fuente mientras queden reintentos para poder reanudar
+    if not success and self.request.retries < self.max_retries:
+        job.actualizar_estado(TranscodeJob.Estado.PENDIENTE, error=error)
+        metrics.inc('cinecloud_retries_total', {'kind': 'task'})
+        if user_id:
+            send_progress_update(user_id, f"🔁 Reintentando '{job.titulo}'...", 0, "warning")
+        raise self.retry()
+
+    _finish_job(job, success, error)
+    if job.asset_id:
+        _release_asset(job, success)
+    return job.estado
+
+
+@shared_task
+def encode_video_chunk(chunk):
+    # Convierte un tramo del video; los workers deben compartir el almacenamiento de media
+    return encode_chunk(chunk)
+
+
+def run_chunks_on_workers(chunks):
+    # Reparte los fragmentos entre los workers de la cola hls_chunks y espera sus resultados
+    result = group(encode_video_chunk.s(chunk) for chunk in chunks).apply_async()
+    return result.get(disable_sync_subtasks=False)
@@ -0,0 +1,1913 @@
+import hashlib
+import io
+import json
+import gzip
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.signing import BadSignature, SignatureExpired, TimestampSigner
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from movies.models import Pelicula
+from . import hls_utils, tokens
+from .apps import _is_encoding_process
+from .celery import app as celery_app
+from .hls_utils import EncodeScheduler, EncoderSettings, MediaInfo, MetricsRegistry
+from .models import MediaAsset, ResumableUpload, TranscodeJob
+from .serving import IMMUTABLE_MAX_AGE, HLSCache, serve_file
+from .tasks import _finish_job, _release_asset, _upload_available, _wait_for_upload, transcode_video
+from .tokens import authorize, make_token, verify_signed_path, verify_token
+from .uploads import HashingFile, save_upload, stage_chunk
+from .views import resolve_duration
+
+# ffmpeg falso: anota cada invocación y anuncia h264_nvenc, cuya prueba de codificación funciona
+FAKE_FFMPEG = """#!/bin/sh
+echo "$*" >> "{log}"
+if [ "$1" = "-encoders" ]; then
+    echo " V....D h264_nvenc           NVIDIA NVENC H.264 encoder (codec h264)"
+fi
+exit 0
+"""
+
+
+class EncoderCapabilityRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.log = os.path.join(self.tmp, 'calls.log')
+        bin_dir = os.path.join(self.tmp, 'bin')
+        os.makedirs(bin_dir)
+        self.ffmpeg = os.path.join(bin_dir, 'ffmpeg')
+        with open(self.ffmpeg, 'w') as f:
+            f.write(FAKE_FFMPEG.format(log=self.log))
+        os.chmod(self.ffmpeg, 0o755)
+
+        self.cache_path = os.path.join(self.tmp, 'encoders.json')
+        self.registry = hls_utils.EncoderCapabilityRegistry(cache_path=self.cache_path, ttl=3600)
+        patches = [
+            mock.patch.dict(os.environ, {'PATH': bin_dir + os.pathsep + os.environ.get('PATH', '')}),
+            mock.patch.object(hls_utils, 'encoder_registry', self.registry),
+            # Sin GPUtil ni NVML reales: sólo cuenta lo que diga el ffmpeg falso
+            mock.patch.object(hls_utils, '_detect_gpus_with_gputil', return_value={'nvidia': False, 'amd': False}),
+            mock.patch.object(hls_utils, '_detect_gpus_with_pynvml', return_value={'nvidia': False, 'amd': False}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def ffmpeg_calls(self):
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as f:
+            return f.read().splitlines()
+
+    def test_repeated_uploads_start_no_detection_subprocesses(self):
+        for _ in range(5):
+            settings = hls_utils.get_video_encoder_settings()
+            self.assertEqual(settings.codec, 'h264_nvenc')
+        # Una sola detección: ffmpeg -encoders y la codificación de prueba de NVENC
+        calls = self.ffmpeg_calls()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0], '-encoders')
+
+    def test_new_process_reuses_disk_cache(self):
+        self.registry.get()
+        calls = len(self.ffmpeg_calls())
+        other = hls_utils.EncoderCapabilityRegistry(cache_path=self.cache_path, ttl=3600)
+        self.assertTrue(other.gpus()['nvidia'])
+        self.assertEqual(len(self.ffmpeg_calls()), calls)
+
+    def test_changed_ffmpeg_binary_is_detected_again(self):
+        self.registry.get()
+        calls = len(self.ffmpeg_calls())
+        stat = os.stat(self.ffmpeg)
+        os.utime(self.ffmpeg, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        hls_utils.EncoderCapabilityRegistry(cache_path=self.cache_path, ttl=3600).get()
+        self.assertGreater(len(self.ffmpeg_calls()), calls)
+
+    def test_expired_cache_is_detected_again(self):
+        self.registry.get()
+        calls = len(self.ffmpeg_calls())
+        with mock.patch.object(hls_utils.time, 'time', return_value=time.time() + 7200):
+            self.registry.get()
+        self.assertGreater(len(self.ffmpeg_calls()), calls)
+
+    def test_invalidate_forces_detection(self):
+        self.registry.get()
+        calls = len(self.ffmpeg_calls())
+        self.registry.invalidate()
+        self.assertFalse(os.path.exists(self.cache_path))
+        self.registry.get()
+        self.assertGreater(len(self.ffmpeg_calls()), calls)
+
+
+class EncoderWarmUpProcessTests(SimpleTestCase):
+    def test_servers_and_workers_warm_up(self):
+        for argv in (
+            ['/usr/local/bin/uvicorn', 'cinecloud.asgi:application'],
+            ['/usr/lib/python3/site-packages/uvicorn/__main__.py', 'cinecloud.asgi:application'],
+            ['manage.py', 'runserver'],
+            ['/usr/local/bin/celery', '-A', 'cinecloud', 'worker', '-l', 'info'],
+        ):
+            self.assertTrue(_is_encoding_process(argv), argv)
+
+    def test_management_commands_do_not_warm_up(self):
+        for argv in (
+            ['manage.py', 'migrate'],
+            ['manage.py', 'makemigrations'],
+            ['manage.py', 'test'],
+            ['/usr/local/bin/celery', '-A', 'cinecloud', 'beat'],
+        ):
+            self.assertFalse(_is_encoding_process(argv), argv)
+
+HAS_FFMPEG = bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+
+def make_test_video(path, duration, size='320x240'):
+    """Video sintético (testsrc2 + tono) para las pruebas que ejecutan ffmpeg de verdad"""
+    subprocess.run([
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=25:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '25', '-pix_fmt', 'yuv420p', '-c:a', 'aac', path
+    ], check=True)
+    return path
+
+
+def probe_format(path):
+    output = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=start_time,duration', '-of', 'json', path],
+        stdout=subprocess.PIPE, check=True
+    ).stdout
+    data = json.loads(output)['format']
+    return float(data['start_time']), float(data['duration'])
+
+
+@unittest.skipUnless(HAS_FFMPEG, "Requiere ffmpeg y ffprobe")
+class ResumeAfterKillTests(SimpleTestCase):
+    DURATION = 60
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.source = make_test_video(os.path.join(self.tmp, 'source.mp4'), self.DURATION)
+        self.output_dir = os.path.join(self.tmp, 'hls')
+        self.killed_at = None
+        self.segments_before_kill = {}
+        patch = mock.patch.object(hls_utils.time, 'sleep')
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def killing_run_ffmpeg(self, run_ffmpeg):
+        # El primer intento se mata con SIGKILL a mitad del video; los siguientes son normales
+        def run(cmd, duration=0, *args, **kwargs):
+            if self.killed_at is not None:
+                return run_ffmpeg(cmd, duration, *args, **kwargs)
+            command = cmd.global_args('-progress', 'pipe:1', '-nostats', '-stats_period', '0.1').compile(overwrite_output=True)
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            for line in process.stdout:
+                key, _, value = line.decode().strip().partition('=')
+                if key == 'out_time_us' and value.isdigit() and int(value) >= duration * 1_000_000 / 2:
+                    process.send_signal(signal.SIGKILL)
+                    self.killed_at = int(value) / 1_000_000
+                    break
+            process.wait()
+            for name in os.listdir(self.output_dir):
+                if name.endswith('.ts'):
+                    st = os.stat(os.path.join(self.output_dir, name))
+                    self.segments_before_kill[name] = (st.st_ino, st.st_mtime_ns)
+            raise hls_utils.ffmpeg.Error('ffmpeg', b'', b'killed')
+        return run
+
+    def test_killed_encode_resumes_into_continuous_complete_output(self):
+        media_info = hls_utils.probe_media(self.source)
+        with mock.patch.object(hls_utils, 'run_ffmpeg', side_effect=self.killing_run_ffmpeg(hls_utils.run_ffmpeg)):
+            success = hls_utils.convert_to_resolution(
+                self.source, self.output_dir, (320, 240), '400k',
+                EncoderSettings(codec='libx264', preset='veryfast'), media_info
+            )
+        self.assertTrue(success)
+        self.assertIsNotNone(self.killed_at, "ffmpeg terminó antes de poder matarlo")
+        self.assertTrue(hls_utils.is_rendition_complete(self.source, self.output_dir, '240p', '400k'))
+
+        # Los segmentos terminados antes de matar ffmpeg se conservan sin reescribir
+        checkpoint = hls_utils.load_checkpoint(self.source, self.output_dir, '240p', '400k')
+        names = [segment['name'] for segment in checkpoint['segments']]
+        kept = [name for name in names if name in self.segments_before_kill]
+        self.assertTrue(kept)
+        for name in kept[:-1]:
+            st = os.stat(os.path.join(self.output_dir, name))
+            self.assertEqual((st.st_ino, st.st_mtime_ns), self.segments_before_kill[name])
+
+        # Numeración sin huecos ni duplicados
+        self.assertEqual(names, [f'240p_{index:03d}.ts' for index in range(len(names))])
+        with open(os.path.join(self.output_dir, '240p.m3u8')) as f:
+            self.assertIn('#EXT-X-ENDLIST', f.read())
+
+        # Cada segmento empieza donde acaba el anterior y el total cubre toda la fuente
+        timeline = [probe_format(os.path.join(self.output_dir, name)) for name in names]
+        for (start, duration), (next_start, _) in zip(timeline, timeline[1:]):
+            self.assertAlmostEqual(start + duration, next_start, delta=0.25)
+        total = sum(segment['duration'] for segment in checkpoint['segments'])
+        self.assertAlmostEqual(total, self.DURATION, delta=0.5)
+        self.assertAlmostEqual(timeline[-1][0] + timeline[-1][1] - timeline[0][0], self.DURATION, delta=0.5)
+
+
+class TrickplayFreshnessTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.source = os.path.join(self.tmp, 'source.mp4')
+        self.write_source(b'primer video')
+        self.output_dir = os.path.join(self.tmp, 'hls')
+        os.makedirs(self.output_dir)
+        self.media_info = MediaInfo(
+            streams=(), width=320, height=240, duration=30.0, fps=25.0,
+            video_codec='h264', audio_codec=None, bitrate=400000, has_audio=False
+        )
+
+    def write_source(self, data):
+        with open(self.source, 'wb') as f:
+            f.write(data)
+        # Otro contenido con el mismo nombre, aunque se escriba en el mismo instante
+        os.utime(self.source, ns=(time.time_ns(), time.time_ns() + len(data)))
+
+    def write_trickplay(self, input_path=None):
+        with open(os.path.join(self.output_dir, 'sprite_001.jpg'), 'wb') as f:
+            f.write(b'sprite')
+        return hls_utils.write_trickplay_vtt(self.output_dir, self.media_info, input_path)
+
+    def test_complete_only_for_the_source_it_was_generated_from(self):
+        self.assertTrue(self.write_trickplay(self.source))
+        self.assertTrue(hls_utils.trickplay_complete(self.output_dir, self.source))
+
+        self.write_source(b'otro video distinto')
+        self.assertFalse(hls_utils.trickplay_complete(self.output_dir, self.source))
+
+    def test_vtt_without_fingerprint_is_not_complete(self):
+        # Salida de una versión anterior, sin huella de la fuente
+        self.assertTrue(self.write_trickplay())
+        self.assertFalse(hls_utils.trickplay_complete(self.output_dir, self.source))
+
+    def test_fresh_process_video_removes_stale_trickplay(self):
+        self.assertTrue(self.write_trickplay(self.source))
+        self.write_source(b'otro video distinto')
+
+        seen = {}
+        def process_renditions(*args):
+            seen['vtt'] = os.path.exists(os.path.join(self.output_dir, hls_utils.TRICKPLAY_VTT))
+            seen['sprite'] = os.path.exists(os.path.join(self.output_dir, 'sprite_001.jpg'))
+            return True, self.media_info
+
+        with mock.patch.object(hls_utils, '_process_renditions', side_effect=process_renditions), \
+                mock.patch.object(hls_utils, 'generate_trickplay') as generate, \
+                mock.patch.object(hls_utils, 'write_serving_manifest', return_value=True):
+            self.assertTrue(hls_utils.process_video(self.source, self.output_dir, trickplay=False))
+        self.assertEqual(seen, {'vtt': False, 'sprite': False})
+        generate.assert_not_called()
+
+        self.write_trickplay(self.source)
+        with mock.patch.object(hls_utils, '_process_renditions', return_value=(True, self.media_info)), \
+                mock.patch.object(hls_utils, 'generate_trickplay') as generate, \
+                mock.patch.object(hls_utils, 'write_serving_manifest', return_value=True):
+            self.assertTrue(hls_utils.process_video(self.source, self.output_dir))
+        # Las miniaturas de esta misma fuente se conservan sin regenerarlas
+        generate.assert_not_called()
+        self.assertTrue(hls_utils.trickplay_complete(self.output_dir, self.source))
+
+
+class EncodeBudgetTests(SimpleTestCase):
+    def test_concurrent_leases_never_exceed_the_budget(self):
+        scheduler = EncodeScheduler({'cpu': 3, 'gpu': 1}, threads=6, redis_url=None)
+        lock = threading.Lock()
+        usage = {'current': 0, 'peak': 0}
+
+        def encode(weight):
+            with scheduler.lease('cpu', weight=weight) as threads:
+                self.assertEqual(threads, 2 * weight)
+                with lock:
+                    usage['current'] += weight
+                    usage['peak'] = max(usage['peak'], usage['current'])
+                time.sleep(0.01)
+                with lock:
+                    usage['current'] -= weight
+
+        workers = [threading.Thread(target=encode, args=(1 + index % 3,)) for index in range(24)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertLessEqual(usage['peak'], 3)
+        self.assertEqual(scheduler.stats()['cpu']['in_use'], 0)
+        self.assertLessEqual(scheduler.stats()['cpu']['peak'], 3)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Requiere fork")
+    def test_forked_child_does_not_inherit_leases_or_held_lock(self):
+        scheduler = hls_utils.encode_scheduler
+        with scheduler.lease('cpu', weight=scheduler.budgets['cpu']), scheduler._condition:
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    with scheduler.lease('cpu'):
+                        os._exit(0 if scheduler.stats()['cpu']['in_use'] == 1 else 1)
+                finally:
+                    os._exit(2)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                break
+            time.sleep(0.05)
+        else:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.fail("El proceso hijo se bloqueó esperando un permiso del padre")
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+
+# Codificadores de video en marcha en todos los procesos del pool de fragmentos
+_running_encoders = multiprocessing.Value('i', 0)
+_peak_encoders = multiprocessing.Value('i', 0)
+
+
+def _counting_run_ffmpeg(cmd, *args, **kwargs):
+    arguments = cmd.compile()
+    encoders = sum(1 for argument in arguments if argument.endswith('.m3u8'))
+    with _running_encoders.get_lock():
+        _running_encoders.value += encoders
+        _peak_encoders.value = max(_peak_encoders.value, _running_encoders.value)
+    time.sleep(0.2)
+    with _running_encoders.get_lock():
+        _running_encoders.value -= encoders
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == 'fork', "Los procesos del pool deben heredar el parche")
+class ChunkPoolBudgetTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        _running_encoders.value = _peak_encoders.value = 0
+
+    def test_chunk_pool_stays_within_the_cpu_budget(self):
+        media_info = MediaInfo(
+            streams=(), width=1280, height=720, duration=40.0, fps=25.0,
+            video_codec='h264', audio_codec=None, bitrate=2000000, has_audio=False
+        )
+        chunks = [
+            {
+                'index': index,
+                'input_path': os.path.join(self.tmp, 'source.mp4'),
+                'output_dir': self.tmp,
+                'start': index * 10.0,
+                'end': (index + 1) * 10.0,
+                'resolutions': [[1280, 720, '2800k'], [854, 480, '1400k']],
+                'audio_renditions': None,
+                'encoder': {'codec': 'libx264', 'preset': 'veryfast', 'quality': None},
+                'media_info': media_info.to_dict(),
+                'threads': 4,
+            }
+            for index in range(4)
+        ]
+        scheduler = hls_utils.encode_scheduler
+        with mock.patch.object(scheduler, 'budgets', {'cpu': 4, 'gpu': 1}), \
+                mock.patch.object(scheduler, 'threads', 8), \
+                mock.patch.object(hls_utils, 'run_ffmpeg', _counting_run_ffmpeg):
+            results = hls_utils._run_chunks_locally(chunks)
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertEqual(_peak_encoders.value, 4)
+        self.assertEqual(scheduler.stats()['cpu']['in_use'], 0)
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def snapshots(self):
+        return sorted(name for name in os.listdir(self.tmp) if name.startswith('metrics_'))
+
+    def write_snapshot(self, name, value, age=0):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as f:
+            json.dump({'counters': [['cinecloud_retries_total', [], value]], 'histograms': []}, f)
+        if age:
+            os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_measures_do_not_write_the_snapshot_synchronously(self):
+        registry = MetricsRegistry(self.tmp, flush_interval=3600)
+        for _ in range(1000):
+            registry.inc('cinecloud_retries_total', {'scope': 'ffmpeg'})
+            registry.observe('cinecloud_stage_seconds', 0.3, {'stage': 'probe'})
+        self.assertEqual(self.snapshots(), [])
+
+        registry.flush()
+        self.assertEqual(len(self.snapshots()), 1)
+        output = registry.render()
+        self.assertIn('cinecloud_retries_total{scope="ffmpeg"} 1000', output)
+        self.assertIn('cinecloud_stage_seconds_count{stage="probe"} 1000', output)
+
+    def test_background_flush_writes_pending_measures(self):
+        registry = MetricsRegistry(self.tmp, flush_interval=0.05)
+        registry.inc('cinecloud_fallbacks_total')
+        deadline = time.monotonic() + 5
+        while not self.snapshots() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(len(self.snapshots()), 1)
+
+    def test_render_prunes_snapshots_of_dead_processes(self):
+        host = socket.gethostname()
+        finished = subprocess.Popen(['true'])
+        finished.wait()
+        dead = self.write_snapshot(f'metrics_{host}_{finished.pid}.json', 5)
+        alive = self.write_snapshot(f'metrics_{host}_{os.getppid()}.json', 7)
+        remote = self.write_snapshot('metrics_otro-host_1.json', 11)
+        abandoned = self.write_snapshot('metrics_otro-host_2.json', 13, age=hls_utils.METRICS_STALE_AFTER + 60)
+
+        output = MetricsRegistry(self.tmp).render()
+        self.assertIn('cinecloud_retries_total 18', output)
+        self.assertFalse(os.path.exists(dead))
+        self.assertFalse(os.path.exists(abandoned))
+        self.assertTrue(os.path.exists(alive))
+        self.assertTrue(os.path.exists(remote))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Requiere fork")
+    def test_forked_child_starts_with_empty_metrics(self):
+        hls_utils.metrics.inc('cinecloud_fallbacks_total', {'method': 'test'})
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if hls_utils.metrics._snapshot()['counters'] == [] else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+
+# Codificaciones bajo demanda en curso en todos los procesos
+_running_jit = multiprocessing.Value('i', 0)
+_peak_jit = multiprocessing.Value('i', 0)
+
+
+def _failing_jit_run_ffmpeg(cmd, *args, **kwargs):
+    # Un intento fallido: cada proceso vuelve a codificar después del anterior
+    with _running_jit.get_lock():
+        _running_jit.value += 1
+        _peak_jit.value = max(_peak_jit.value, _running_jit.value)
+    time.sleep(0.1)
+    with open(cmd.compile()[-1], 'wb') as f:
+        f.write(b'parcial')
+    with _running_jit.get_lock():
+        _running_jit.value -= 1
+    raise RuntimeError("fallo simulado")
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == 'fork', "Los procesos deben heredar el parche")
+class JitSegmentLockTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        _running_jit.value = _peak_jit.value = 0
+        with open(os.path.join(self.tmp, '360p.jit.json'), 'w') as f:
+            json.dump({
+                'source': '.source.mp4', 'width': 640, 'height': 360, 'bitrate': '800k',
+                'segments': {'360p_000.ts': [0.0, 6.0]}
+            }, f)
+
+    def test_concurrent_processes_never_encode_the_same_segment_at_once(self):
+        encoder = EncoderSettings(codec='libx264', preset='veryfast')
+        with mock.patch.object(hls_utils, 'run_ffmpeg', _failing_jit_run_ffmpeg):
+            pids = []
+            for _ in range(4):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        hls_utils.generate_jit_segment(self.tmp, '360p_000.ts', encoder)
+                    finally:
+                        os._exit(0)
+                pids.append(pid)
+            for pid in pids:
+                os.waitpid(pid, 0)
+        self.assertEqual(_peak_jit.value, 1)
+        # El lock se conserva y no quedan temporales de los intentos fallidos
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['360p.jit.json', '360p_000.ts.lock'])
+
+
+class SaveUploadMemoryTests(SimpleTestCase):
+    SIZE = 48 * 1024 * 1024
+    MAX_PEAK = 4 * 1024 * 1024
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.storage = FileSystemStorage(location=os.path.join(self.tmp, 'media'))
+
+    def fill(self, f):
+        # Contenido pseudoaleatorio por bloques; devuelve su SHA-256
+        hasher = hashlib.sha256()
+        block = os.urandom(1024 * 1024)
+        for index in range(self.SIZE // len(block)):
+            data = index.to_bytes(8, 'big') + block[8:]
+            hasher.update(data)
+            f.write(data)
+        f.seek(0)
+        return hasher.hexdigest()
+
+    def measure(self, function):
+        tracemalloc.start()
+        try:
+            result = function()
+            return result, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def assertSaved(self, result, digest, peak):
+        path, sha256, size = result
+        self.assertEqual((sha256, size), (digest, self.SIZE))
+        self.assertEqual(os.path.getsize(self.storage.path(path)), self.SIZE)
+        self.assertLess(peak, self.MAX_PEAK)
+
+    def test_spooled_upload_is_moved_with_bounded_memory(self):
+        with override_settings(FILE_UPLOAD_TEMP_DIR=self.tmp):
+            upload = TemporaryUploadedFile('video.mp4', 'video/mp4', self.SIZE, None)
+        digest = self.fill(upload)
+        spooled = upload.temporary_file_path()
+        result, peak = self.measure(lambda: save_upload(upload, 'videos/video.mp4', self.storage))
+        upload.close()
+        self.assertSaved(result, digest, peak)
+        # FileSystemStorage mueve el temporal en lugar de copiarlo
+        self.assertFalse(os.path.exists(spooled))
+
+    def test_stream_without_temporary_file_is_copied_by_chunks(self):
+        source = open(os.path.join(self.tmp, 'source.mp4'), 'w+b')
+        self.addCleanup(source.close)
+        digest = self.fill(source)
+        upload = SimpleUploadedFile('video.mp4', b'', 'video/mp4')
+        upload.file, upload.size = source, self.SIZE
+        result, peak = self.measure(lambda: save_upload(upload, 'videos/video.mp4', self.storage))
+        self.assertSaved(result, digest, peak)
+
+    def test_large_multipart_request_is_parsed_and_saved_with_bounded_memory(self):
+        source = open(os.path.join(self.tmp, 'video.mp4'), 'w+b')
+        self.addCleanup(source.close)
+        digest = self.fill(source)
+        with override_settings(FILE_UPLOAD_TEMP_DIR=self.tmp):
+            request = RequestFactory().post('/upload/', {'titulo': 'Prueba', 'video': source})
+            # El cuerpo ya está en memoria; sólo se mide lo que cuesta procesarlo
+            result, peak = self.measure(
+                lambda: save_upload(request.FILES['video'], 'videos/video.mp4', self.storage)
+            )
+        request.FILES['video'].close()
+        self.assertSaved(result, digest, peak)
+
+    def test_hashing_file_hashes_what_it_yields(self):
+        data = os.urandom(3 * 64 * 1024 + 17)
+        hashing_file = HashingFile(SimpleUploadedFile('video.mp4', data))
+        self.assertEqual(b''.join(hashing_file.chunks(64 * 1024)), data)
+        self.assertEqual(hashing_file.hasher.hexdigest(), hashlib.sha256(data).hexdigest())
+        self.assertEqual(hashing_file.bytes_read, len(data))
+
+
+@override_settings(MEDIA_SERVE_BACKEND='python', HLS_PLAYLIST_MAX_AGE=5)
+class ServeFileTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.factory = RequestFactory()
+        self.segment = self.write('720p_005.ts', bytes(range(256)) * 40)
+        self.playlist = self.write('720p.m3u8', b'#EXTM3U\n' + b'#EXTINF:6.0,\n720p_000.ts\n' * 50)
+        # Sin caché en memoria: las respuestas se envían por streaming salvo en las pruebas de la caché
+        patch = mock.patch('cinecloud.serving.hls_cache', HLSCache(0, 0))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def write(self, name, data, mtime_ns=None):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def serve(self, path, public=True, **headers):
+        return serve_file(self.factory.get('/hls/', headers=headers), path, public)
+
+    def body(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_full_response_headers(self):
+        response = self.serve(self.segment)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.read(self.segment))
+        self.assertEqual(response['Content-Type'], 'video/mp2t')
+        self.assertEqual(response['Content-Length'], str(os.path.getsize(self.segment)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        st = os.stat(self.segment)
+        self.assertEqual(response['ETag'], f'"{st.st_mtime_ns:x}-{st.st_size:x}"')
+
+    def test_etag_from_serving_manifest_while_file_is_unchanged(self):
+        st = os.stat(self.segment)
+        with open(os.path.join(self.tmp, hls_utils.SERVING_MANIFEST), 'w') as f:
+            json.dump({'720p_005.ts': ['abc123', st.st_size, st.st_mtime_ns]}, f)
+        self.assertEqual(self.serve(self.segment)['ETag'], '"abc123"')
+
+        self.write('720p_005.ts', b'reescrito', mtime_ns=st.st_mtime_ns + 1)
+        self.assertNotEqual(self.serve(self.segment)['ETag'], '"abc123"')
+
+    def test_if_none_match_returns_304(self):
+        etag = self.serve(self.segment)['ETag']
+        for header in (etag, f'W/{etag}', f'"otro", {etag}', '*'):
+            response = self.serve(self.segment, **{'If-None-Match': header})
+            self.assertEqual(response.status_code, 304, header)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response['Cache-Control'], f'public, max-age={IMMUTABLE_MAX_AGE}, immutable')
+            self.assertEqual(response.content, b'')
+        self.assertEqual(self.serve(self.segment, **{'If-None-Match': '"otro"'}).status_code, 200)
+
+    def test_byte_ranges_are_exact(self):
+        data = self.read(self.segment)
+        size = len(data)
+        for header, (start, end) in (
+            ('bytes=0-0', (0, 0)),
+            ('bytes=100-1099', (100, 1099)),
+            ('bytes=9000-', (9000, size - 1)),
+            ('bytes=-500', (size - 500, size - 1)),
+            ('bytes=10000-99999', (10000, size - 1)),
+        ):
+            response = self.serve(self.segment, Range=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+            self.assertEqual(response['Content-Length'], str(end - start + 1))
+            self.assertEqual(self.body(response), data[start:end + 1], header)
+
+    def test_unsatisfiable_range_returns_416(self):
+        size = os.path.getsize(self.segment)
+        for header in (f'bytes={size}-', f'bytes={size + 10}-{size + 20}', 'bytes=-0', 'bytes=500-100'):
+            response = self.serve(self.segment, Range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_unparseable_or_multiple_ranges_return_the_whole_file(self):
+        for header in ('items=0-10', 'bytes=0-10,20-30', 'bytes=-'):
+            response = self.serve(self.segment, Range=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(self.body(response), self.read(self.segment))
+
+    def test_if_range(self):
+        etag = self.serve(self.segment)['ETag']
+        response = self.serve(self.segment, Range='bytes=0-99', **{'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.read(self.segment)[:100])
+
+        # El archivo cambió desde la primera parte: se envía completo
+        response = self.serve(self.segment, Range='bytes=0-99', **{'If-Range': '"viejo"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Range', response)
+        self.assertEqual(self.body(response), self.read(self.segment))
+
+        # Con la fecha de Last-Modified; una fecha anterior, un ETag débil o una fecha inválida no valen
+        last_modified = self.serve(self.segment)['Last-Modified']
+        self.assertEqual(self.serve(self.segment, Range='bytes=0-99', **{'If-Range': last_modified}).status_code, 206)
+        mtime = os.stat(self.segment).st_mtime
+        for header in ('Sat, 01 Jan 2000 00:00:00 GMT', f'W/{etag}', 'ayer'):
+            response = self.serve(self.segment, Range='bytes=0-99', **{'If-Range': header})
+            self.assertEqual(response.status_code, 200, header)
+        os.utime(self.segment, (mtime + 10, mtime + 10))
+        self.assertEqual(self.serve(self.segment, Range='bytes=0-99', **{'If-Range': last_modified}).status_code, 200)
+
+    def test_cache_control(self):
+        self.assertEqual(self.serve(self.segment)['Cache-Control'], f'public, max-age={IMMUTABLE_MAX_AGE}, immutable')
+        self.assertEqual(
+            self.serve(self.segment, public=False)['Cache-Control'], f'private, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        )
+        self.assertEqual(self.serve(self.playlist)['Cache-Control'], 'public, max-age=5')
+        self.assertEqual(self.serve(self.playlist, public=False)['Cache-Control'], 'private, max-age=5')
+
+    def test_precompressed_playlist_selection(self):
+        data = self.read(self.playlist)
+        mtime = os.stat(self.playlist).st_mtime_ns
+        self.write('720p.m3u8.gz', gzip.compress(data), mtime_ns=mtime)
+        self.write('720p.m3u8.br', b'brotli', mtime_ns=mtime)
+        etag = self.serve(self.playlist)['ETag']
+
+        response = self.serve(self.playlist, **{'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(self.body(response), b'brotli')
+        self.assertEqual(response['ETag'], f'{etag[:-1]}-br"')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        response = self.serve(self.playlist, **{'Accept-Encoding': 'gzip, br;q=0'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(self.body(response)), data)
+        self.assertEqual(response['Content-Length'], str(os.path.getsize(self.playlist + '.gz')))
+
+        # Sin Accept-Encoding, con Range o con una versión comprimida anterior a la playlist
+        for headers in ({}, {'Accept-Encoding': 'gzip', 'Range': 'bytes=0-9'}):
+            response = self.serve(self.playlist, **headers)
+            self.assertNotIn('Content-Encoding', response)
+            self.assertEqual(self.body(response), data[:10] if headers else data)
+        os.utime(self.playlist, ns=(mtime + 10**9, mtime + 10**9))
+        response = self.serve(self.playlist, **{'Accept-Encoding': 'gzip, br'})
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_precompressed_variant_has_its_own_etag_for_304(self):
+        mtime = os.stat(self.playlist).st_mtime_ns
+        self.write('720p.m3u8.gz', gzip.compress(self.read(self.playlist)), mtime_ns=mtime)
+        etag = self.serve(self.playlist, **{'Accept-Encoding': 'gzip'})['ETag']
+        response = self.serve(self.playlist, **{'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        # La misma ETag no valida la versión sin comprimir
+        self.assertEqual(self.serve(self.playlist, **{'If-None-Match': etag}).status_code, 200)
+
+    def test_cached_responses_match_streamed_ones(self):
+        data = self.read(self.segment)
+        with mock.patch('cinecloud.serving.hls_cache', HLSCache(1024 * 1024, 10)):
+            for _ in range(2):
+                response = self.serve(self.segment, Range='bytes=10-19')
+                self.assertFalse(response.streaming)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response.content, data[10:20])
+            self.assertEqual(self.serve(self.segment).content, data)
+
+
+class OffloadResponseTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.media_root = os.path.join(self.tmp, 'media')
+        self.directory = os.path.join(self.media_root, 'hls', 'pelicula', 'Mi película')
+        os.makedirs(self.directory)
+        self.segment = self.write(os.path.join(self.directory, '720p_000.ts'), b'segmento')
+        self.playlist = self.write(os.path.join(self.directory, '720p.m3u8'), b'#EXTM3U\n')
+        self.factory = RequestFactory()
+
+    def write(self, path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def serve(self, path, backend, public=True, **headers):
+        with override_settings(MEDIA_ROOT=self.media_root, MEDIA_SERVE_BACKEND=backend, MEDIA_ACCEL_PREFIX='/protected-media/'):
+            return serve_file(self.factory.get('/hls/', headers=headers), path, public)
+
+    def test_nginx_maps_the_path_under_the_internal_location(self):
+        response = self.serve(self.segment, 'nginx')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected-media/hls/pelicula/Mi%20pel%C3%ADcula/720p_000.ts'
+        )
+        self.assertNotIn('X-Sendfile', response)
+        self.assertEqual(response.content, b'')
+
+    def test_sendfile_uses_the_absolute_path(self):
+        response = self.serve(self.segment, 'sendfile')
+        self.assertEqual(response['X-Sendfile'], self.segment)
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(response.content, b'')
+
+    def test_validators_and_cache_policy_are_preserved(self):
+        expected = self.serve(self.segment, 'python', public=False)
+        for backend in ('nginx', 'sendfile'):
+            response = self.serve(self.segment, backend, public=False)
+            self.assertEqual(response['Content-Type'], 'video/mp2t')
+            self.assertEqual(response['ETag'], expected['ETag'])
+            self.assertEqual(response['Cache-Control'], expected['Cache-Control'])
+            # El proxy resuelve Range y la longitud del cuerpo
+            self.assertNotIn('Content-Range', response)
+
+        response = self.serve(self.playlist, 'nginx')
+        self.assertEqual(response['Content-Type'], 'application/vnd.apple.mpegurl')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Cache-Control'], self.serve(self.playlist, 'python')['Cache-Control'])
+
+    def test_not_modified_is_answered_by_django(self):
+        etag = self.serve(self.segment, 'python')['ETag']
+        for backend in ('nginx', 'sendfile'):
+            response = self.serve(self.segment, backend, **{'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertNotIn('X-Accel-Redirect', response)
+            self.assertNotIn('X-Sendfile', response)
+
+    def test_files_outside_media_root_fall_back_to_python(self):
+        outside = self.write(os.path.join(self.tmp, '720p_000.ts'), b'fuera de media')
+        with mock.patch('cinecloud.serving.hls_cache', HLSCache(0, 0)):
+            for backend in ('nginx', 'sendfile'):
+                response = self.serve(outside, backend, Range='bytes=0-3')
+                self.assertNotIn('X-Accel-Redirect', response)
+                self.assertNotIn('X-Sendfile', response)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content), b'fuer')
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.serve(self.segment, 'apache')
+
+
+def make_media_info(width=1280, height=720, duration=60.0, has_audio=True, **video):
+    streams = [{'codec_type': 'video', 'codec_name': 'h264', 'profile': 'High', 'pix_fmt': 'yuv420p', **video}]
+    if has_audio:
+        streams.append({'codec_type': 'audio', 'codec_name': 'aac'})
+    return MediaInfo(
+        streams=tuple(streams), width=width, height=height, duration=duration, fps=25.0,
+        video_codec='h264', audio_codec='aac' if has_audio else None, bitrate=3000000, has_audio=has_audio
+    )
+
+
+def fake_hls_run_ffmpeg(cmd, *args, **kwargs):
+    # Escribe para cada playlist de salida una variante de un solo segmento, como haría ffmpeg
+    for argument in cmd.compile():
+        if argument.endswith('.m3u8'):
+            name = os.path.splitext(os.path.basename(argument))[0]
+            with open(os.path.join(os.path.dirname(argument), f'{name}_000.ts'), 'wb') as f:
+                f.write(b'\x47' * 188)
+            with open(argument, 'w') as f:
+                f.write(f'#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.000000,\n{name}_000.ts\n#EXT-X-ENDLIST\n')
+
+
+class MediaInfoTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def test_to_dict_round_trips_through_json(self):
+        media_info = make_media_info()
+        data = json.loads(json.dumps(media_info.to_dict()))
+        self.assertEqual(MediaInfo.from_dict(data), media_info)
+        self.assertEqual(MediaInfo.from_dict(data).video_stream['profile'], 'High')
+
+    def test_media_info_from_probe(self):
+        probe = {
+            'format': {'duration': '12.5', 'bit_rate': '800000'},
+            'streams': [
+                {'codec_type': 'video', 'codec_name': 'h264', 'width': 640, 'height': 360, 'avg_frame_rate': '30000/1001'},
+                {'codec_type': 'audio', 'codec_name': 'aac'},
+            ]
+        }
+        with mock.patch.object(hls_utils.ffmpeg, 'probe', return_value=probe) as probe_mock:
+            media_info = hls_utils.probe_media('video.mp4')
+        probe_mock.assert_called_once_with('video.mp4')
+        self.assertEqual((media_info.width, media_info.height, media_info.duration), (640, 360, 12.5))
+        self.assertAlmostEqual(media_info.fps, 29.97, places=2)
+        self.assertTrue(media_info.has_audio)
+        self.assertEqual(media_info.bitrate, 800000)
+
+    def test_process_video_with_media_info_never_probes_source(self):
+        source = os.path.join(self.tmp, 'source.mp4')
+        with open(source, 'wb') as f:
+            f.write(b'video')
+        output_dir = os.path.join(self.tmp, 'hls')
+        with mock.patch.object(hls_utils.ffmpeg, 'probe', side_effect=AssertionError("ffprobe ejecutado")) as probe, \
+                mock.patch.object(hls_utils, 'run_ffmpeg', side_effect=fake_hls_run_ffmpeg):
+            success = hls_utils.process_video(
+                source, output_dir, media_info=make_media_info(),
+                encoder_settings=EncoderSettings(codec='libx264', preset='veryfast'),
+                stream_copy=False, per_title=False, trickplay=False
+            )
+        self.assertTrue(success)
+        # Sólo se analizan los segmentos generados (CODECS del master playlist)
+        self.assertNotIn(source, [call.args[0] for call in probe.call_args_list])
+        self.assertTrue(os.path.isfile(os.path.join(output_dir, 'playlist.m3u8')))
+
+    def test_resolve_duration_uses_the_probed_duration(self):
+        media_info = make_media_info(duration=5430.0)
+        self.assertEqual(resolve_duration('95', media_info), 95)
+        for duration in (None, '', '0', 0, 'abc'):
+            self.assertEqual(resolve_duration(duration, media_info), 90, duration)
+        self.assertEqual(resolve_duration('0', make_media_info(duration=10.0)), 1)
+        self.assertEqual(resolve_duration(None, None), 0)
+
+
+class ChunkPlanningTests(SimpleTestCase):
+    def test_boundaries_snap_to_the_nearest_keyframe(self):
+        keyframes = [float(t) for t in range(0, 240, 4)]
+        self.assertEqual(hls_utils.plan_chunks(keyframes, 240.0, 4), [(0.0, 60.0), (60.0, 120.0), (120.0, 180.0), (180.0, None)])
+
+        keyframes = [0.0, 55.0, 70.0, 118.0, 190.0]
+        self.assertEqual(hls_utils.plan_chunks(keyframes, 240.0, 4), [(0.0, 55.0), (55.0, 118.0), (118.0, 190.0), (190.0, None)])
+
+    def test_chunks_shorter_than_the_minimum_are_merged(self):
+        minimum = hls_utils.MIN_CHUNK_DURATION
+        keyframes = [float(t) for t in range(0, 100)]
+        duration = 2.5 * minimum
+        ranges = hls_utils.plan_chunks(keyframes, duration, 8)
+        self.assertEqual(len(ranges), 2)
+        for start, end in ranges:
+            self.assertGreaterEqual((end or duration) - start, minimum)
+        # Sin fotogramas clave no se puede cortar
+        self.assertEqual(hls_utils.plan_chunks([], 600.0, 4), [(0.0, None)])
+        self.assertEqual(hls_utils.plan_chunks([0.0], 600.0, 1), [(0.0, None)])
+
+
+class StitchChunkPlaylistsTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def write_chunk(self, index, durations):
+        lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:11']
+        for number, duration in enumerate(durations):
+            name = f'720p_c{index:03d}_{number:03d}.ts'
+            with open(os.path.join(self.tmp, name), 'wb') as f:
+                f.write(f'{index}-{number}'.encode())
+            lines += [f'#EXTINF:{duration},', name]
+        with open(os.path.join(self.tmp, f'720p_c{index:03d}.m3u8'), 'w') as f:
+            f.write('\n'.join(lines + ['#EXT-X-ENDLIST']) + '\n')
+
+    def test_segments_are_renumbered_with_a_discontinuity_per_chunk(self):
+        self.write_chunk(0, [10.0, 10.0, 4.5])
+        self.write_chunk(1, [10.0, 10.8])
+        self.write_chunk(2, [3.2])
+        self.assertTrue(hls_utils.stitch_chunk_playlists(self.tmp, '720p', 3))
+
+        with open(os.path.join(self.tmp, '720p.m3u8')) as f:
+            lines = f.read().splitlines()
+        self.assertIn('#EXT-X-TARGETDURATION:11', lines)
+        self.assertEqual(lines[-1], '#EXT-X-ENDLIST')
+        body = lines[lines.index('#EXT-X-PLAYLIST-TYPE:VOD') + 1:-1]
+        self.assertEqual(body, [
+            '#EXTINF:10.000000,', '720p_000.ts',
+            '#EXTINF:10.000000,', '720p_001.ts',
+            '#EXTINF:4.500000,', '720p_002.ts',
+            '#EXT-X-DISCONTINUITY',
+            '#EXTINF:10.000000,', '720p_003.ts',
+            '#EXTINF:10.800000,', '720p_004.ts',
+            '#EXT-X-DISCONTINUITY',
+            '#EXTINF:3.200000,', '720p_005.ts',
+        ])
+        # Cada segmento conserva su contenido con el nuevo nombre y no quedan restos de los fragmentos
+        with open(os.path.join(self.tmp, '720p_003.ts'), 'rb') as f:
+            self.assertEqual(f.read(), b'1-0')
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['720p.m3u8'] + [f'720p_{n:03d}.ts' for n in range(6)])
+
+    def test_missing_chunk_playlist_fails(self):
+        self.write_chunk(0, [10.0])
+        self.assertFalse(hls_utils.stitch_chunk_playlists(self.tmp, '720p', 2))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, '720p.m3u8')))
+
+
+# Proceso que imita la salida de ffmpeg -progress: claves por stdout y registro por stderr
+FAKE_PROGRESS_SCRIPT = """
+import sys
+for line in ('frame=10', 'out_time_us=2500000', 'out_time_ms=5000000', 'out_time_us=N/A',
+             'speed=1.5x', 'out_time_us=12000000', 'progress=end'):
+    print(line, flush=True)
+for i in range(50):
+    sys.stderr.write(f'linea {i}\\n')
+sys.exit(int(sys.argv[1]))
+"""
+
+
+class FakeProgressCommand:
+    """Sustituye al comando de ffmpeg-python: run_ffmpeg sólo usa global_args y compile"""
+    def __init__(self, returncode=0):
+        self.returncode = returncode
+        self.global_arguments = ()
+
+    def global_args(self, *args):
+        self.global_arguments = args
+        return self
+
+    def compile(self, overwrite_output=False):
+        return [sys.executable, '-c', FAKE_PROGRESS_SCRIPT, str(self.returncode)]
+
+
+class RunFfmpegProgressTests(SimpleTestCase):
+    def test_reports_out_time_over_duration(self):
+        fractions = []
+        cmd = FakeProgressCommand()
+        hls_utils.run_ffmpeg(cmd, duration=10.0, on_progress=fractions.append)
+        self.assertEqual(cmd.global_arguments, ('-progress', 'pipe:1', '-nostats'))
+        # Valores no numéricos ignorados, limitado a 1 y aviso final al terminar
+        self.assertEqual(fractions, [0.25, 0.5, 1.0, 1.0])
+
+    def test_without_duration_only_reports_end(self):
+        fractions = []
+        hls_utils.run_ffmpeg(FakeProgressCommand(), duration=0, on_progress=fractions.append)
+        self.assertEqual(fractions, [1.0])
+
+    def test_failure_keeps_stderr_tail(self):
+        fractions = []
+        with self.assertRaises(hls_utils.ffmpeg.Error) as ctx:
+            hls_utils.run_ffmpeg(FakeProgressCommand(returncode=1), duration=10.0, on_progress=fractions.append, stderr_lines=3)
+        self.assertEqual(ctx.exception.stderr, b'linea 47\nlinea 48\nlinea 49\n')
+        # Sin el aviso final de éxito
+        self.assertEqual(fractions, [0.25, 0.5, 1.0])
+
+
+class ProgressTrackerTests(SimpleTestCase):
+    def track(self, updates, interval=1.0):
+        # Ejecuta (instante, variante, fracción) con un reloj simulado y devuelve los avisos
+        reports = []
+        tracker = hls_utils.ProgressTracker(lambda overall, renditions: reports.append((overall, renditions)), interval)
+        tracker.start(['1080p', '720p'])
+        with mock.patch.object(hls_utils.time, 'monotonic') as monotonic:
+            for now, rendition, fraction in updates:
+                monotonic.return_value = now
+                tracker.update(rendition, fraction)
+        return reports
+
+    def test_aggregates_renditions(self):
+        reports = self.track([(10.0, '1080p', 0.5), (20.0, '720p', 1.0)])
+        self.assertEqual(reports, [
+            (0.25, {'1080p': 0.5, '720p': 0.0}),
+            (0.75, {'1080p': 0.5, '720p': 1.0}),
+        ])
+
+    def test_throttles_until_complete(self):
+        reports = self.track([
+            (10.0, '1080p', 0.5), (10.2, '1080p', 0.75), (10.5, '720p', 0.25),
+            (11.1, '720p', 0.5), (11.2, '1080p', 1.0), (11.3, '720p', 1.0),
+        ])
+        # Un aviso por intervalo; el final siempre se notifica
+        self.assertEqual([overall for overall, _ in reports], [0.25, 0.625, 1.0])
+
+    def test_progress_never_goes_back(self):
+        # Un reintento de ffmpeg vuelve a empezar desde 0 sin retroceder el progreso
+        reports = self.track([(10.0, '1080p', 0.8), (20.0, '1080p', 0.1), (30.0, '720p', 0.4)])
+        overall = [value for value, _ in reports]
+        self.assertEqual(overall, sorted(overall))
+        self.assertEqual(reports[-1][1], {'1080p': 0.8, '720p': 0.4})
+
+    def test_callback_errors_are_ignored(self):
+        tracker = hls_utils.ProgressTracker(mock.Mock(side_effect=RuntimeError('canal cerrado')), interval=0)
+        tracker.start(['720p'])
+        tracker.update('720p', 1.0)
+        tracker.callback.assert_called_once_with(1.0, {'720p': 1.0})
+
+    def test_rendition_progress_updates_each_output(self):
+        tracker = mock.Mock()
+        hls_utils._rendition_progress(tracker, ['1080p', '720p'])(0.5)
+        self.assertEqual(tracker.update.call_args_list, [mock.call('1080p', 0.5), mock.call('720p', 0.5)])
+        self.assertIsNone(hls_utils._rendition_progress(None, ['720p']))
+
+
+def parse_master_playlist(path):
+    # Devuelve las etiquetas EXT-X-MEDIA y las variantes (atributos, URI) de un master playlist
+    with open(path) as f:
+        lines = [line.strip() for line in f if line.strip()]
+    media, variants = [], []
+    for index, line in enumerate(lines):
+        tag, _, attributes = line.partition(':')
+        if tag in ('#EXT-X-MEDIA', '#EXT-X-STREAM-INF'):
+            parsed = {key: value.strip('"') for key, value in re.findall(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)', attributes)}
+            if tag == '#EXT-X-MEDIA':
+                media.append(parsed)
+            else:
+                variants.append((parsed, lines[index + 1]))
+    return media, variants
+
+
+class MasterPlaylistCodecsTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.resolutions = [(1280, 720, '2800k'), (1920, 1080, '5000k')]
+
+    def write_variant(self, height, segment=True, fmp4=False):
+        name = f'{height}p'
+        with open(os.path.join(self.tmp, f'{name}.m3u8'), 'w') as f:
+            f.write('#EXTM3U\n#EXT-X-VERSION:7\n')
+            if fmp4:
+                f.write(f'#EXT-X-MAP:URI="{name}.mp4",BYTERANGE="800@0"\n#EXTINF:10.0,\n#EXT-X-BYTERANGE:5000@800\n{name}.mp4\n')
+            else:
+                f.write(f'#EXTINF:10.0,\n{name}_000.ts\n')
+        if segment:
+            open(os.path.join(self.tmp, f'{name}.mp4' if fmp4 else f'{name}_000.ts'), 'wb').close()
+
+    def probe_streams(self, profiles):
+        # ffprobe falso: perfil y nivel según el archivo analizado
+        def probe(path):
+            profile, level = profiles[os.path.basename(path)]
+            return {'streams': [
+                {'codec_type': 'video', 'codec_name': 'h264', 'profile': profile, 'level': level},
+                {'codec_type': 'audio', 'codec_name': 'aac', 'profile': 'LC'},
+            ]}
+        return mock.patch.object(hls_utils.ffmpeg, 'probe', side_effect=probe)
+
+    def test_video_variants_declare_codecs_with_audio_group(self):
+        self.write_variant(720)
+        self.write_variant(1080, fmp4=True)
+        with self.probe_streams({'720p_000.ts': ('Main', 31), '1080p.mp4': ('High', 40)}):
+            self.assertTrue(hls_utils.create_master_playlist(self.tmp, self.resolutions, [('audio', '128k'), ('audio_low', '48k')]))
+        media, variants = parse_master_playlist(os.path.join(self.tmp, 'playlist.m3u8'))
+        self.assertEqual(media, [{
+            'TYPE': 'AUDIO', 'GROUP-ID': 'audio', 'NAME': 'Principal', 'DEFAULT': 'YES', 'AUTOSELECT': 'YES', 'URI': 'audio.m3u8',
+        }])
+        self.assertEqual([(attributes.get('CODECS'), attributes.get('AUDIO'), uri) for attributes, uri in variants], [
+            ('avc1.640028,mp4a.40.2', 'audio', '1080p.m3u8'),
+            ('avc1.4D401F,mp4a.40.2', 'audio', '720p.m3u8'),
+            ('mp4a.40.2', None, 'audio_low.m3u8'),
+        ])
+        self.assertEqual(variants[0][0]['BANDWIDTH'], '5128000')
+        self.assertEqual(variants[0][0]['RESOLUTION'], '1920x1080')
+
+    def test_muxed_audio_without_group(self):
+        self.write_variant(720)
+        with self.probe_streams({'720p_000.ts': ('Constrained Baseline', 30)}):
+            hls_utils.create_master_playlist(self.tmp, self.resolutions[:1])
+        _, variants = parse_master_playlist(os.path.join(self.tmp, 'playlist.m3u8'))
+        self.assertEqual(variants[0][0]['CODECS'], 'avc1.42E01E,mp4a.40.2')
+        self.assertNotIn('AUDIO', variants[0][0])
+
+    def test_unprobed_variants_fall_back_to_high_profile(self):
+        # Variante bajo demanda sin segmentos todavía y otra que ffprobe no puede leer
+        self.write_variant(720, segment=False)
+        self.write_variant(1080)
+        with mock.patch.object(hls_utils.ffmpeg, 'probe', side_effect=hls_utils.ffmpeg.Error('ffprobe', b'', b'')) as probe:
+            hls_utils.create_master_playlist(self.tmp, self.resolutions, [('audio', '128k')])
+        probe.assert_called_once_with(os.path.join(self.tmp, '1080p_000.ts'))
+        _, variants = parse_master_playlist(os.path.join(self.tmp, 'playlist.m3u8'))
+        self.assertEqual([attributes['CODECS'] for attributes, _ in variants], ['avc1.64002A,mp4a.40.2', 'avc1.640020,mp4a.40.2'])
+
+    def test_unprobed_variant_without_audio_group_omits_codecs(self):
+        with mock.patch.object(hls_utils.ffmpeg, 'probe') as probe:
+            hls_utils.create_master_playlist(self.tmp, self.resolutions[:1], check_files=False)
+        probe.assert_not_called()
+        _, variants = parse_master_playlist(os.path.join(self.tmp, 'playlist.m3u8'))
+        self.assertNotIn('CODECS', variants[0][0])
+
+
+class StreamCopyTests(SimpleTestCase):
+    def can_copy(self, keyframes, media_info=None, resolution=(1280, 720), max_bitrate=None):
+        media_info = media_info or make_media_info(duration=60.0)
+        with mock.patch.object(hls_utils, 'get_keyframe_times', return_value=keyframes) as get_keyframes:
+            result = hls_utils.can_stream_copy('source.mp4', media_info, resolution, max_bitrate)
+        return result, get_keyframes
+
+    def test_simulated_segments_cut_on_keyframes(self):
+        keyframes = [float(t) for t in range(0, 60, 4)]
+        self.assertEqual(hls_utils._simulate_segments(keyframes, 58.0), [12.0, 12.0, 12.0, 12.0, 10.0])
+        self.assertEqual(hls_utils._simulate_segments([], 30.0), [30.0])
+
+    def test_regular_keyframes(self):
+        result, get_keyframes = self.can_copy([float(t) for t in range(0, 60, 2)])
+        self.assertTrue(result)
+        get_keyframes.assert_called_once_with('source.mp4')
+
+    def test_keyframes_too_far_apart(self):
+        self.assertFalse(self.can_copy([0.0, 20.0, 40.0])[0])
+
+    def test_long_trailing_segment(self):
+        # Fotogramas clave regulares al principio y ninguno en los últimos 30 segundos
+        self.assertFalse(self.can_copy([0.0, 10.0, 20.0, 30.0])[0])
+
+    def test_tolerated_deviation(self):
+        self.assertTrue(self.can_copy([0.0, 14.0, 28.0, 42.0, 56.0])[0])
+
+    def test_incompatible_sources_skip_keyframe_scan(self):
+        cases = [
+            ({'media_info': make_media_info(profile='High 10')}, 'perfil'),
+            ({'media_info': make_media_info(pix_fmt='yuv422p')}, 'formato de píxel'),
+            ({'media_info': make_media_info(codec_name='hevc')}, 'códec'),
+            ({'resolution': (1920, 1080)}, 'resolución'),
+            ({'media_info': make_media_info(bit_rate='9000000'), 'max_bitrate': '2800k'}, 'bitrate'),
+        ]
+        for kwargs, reason in cases:
+            with self.subTest(reason):
+                result, get_keyframes = self.can_copy([float(t) for t in range(0, 60, 2)], **kwargs)
+                self.assertFalse(result)
+                get_keyframes.assert_not_called()
+
+    def test_unreadable_keyframes(self):
+        with mock.patch.object(hls_utils, 'get_keyframe_times', side_effect=subprocess.CalledProcessError(1, 'ffprobe')):
+            self.assertFalse(hls_utils.can_stream_copy('source.mp4', make_media_info(), (1280, 720)))
+
+
+class PerTitleLadderTests(SimpleTestCase):
+    LADDER = [(1920, 1080, '5000k'), (1280, 720, '2800k'), (854, 480, '1400k')]
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.source = os.path.join(self.tmp, 'source.mp4')
+        with open(self.source, 'wb') as f:
+            f.write(b'video')
+        self.output_dir = os.path.join(self.tmp, 'hls')
+
+    def probe_at(self, kbps):
+        # Cada muestra del sondeo CRF ocupa lo que daría ese bitrate durante LADDER_SAMPLE_DURATION
+        def run_ffmpeg(cmd, *args, **kwargs):
+            sample = next(arg for arg in cmd.compile() if arg.endswith('.h264'))
+            with open(sample, 'wb') as f:
+                f.write(b'\0' * int(kbps * 1000 * hls_utils.LADDER_SAMPLE_DURATION / 8))
+        return mock.patch.object(hls_utils, 'run_ffmpeg', side_effect=run_ffmpeg)
+
+    def ladder(self):
+        return hls_utils.per_title_ladder(self.source, self.output_dir, self.LADDER, make_media_info(duration=60.0))
+
+    def test_simple_content_drops_middle_rungs(self):
+        with self.probe_at(hls_utils.LADDER_REFERENCE_KBPS * 0.5) as run_ffmpeg:
+            ladder = self.ladder()
+        self.assertEqual(run_ffmpeg.call_count, hls_utils.LADDER_SAMPLES)
+        self.assertEqual(ladder, [(1920, 1080, '2500k'), (854, 480, '700k')])
+
+    def test_complex_content_adds_low_rung(self):
+        with self.probe_at(hls_utils.LADDER_REFERENCE_KBPS * 1.5):
+            ladder = self.ladder()
+        self.assertEqual(ladder, [(1920, 1080, '7500k'), (1280, 720, '4200k'), (854, 480, '2100k'), (640, 360, '900k')])
+
+    def test_typical_content_keeps_rungs(self):
+        with self.probe_at(hls_utils.LADDER_REFERENCE_KBPS):
+            self.assertEqual(self.ladder(), self.LADDER)
+
+    def test_factor_is_clamped(self):
+        with self.probe_at(hls_utils.LADDER_REFERENCE_KBPS * 5):
+            ladder = self.ladder()
+        self.assertEqual(ladder[0], (1920, 1080, f"{round(5000 * hls_utils.LADDER_MAX_FACTOR)}k"))
+
+    def test_result_is_cached_per_source(self):
+        with self.probe_at(hls_utils.LADDER_REFERENCE_KBPS * 0.5):
+            first = self.ladder()
+        with self.probe_at(hls_utils.LADDER_REFERENCE_KBPS * 1.5) as run_ffmpeg:
+            self.assertEqual(self.ladder(), first)
+        run_ffmpeg.assert_not_called()
+
+        # Otra fuente en el mismo directorio vuelve a medir
+        with open(self.source, 'ab') as f:
+            f.write(b'otro')
+        with self.probe_at(hls_utils.LADDER_REFERENCE_KBPS * 1.5) as run_ffmpeg:
+            self.assertEqual(len(self.ladder()), 4)
+        self.assertEqual(run_ffmpeg.call_count, hls_utils.LADDER_SAMPLES)
+
+    def test_failed_probe_keeps_fixed_ladder(self):
+        error = hls_utils.ffmpeg.Error('ffmpeg', b'', b'error')
+        with mock.patch.object(hls_utils, 'run_ffmpeg', side_effect=error):
+            self.assertEqual(self.ladder(), self.LADDER)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'ladder.json')))
+
+
+class RedisSlotsTests(SimpleTestCase):
+    def test_script_only_uses_declared_keys(self):
+        # Redis Cluster exige declarar en KEYS todas las claves que toca el script
+        calls = re.findall(r"redis\.call\('(\w+)', ([^,)]+)", hls_utils._REDIS_ACQUIRE_SCRIPT)
+        self.assertTrue(calls)
+        for command, key in calls:
+            self.assertRegex(key, r'^KEYS\[[123]\]$', command)
+
+    def test_acquire_passes_keys_with_a_shared_hash_tag(self):
+        client = mock.Mock()
+        script = client.register_script.return_value
+        script.side_effect = [0, 1]
+        with mock.patch('redis.Redis.from_url', return_value=client), \
+                mock.patch.object(hls_utils, 'SCHEDULER_POLL_INTERVAL', 0.01):
+            slots = hls_utils._RedisSlots('redis://localhost')
+            slots.acquire('gpu', 'token-1', 1, 2, 4)
+            slots.release('gpu', 'token-1', 2)
+
+        keys = ['hls:scheduler:{gpu}:leases', 'hls:scheduler:{gpu}:waiters', 'hls:scheduler:{gpu}:heartbeats']
+        self.assertEqual(script.call_count, 2)
+        for call in script.call_args_list:
+            self.assertEqual(call.kwargs['keys'], keys)
+            self.assertFalse([arg for arg in call.kwargs['args'] if str(arg).startswith('hls:scheduler')])
+        self.assertEqual(script.call_args.kwargs['args'][1:5], ['token-1', 2, 4, hls_utils.SCHEDULER_LEASE_TTL])
+        self.assertEqual(client.zadd.call_args.args[0], keys[1])
+        client.zrem.assert_called_once_with(keys[0], 'token-1:2')
+
+
+@override_settings(UPLOAD_MIN_CHUNK_SIZE=1)
+class ResumableUploadTests(TestCase):
+    CONTENT = b'0123456789'
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        media_root = override_settings(MEDIA_ROOT=self.tmp)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        patches = [
+            # El inicio del archivo no es un video real: se acepta sin conversión durante la subida
+            mock.patch('cinecloud.views.validate_prefix', return_value=(True, None)),
+            mock.patch('cinecloud.views.send_progress_update'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.user = get_user_model().objects.create_superuser('admin', 'secreto')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self):
+        response = self.client.post('/media/uploads/', {'nombre': 'video.mp4', 'tamano': len(self.CONTENT), 'tamano_bloque': 4})
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, upload_id, index, data=None, checksum=None, **extra):
+        data = self.CONTENT[index * 4:index * 4 + 4] if data is None else data
+        checksum = hashlib.sha256(data).hexdigest() if checksum is None else checksum
+        return self.client.generic(
+            'PUT', f'/media/uploads/{upload_id}/chunks/{index}/', data,
+            content_type='application/octet-stream', HTTP_X_CHUNK_SHA256=checksum, **extra
+        )
+
+    def send_all(self, upload_id):
+        for index in (2, 0, 1):
+            self.assertEqual(self.put_chunk(upload_id, index).status_code, 200)
+
+    def part_content(self, upload_id):
+        with open(ResumableUpload.objects.get(pk=upload_id).ruta, 'rb') as f:
+            return f.read()
+
+    def status(self, upload_id):
+        return self.client.get(f'/media/uploads/{upload_id}/').json()
+
+    def test_create_reserves_part_file(self):
+        upload = self.create()
+        self.assertEqual((upload['bloques'], upload['faltantes'], upload['estado']), (3, [0, 1, 2], 'pending'))
+        self.assertEqual(self.part_content(upload['id']), b'\0' * 10)
+
+    def test_chunks_in_any_order_then_complete(self):
+        upload = self.create()
+        self.assertEqual(self.put_chunk(upload['id'], 2).json(), {'recibidos': 1, 'bloques': 3})
+        # Reanudar: el estado indica qué bloques faltan
+        self.assertEqual(self.status(upload['id'])['faltantes'], [0, 1])
+        self.put_chunk(upload['id'], 0)
+        self.put_chunk(upload['id'], 1)
+        self.assertEqual(self.part_content(upload['id']), self.CONTENT)
+
+        response = self.client.post(f'/media/uploads/{upload["id"]}/complete/', {'sha256': hashlib.sha256(self.CONTENT).hexdigest()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['estado'], 'completed')
+        upload = ResumableUpload.objects.get(pk=upload['id'])
+        self.assertEqual(upload.sha256, hashlib.sha256(self.CONTENT).hexdigest())
+        with open(os.path.join(self.tmp, upload.ruta), 'rb') as f:
+            self.assertEqual(f.read(), self.CONTENT)
+        self.assertEqual(self.put_chunk(upload.id, 0).status_code, 409)
+
+    def test_bad_checksum_does_not_touch_part_file(self):
+        upload = self.create()
+        response = self.put_chunk(upload['id'], 0, checksum=hashlib.sha256(b'otro').hexdigest())
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.part_content(upload['id']), b'\0' * 10)
+        self.assertEqual(self.status(upload['id'])['faltantes'], [0, 1, 2])
+
+    def test_wrong_length_is_rejected(self):
+        upload = self.create()
+        self.assertEqual(self.put_chunk(upload['id'], 0, data=b'012').status_code, 400)
+        self.assertEqual(self.put_chunk(upload['id'], 0, checksum='').status_code, 400)
+        # La cabecera anuncia el tamaño correcto pero la conexión se corta a mitad del cuerpo
+        def truncated(stream, length, directory):
+            return stage_chunk(io.BytesIO(stream.read(length)[:3]), length, directory)
+        with mock.patch('cinecloud.views.stage_chunk', side_effect=truncated):
+            self.assertEqual(self.put_chunk(upload['id'], 0).json(), {'error': 'Bloque incompleto'})
+        self.assertEqual(self.part_content(upload['id']), b'\0' * 10)
+
+    def test_out_of_range_index(self):
+        upload = self.create()
+        self.assertEqual(self.put_chunk(upload['id'], 3, data=b'x').status_code, 416)
+
+    def test_resent_chunk_is_not_rewritten(self):
+        upload = self.create()
+        self.put_chunk(upload['id'], 0)
+        with mock.patch('cinecloud.views.write_chunk') as write_chunk:
+            response = self.put_chunk(upload['id'], 0, data=b'abcd')
+        self.assertEqual(response.json(), {'recibidos': 1, 'bloques': 3})
+        write_chunk.assert_not_called()
+        self.assertEqual(self.part_content(upload['id'])[:4], b'0123')
+
+    def test_complete_with_missing_chunks(self):
+        upload = self.create()
+        self.put_chunk(upload['id'], 0)
+        response = self.client.post(f'/media/uploads/{upload["id"]}/complete/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['faltantes'], [1, 2])
+
+    def test_complete_with_wrong_file_checksum(self):
+        upload = self.create()
+        self.send_all(upload['id'])
+        response = self.client.post(f'/media/uploads/{upload["id"]}/complete/', {'sha256': 'f' * 64})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(ResumableUpload.objects.get(pk=upload['id']).estado, ResumableUpload.Estado.FALLIDO)
+
+    def test_cancel(self):
+        upload = self.create()
+        self.put_chunk(upload['id'], 0)
+        path = ResumableUpload.objects.get(pk=upload['id']).ruta
+        self.assertEqual(self.client.delete(f'/media/uploads/{upload["id"]}/').status_code, 200)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.put_chunk(upload['id'], 1).status_code, 404)
+
+    def test_other_users_cannot_see_upload(self):
+        upload = self.create()
+        self.client.force_authenticate(get_user_model().objects.create_superuser('otro', 'secreto'))
+        self.assertEqual(self.client.get(f'/media/uploads/{upload["id"]}/').status_code, 404)
+        self.assertEqual(self.put_chunk(upload['id'], 0).status_code, 404)
+
+    def streaming_job(self, upload_id, estado):
+        upload = ResumableUpload.objects.get(pk=upload_id)
+        return TranscodeJob.objects.create(
+            titulo='Prueba', video=upload.ruta, output_dir=os.path.join(self.tmp, 'hls'), subida=upload, estado=estado
+        )
+
+    def test_streaming_job_keeps_file_until_complete_verifies_it(self):
+        upload = self.create()
+        self.send_all(upload['id'])
+        job = self.streaming_job(upload['id'], TranscodeJob.Estado.PROCESANDO)
+        _finish_job(job, True)
+        self.assertTrue(os.path.exists(job.video))
+
+        response = self.client.post(f'/media/uploads/{upload["id"]}/complete/', {'sha256': hashlib.sha256(self.CONTENT).hexdigest()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['sha256'], hashlib.sha256(self.CONTENT).hexdigest())
+        # La conversión ya terminó: el archivo ya no hace falta
+        self.assertFalse(os.path.exists(job.video))
+
+    def test_streaming_complete_with_wrong_checksum_fails_job(self):
+        upload = self.create()
+        self.send_all(upload['id'])
+        job = self.streaming_job(upload['id'], TranscodeJob.Estado.PROCESANDO)
+        response = self.client.post(f'/media/uploads/{upload["id"]}/complete/', {'sha256': 'f' * 64})
+        self.assertEqual(response.status_code, 422)
+        job.refresh_from_db()
+        self.assertEqual(job.estado, TranscodeJob.Estado.FALLIDO)
+        self.assertEqual(ResumableUpload.objects.get(pk=upload['id']).estado, ResumableUpload.Estado.FALLIDO)
+        self.assertFalse(os.path.exists(job.video))
+
+
+class GrowingFileTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.path = os.path.join(self.tmp, 'upload.part')
+        with open(self.path, 'wb') as f:
+            f.truncate(12)
+
+    def fed_in_steps(self, steps):
+        # available() falso: en cada llamada llega el siguiente bloque (o nada, con None)
+        content = iter(steps)
+        state = {'limit': 0}
+
+        def available():
+            step = next(content, None)
+            if isinstance(step, Exception):
+                raise step
+            if step:
+                with open(self.path, 'r+b') as f:
+                    f.seek(state['limit'])
+                    f.write(step)
+                state['limit'] += len(step)
+            return state['limit'], state['limit'] == 12
+        return available
+
+    def test_reads_data_as_it_arrives(self):
+        available = self.fed_in_steps([b'0123', None, None, b'4567', b'89ab'])
+        data = b''.join(hls_utils.GrowingFile(self.path, available, poll_interval=0, idle_timeout=5))
+        self.assertEqual(data, b'0123456789ab')
+
+    def test_idle_timeout(self):
+        available = self.fed_in_steps([b'0123'])
+        chunks = []
+        with self.assertRaises(TimeoutError):
+            for chunk in hls_utils.GrowingFile(self.path, available, poll_interval=0.01, idle_timeout=0.05):
+                chunks.append(chunk)
+        self.assertEqual(chunks, [b'0123'])
+
+    def test_cancelled_upload(self):
+        available = self.fed_in_steps([b'0123', IOError("La subida se canceló o no es válida")])
+        with self.assertRaises(IOError):
+            list(hls_utils.GrowingFile(self.path, available, poll_interval=0, idle_timeout=5))
+
+
+class HLSTokenTests(TestCase):
+    PREFIX = 'hls/pelicula/a/b'
+
+    def setUp(self):
+        tokens._owners.clear()
+        self.addCleanup(tokens._owners.clear)
+        self.factory = RequestFactory()
+        self.owner = get_user_model().objects.create_user('propietario', password='secreto')
+        self.other = get_user_model().objects.create_user('otro', password='secreto')
+        self.expires = time.time() + 3600
+
+    def authorize(self, path, query=None, cookie=None, user=None, **headers):
+        request = self.factory.get('/hls/', {'token': query} if query else {}, headers=headers)
+        if cookie:
+            request.COOKIES[tokens.TOKEN_COOKIE] = cookie
+
+        async def auser():
+            return user or AnonymousUser()
+        request.auser = auser
+        return async_to_sync(authorize)(request, path)
+
+    def test_prefix_boundary(self):
+        token = make_token(self.PREFIX, self.expires)
+        for path in (self.PREFIX, f'{self.PREFIX}/720p.m3u8', f'/{self.PREFIX}/720p/720p_000.ts'):
+            self.assertEqual(verify_token(token, path)[0], self.PREFIX)
+        for path in ('hls/pelicula/a/bc/720p.m3u8', 'hls/pelicula/a', f'{self.PREFIX}/../bc/720p.m3u8'):
+            with self.subTest(path), self.assertRaises(BadSignature):
+                verify_token(token, path)
+        with self.assertRaises(ValueError):
+            make_token('/../', self.expires)
+
+    def test_expired(self):
+        token = make_token(self.PREFIX, time.time() - 1)
+        with self.assertRaises(SignatureExpired):
+            verify_token(token, f'{self.PREFIX}/720p.m3u8')
+
+    def test_tampered_token(self):
+        token = make_token(self.PREFIX, self.expires)
+        payload, signature = token.split('.')
+        other_payload = make_token('hls/pelicula/otra', self.expires).split('.')[0]
+        flipped = signature[:-2] + ('A' if signature[-2] != 'A' else 'B') + signature[-1]
+        for tampered in (f'{other_payload}.{signature}', f'{payload}.{flipped}', payload, f'{payload}.{signature}.x', '!!.??'):
+            with self.subTest(tampered), self.assertRaises(BadSignature):
+                verify_token(tampered, f'{self.PREFIX}/720p.m3u8')
+
+    def test_user_bound_token(self):
+        token = make_token(self.PREFIX, self.expires, user_id=self.owner.pk)
+        path = f'{self.PREFIX}/720p.m3u8'
+        owner_key = Token.objects.create(user=self.owner).key
+        other_key = Token.objects.create(user=self.other).key
+        self.assertEqual(self.authorize(path, query=token, Authorization=f'Token {owner_key}')[2], int(self.expires))
+        self.assertEqual(self.authorize(path, query=token, user=self.owner)[1], self.PREFIX)
+        for kwargs in ({'Authorization': f'Token {other_key}'}, {'user': self.other}, {}):
+            with self.subTest(kwargs), self.assertRaises(Http404):
+                self.authorize(path, query=token, **kwargs)
+
+    def test_query_param_and_cookie(self):
+        token = make_token(self.PREFIX, self.expires)
+        path = f'{self.PREFIX}/720p_000.ts'
+        self.assertEqual(self.authorize(path, query=token)[3], True)
+        self.assertEqual(self.authorize(path, cookie=token)[3], False)
+        # El parámetro tiene prioridad sobre la cookie aunque no sea válido
+        with self.assertRaises(Http404):
+            self.authorize(path, query=make_token('hls/pelicula/otra', self.expires), cookie=token)
+        with self.assertRaises(Http404):
+            self.authorize(path)
+
+    def test_signed_path(self):
+        path, expires = 'videos/prueba.mp4', int(self.expires)
+        signature = TimestampSigner().sign(f'{path}:{expires}')
+        verify_signed_path(path, expires, signature)
+        with self.assertRaises(BadSignature):
+            verify_signed_path('videos/otro.mp4', expires, signature)
+        with self.assertRaises(BadSignature):
+            verify_signed_path(path, expires + 1, signature)
+        expired = int(time.time()) - 1
+        with self.assertRaises(SignatureExpired):
+            verify_signed_path(path, expired, TimestampSigner().sign(f'{path}:{expired}'))
+
+
+class EagerCeleryMixin:
+    """Ejecuta las tareas en el propio proceso (reintentos incluidos) y registra los cambios de estado"""
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        # Con el espacio de nombres CELERY de settings hay que cambiar las claves con prefijo
+        for key, value in (('CELERY_TASK_ALWAYS_EAGER', True), ('CELERY_TASK_EAGER_PROPAGATES', False)):
+            self.addCleanup(setattr, celery_app.conf, key, celery_app.conf.get(key))
+            setattr(celery_app.conf, key, value)
+
+        self.transitions = []
+        update_state = TranscodeJob.actualizar_estado
+
+        def record(job, estado, *args, **kwargs):
+            self.transitions.append(estado)
+            return update_state(job, estado, *args, **kwargs)
+
+        patches = [
+            mock.patch.object(TranscodeJob, 'actualizar_estado', autospec=True, side_effect=record),
+            mock.patch('cinecloud.tasks.send_progress_update'),
+            mock.patch('cinecloud.views.send_progress_update'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def fake_process_video(self, *results):
+        # Cada intento devuelve el siguiente resultado (o lanza la excepción indicada)
+        results = iter(results)
+
+        def process_video(input_path, output_dir, *args, **kwargs):
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return mock.patch('cinecloud.tasks.process_video', side_effect=process_video)
+
+
+@override_settings(HLS_CHUNKS=0, HLS_JIT_RENDITIONS=False)
+class TranscodeTaskTests(EagerCeleryMixin, TestCase):
+    def make_job(self):
+        source = os.path.join(self.tmp, 'source.mp4')
+        with open(source, 'wb') as f:
+            f.write(b'video')
+        return TranscodeJob.objects.create(titulo='Prueba', video=source, output_dir=os.path.join(self.tmp, 'hls'))
+
+    def test_success(self):
+        job = self.make_job()
+        with self.fake_process_video(True):
+            transcode_video.apply(args=(job.id,))
+        job.refresh_from_db()
+        self.assertEqual(self.transitions, [TranscodeJob.Estado.PROCESANDO, TranscodeJob.Estado.COMPLETADO])
+        self.assertEqual(job.estado, TranscodeJob.Estado.COMPLETADO)
+        self.assertEqual(job.progreso, 100)
+        self.assertFalse(os.path.exists(job.video))
+
+    def test_retry_then_succeeds(self):
+        job = self.make_job()
+        with self.fake_process_video(False, True) as process_video:
+            transcode_video.apply(args=(job.id,))
+        job.refresh_from_db()
+        self.assertEqual(process_video.call_count, 2)
+        self.assertEqual(self.transitions, [
+            TranscodeJob.Estado.PROCESANDO, TranscodeJob.Estado.PENDIENTE,
+            TranscodeJob.Estado.PROCESANDO, TranscodeJob.Estado.COMPLETADO,
+        ])
+        self.assertEqual(job.estado, TranscodeJob.Estado.COMPLETADO)
+
+    def test_fails_after_exhausting_retries(self):
+        job = self.make_job()
+        with self.fake_process_video(False, False, False) as process_video:
+            transcode_video.apply(args=(job.id,))
+        job.refresh_from_db()
+        self.assertEqual(process_video.call_count, transcode_video.max_retries + 1)
+        self.assertEqual(self.transitions[-1], TranscodeJob.Estado.FALLIDO)
+        self.assertEqual(job.estado, TranscodeJob.Estado.FALLIDO)
+        self.assertTrue(job.error)
+        self.assertFalse(os.path.exists(job.video))
+
+    def test_exception_is_logged_and_marks_failure(self):
+        job = self.make_job()
+        errors = [RuntimeError('ffmpeg murió')] * (transcode_video.max_retries + 1)
+        with self.fake_process_video(*errors), self.assertLogs('cinecloud.tasks', 'ERROR'):
+            transcode_video.apply(args=(job.id,))
+        job.refresh_from_db()
+        self.assertEqual(job.estado, TranscodeJob.Estado.FALLIDO)
+        self.assertEqual(job.error, 'ffmpeg murió')
+
+
+def write_hls_output(output_dir):
+    # Salida HLS mínima con los artefactos que deja process_video
+    os.makedirs(output_dir, exist_ok=True)
+    for name, content in (
+        ('playlist.m3u8', '#EXTM3U\n'),
+        ('720p.m3u8', '#EXTM3U\n#EXTINF:10.0,\n720p_000.ts\n#EXT-X-ENDLIST\n'),
+        ('720p_000.ts', 'segmento'),
+        ('720p.checkpoint.json', '{}'),
+        ('720p.m3u8.tmp', ''),
+    ):
+        with open(os.path.join(output_dir, name), 'w') as f:
+            f.write(content)
+
+
+@override_settings(HLS_CHUNKS=0, HLS_JIT_RENDITIONS=False, HLS_DEDUPE_POLL_INTERVAL=60, HLS_DEDUPE_STALE_AFTER=3600)
+class DedupeTaskTests(EagerCeleryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.asset = MediaAsset.objects.create(sha256='a' * 64, tamano=5)
+        # En modo eager apply_async ignora countdown: las comprobaciones periódicas se registran sin ejecutarse
+        patch = mock.patch.object(transcode_video, 'apply_async')
+        self.poll = patch.start()
+        self.addCleanup(patch.stop)
+
+    def make_job(self, name, **fields):
+        source = os.path.join(self.tmp, f'{name}.mp4')
+        with open(source, 'wb') as f:
+            f.write(b'video')
+        return TranscodeJob.objects.create(
+            titulo=name, video=source, output_dir=os.path.join(self.tmp, name), asset=self.asset, **fields
+        )
+
+    def make_owner(self):
+        owner = self.make_job('owner', estado=TranscodeJob.Estado.PROCESANDO)
+        MediaAsset.objects.filter(pk=self.asset.pk).update(estado=MediaAsset.Estado.PROCESANDO, trabajo=owner)
+        return owner
+
+    def test_links_existing_output(self):
+        source_dir = os.path.join(self.tmp, 'previous')
+        write_hls_output(source_dir)
+        MediaAsset.objects.filter(pk=self.asset.pk).update(estado=MediaAsset.Estado.COMPLETADO, hls_dir=source_dir)
+        job = self.make_job('copy')
+        with self.fake_process_video() as process_video:
+            transcode_video.apply(args=(job.id,))
+        job.refresh_from_db()
+        process_video.assert_not_called()
+        self.assertEqual(job.estado, TranscodeJob.Estado.COMPLETADO)
+        self.assertEqual(sorted(os.listdir(job.output_dir)), ['720p.m3u8', '720p_000.ts', 'playlist.m3u8'])
+
+        def inode(directory, name):
+            return os.stat(os.path.join(directory, name)).st_ino
+        # Los segmentos se comparten; las playlists se copian para poder reescribirse por separado
+        self.assertEqual(inode(source_dir, '720p_000.ts'), inode(job.output_dir, '720p_000.ts'))
+        self.assertNotEqual(inode(source_dir, 'playlist.m3u8'), inode(job.output_dir, 'playlist.m3u8'))
+
+    def test_waits_for_owner_then_links(self):
+        owner = self.make_owner()
+        job = self.make_job('waiter')
+        with self.fake_process_video() as process_video:
+            transcode_video.apply(args=(job.id,))
+            transcode_video.apply(args=(job.id,))
+        job.refresh_from_db()
+        process_video.assert_not_called()
+        self.assertEqual(job.estado, TranscodeJob.Estado.PENDIENTE)
+        self.assertEqual(job.progreso, 30)
+        self.poll.assert_called_with((job.id,), countdown=60)
+        self.assertEqual(self.poll.call_count, 2)
+
+        write_hls_output(owner.output_dir)
+        _release_asset(owner, True)
+        job.refresh_from_db()
+        self.asset.refresh_from_db()
+        self.assertEqual(job.estado, TranscodeJob.Estado.COMPLETADO)
+        self.assertTrue(os.path.exists(os.path.join(job.output_dir, 'playlist.m3u8')))
+        self.assertEqual(self.asset.estado, MediaAsset.Estado.COMPLETADO)
+        self.assertEqual(self.asset.hls_dir, owner.output_dir)
+
+    def test_failure_hands_off_to_next_waiter(self):
+        owner = self.make_owner()
+        first, second = self.make_job('first'), self.make_job('second')
+
+        def process_video(input_path, output_dir, *args, **kwargs):
+            write_hls_output(output_dir)
+            return True
+        _release_asset(owner, False)
+        self.poll.assert_called_once_with((first.id,), {})
+        with mock.patch('cinecloud.tasks.process_video', side_effect=process_video) as encode:
+            transcode_video.apply(args=(first.id,))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.asset.refresh_from_db()
+        # Sólo el primero vuelve a convertir; el segundo reutiliza su salida
+        self.assertEqual(encode.call_count, 1)
+        self.assertEqual(encode.call_args.args[:2], (first.video, first.output_dir))
+        self.assertEqual(first.estado, TranscodeJob.Estado.COMPLETADO)
+        self.assertEqual(second.estado, TranscodeJob.Estado.COMPLETADO)
+        self.assertEqual(self.asset.hls_dir, first.output_dir)
+
+    def test_takes_over_stale_owner(self):
+        owner = self.make_owner()
+        TranscodeJob.objects.filter(pk=owner.pk).update(actualizado=timezone.now() - timedelta(hours=2))
+        job = self.make_job('waiter')
+        with self.fake_process_video(True) as process_video, self.assertLogs('cinecloud.tasks', 'WARNING'):
+            transcode_video.apply(args=(job.id,))
+        job.refresh_from_db()
+        self.asset.refresh_from_db()
+        process_video.assert_called_once()
+        self.poll.assert_not_called()
+        self.assertEqual(self.transitions, [TranscodeJob.Estado.PROCESANDO, TranscodeJob.Estado.COMPLETADO])
+        self.assertEqual(job.estado, TranscodeJob.Estado.COMPLETADO)
+        self.assertEqual(self.asset.estado, MediaAsset.Estado.COMPLETADO)
+        self.assertEqual(self.asset.hls_dir, job.output_dir)
+
+    def test_takes_over_failed_owner(self):
+        owner = self.make_owner()
+        TranscodeJob.objects.filter(pk=owner.pk).update(estado=TranscodeJob.Estado.FALLIDO)
+        job = self.make_job('waiter')
+        with self.fake_process_video(True) as process_video, self.assertLogs('cinecloud.tasks', 'WARNING'):
+            transcode_video.apply(args=(job.id,))
+        job.refresh_from_db()
+        process_video.assert_called_once()
+        self.assertEqual(job.estado, TranscodeJob.Estado.COMPLETADO)
+
+
+@override_settings(HLS_CHUNKS=0, HLS_JIT_RENDITIONS=False)
+class StreamingTranscodeTests(EagerCeleryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        path = os.path.join(self.tmp, 'upload.part')
+        with open(path, 'wb') as f:
+            f.write(b'0123456789')
+        self.upload = ResumableUpload.objects.create(
+            usuario=get_user_model().objects.create_superuser('admin', 'secreto'), nombre='video.mp4',
+            tamano=10, tamano_bloque=4, ruta=path, recibidos=[0, 1, 2], transmisible=True,
+            media_info=make_media_info().to_dict()
+        )
+        self.job = TranscodeJob.objects.create(
+            titulo='Prueba', video=path, output_dir=os.path.join(self.tmp, 'hls'), subida=self.upload
+        )
+        patches = [
+            mock.patch('cinecloud.tasks.STREAM_POLL_INTERVAL', 0),
+            mock.patch('cinecloud.tasks.STREAM_IDLE_TIMEOUT', 0.05),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_wait_for_upload_times_out_without_progress(self):
+        ResumableUpload.objects.filter(pk=self.upload.pk).update(recibidos=[0])
+        started = time.monotonic()
+        self.assertIsNone(_wait_for_upload(self.upload.pk, lambda u: u.contiguos() >= u.tamano))
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_wait_for_upload(self):
+        self.assertEqual(_wait_for_upload(self.upload.pk, lambda u: u.contiguos() >= u.tamano), self.upload)
+        ResumableUpload.objects.filter(pk=self.upload.pk).update(estado=ResumableUpload.Estado.FALLIDO)
+        self.assertIsNone(_wait_for_upload(self.upload.pk, lambda u: True))
+
+    def test_upload_available(self):
+        ResumableUpload.objects.filter(pk=self.upload.pk).update(recibidos=[0, 2])
+        available = _upload_available(self.upload.pk)
+        self.assertEqual(available(), (4, False))
+        ResumableUpload.objects.filter(pk=self.upload.pk).update(estado=ResumableUpload.Estado.FALLIDO)
+        with self.assertRaises(IOError):
+            available()
+
+    def test_streams_while_receiving(self):
+        with mock.patch('cinecloud.tasks.process_stream', return_value=True) as process_stream, \
+                self.fake_process_video() as process_video:
+            transcode_video.apply(args=(self.job.id,))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.estado, TranscodeJob.Estado.COMPLETADO)
+        process_video.assert_not_called()
+        path, output_dir, available, media_info = process_stream.call_args.args[:4]
+        self.assertEqual((path, media_info), (self.upload.ruta, MediaInfo.from_dict(self.upload.media_info)))
+        self.assertEqual(available(), (10, True))
+        # La subida sigue sin completar: el archivo se conserva para verificar su hash
+        self.assertTrue(os.path.exists(self.upload.ruta))
+
+    def test_retry_falls_back_to_full_file(self):
+        with mock.patch('cinecloud.tasks.process_stream', return_value=False) as process_stream, \
+                self.fake_process_video(True) as process_video:
+            transcode_video.apply(args=(self.job.id,))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.estado, TranscodeJob.Estado.COMPLETADO)
+        process_stream.assert_called_once()
+        process_video.assert_called_once()
+        # El análisis del inicio no se reutiliza con el archivo completo
+        self.assertIsNone(process_video.call_args.kwargs['media_info'])
+
+    def test_cancelled_upload_fails_job(self):
+        def process_stream(input_path, output_dir, available, *args, **kwargs):
+            # El usuario cancela la subida a mitad de la conversión
+            ResumableUpload.objects.filter(pk=self.upload.pk).update(estado=ResumableUpload.Estado.FALLIDO)
+            list(hls_utils.GrowingFile(input_path, available, poll_interval=0))
+        with mock.patch('cinecloud.tasks.process_stream', side_effect=process_stream), \
+                self.fake_process_video() as process_video, self.assertLogs('cinecloud.tasks', 'ERROR'):
+            transcode_video.apply(args=(self.job.id,))
+        self.job.refresh_from_db()
+        process_video.assert_not_called()
+        self.assertEqual(self.job.estado, TranscodeJob.Estado.FALLIDO)
+        self.assertEqual(self.job.error, "La subida no se completó")
+
+
+@override_settings(HLS_CHUNKS=0, HLS_JIT_RENDITIONS=False)
+class UploadVideoTests(EagerCeleryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = override_settings(MEDIA_ROOT=self.tmp)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        media_info = MediaInfo(
+            streams=(), width=1920, height=1080, duration=90.0, fps=24.0,
+            video_codec='h264', audio_codec='aac', bitrate=5_000_000, has_audio=True
+        )
+        patch = mock.patch('cinecloud.views.probe_media', return_value=media_info)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', 'secreto'))
+
+    def upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/media/upload/', {
+                'videos[0][name]': 'Película de prueba',
+                'videos[0][mediaType]': 'Pelicula',
+                'videos[0][description]': 'Descripción',
+                'videos[0][video]': SimpleUploadedFile('prueba.mp4', b'contenido de video', content_type='video/mp4'),
+            }, format='multipart')
+
+    def test_upload_returns_202_and_completes(self):
+        with self.fake_process_video(True):
+            response = self.upload()
+        self.assertEqual(response.status_code, 202)
+        jobs = response.json()['jobs']
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0]['estado'], TranscodeJob.Estado.PENDIENTE)
+
+        job = TranscodeJob.objects.get(pk=jobs[0]['id'])
+        self.assertEqual(job.estado, TranscodeJob.Estado.COMPLETADO)
+        self.assertEqual(job.pelicula, Pelicula.objects.get(titulo='Película de prueba'))
+        self.assertEqual(job.media_info['duration'], 90.0)
+        self.assertEqual(self.transitions, [TranscodeJob.Estado.PROCESANDO, TranscodeJob.Estado.COMPLETADO])
+
+    def test_upload_failure_is_reported_on_the_job(self):
+        with self.fake_process_video(False, False, False):
+            response = self.upload()
+        self.assertEqual(response.status_code, 202)
+        job = TranscodeJob.objects.get(pk=response.json()['jobs'][0]['id'])
+        self.assertEqual(job.estado, TranscodeJob.Estado.FALLIDO)
+        self.assertIn(TranscodeJob.Estado.PENDIENTE, self.transitions)
@@ -0,0 +1,131 @@
+import base64
+import binascii
+import functools
+import hashlib
+import hmac
+import posixpath
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.signing import BadSignature, SignatureExpired, TimestampSigner
+from django.http import Http404
+from rest_framework.authtoken.models import Token
+
+TOKEN_PARAM = 'token'
+TOKEN_COOKIE = 'hls_token'
+VERIFY_CACHE_SIZE = 1024
+# Segundos que se reutiliza la comprobación del usuario de un token vinculado
+OWNER_CACHE_TTL = 60
+
+_owners = OrderedDict()  # clave del token de DRF -> (id de usuario o None, instante de la comprobación)
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+@functools.lru_cache(maxsize=1)
+def _key(secret):
+    # Clave propia de los tokens HLS, derivada una sola vez de SECRET_KEY
+    return hashlib.sha256(b'cinecloud.hls_token:' + secret.encode()).digest()
+
+
+def _sign(payload):
+    return hmac.new(_key(settings.SECRET_KEY), payload, hashlib.sha256).digest()
+
+
+def normalize_path(path):
+    # Ruta relativa a MEDIA_ROOT sin '..' ni barras sobrantes
+    return posixpath.normpath('/' + path.strip('/')).lstrip('/')
+
+
+def make_token(prefix, expires, user_id=None):
+    """Token que autoriza todo lo que hay bajo ``prefix`` (relativo a MEDIA_ROOT) hasta ``expires``"""
+    prefix = normalize_path(prefix)
+    if not prefix:
+        raise ValueError("El prefijo no puede ser la raíz de media")
+    payload = f"{int(expires)}:{user_id or ''}:{prefix}".encode()
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+@functools.lru_cache(maxsize=VERIFY_CACHE_SIZE)
+def _verify(token):
+    # Sólo se guardan en caché los tokens válidos: uno inválido lanza BadSignature,
+    # así que no desplaza a los buenos y siempre se recalcula
+    try:
+        payload, signature = token.split('.')
+        payload, signature = _b64decode(payload), _b64decode(signature)
+    except (ValueError, binascii.Error):
+        raise BadSignature("Token mal formado")
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise BadSignature("Firma del token inválida")
+    try:
+        expires, user_id, prefix = payload.decode().split(':', 2)
+        return prefix, int(expires), int(user_id) if user_id else None
+    except (UnicodeDecodeError, ValueError):
+        raise BadSignature("Token mal formado")
+
+
+def verify_token(token, path):
+    """Comprueba firma, caducidad y prefijo; devuelve (prefijo, caducidad, id de usuario vinculado)"""
+    prefix, expires, user_id = _verify(token)
+    if expires < time.time():
+        raise SignatureExpired("Token caducado")
+    path = normalize_path(path)
+    if path != prefix and not path.startswith(prefix + '/'):
+        raise BadSignature("El token no cubre esta ruta")
+    return prefix, expires, user_id
+
+
+@functools.lru_cache(maxsize=VERIFY_CACHE_SIZE)
+def _unsign_legacy(signature):
+    return TimestampSigner().unsign(signature)
+
+
+def verify_signed_path(path, expires, signature):
+    """Firma de un solo archivo de get_signed_url: debe ser de esta ruta y no haber caducado"""
+    value = _unsign_legacy(signature)
+    if not hmac.compare_digest(value.encode(), f"{path}:{expires}".encode()):
+        raise BadSignature("La firma no corresponde a esta ruta")
+    if int(expires) < time.time():
+        raise SignatureExpired("Firma caducada")
+
+
+async def _request_user_id(request):
+    # Usuario de la petición: token de DRF en Authorization (hls.js vía xhrSetup) o sesión
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Token '):
+        key = header[len('Token '):].strip()
+        cached = _owners.get(key)
+        if cached is not None and time.monotonic() - cached[1] < OWNER_CACHE_TTL:
+            return cached[0]
+        token = await Token.objects.filter(key=key, user__is_active=True).afirst()
+        _owners[key] = (token.user_id if token else None, time.monotonic())
+        _owners.move_to_end(key)
+        while len(_owners) > VERIFY_CACHE_SIZE:
+            _owners.popitem(last=False)
+        return _owners[key][0]
+    user = await request.auser()
+    return user.pk if user.is_authenticated else None
+
+
+async def authorize(request, path):
+    """Valida el token HLS de la petición (parámetro ``token`` o cookie) para ``path``.
+
+    Devuelve (token, prefijo, caducidad, si llegó como parámetro) o lanza Http404.
+    """
+    from_query = TOKEN_PARAM in request.GET
+    token = request.GET.get(TOKEN_PARAM) if from_query else request.COOKIES.get(TOKEN_COOKIE)
+    if not token:
+        raise Http404("Token requerido.")
+    try:
+        prefix, expires, user_id = verify_token(token, path)
+    except (BadSignature, ValueError):
+        raise Http404("Token inválido o expirado.")
+    if user_id is not None and await _request_user_id(request) != user_id:
+        raise Http404("Token inválido o expirado.")
+    return token, prefix, expires, from_query
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+READ_SIZE = 64 * 1024
+CHUNK_SPOOL_SIZE = 1024 * 1024  # bloques más grandes se preparan en disco en lugar de en memoria
+
+
+class HashingFile(File):
+    """Envuelve un archivo subido y calcula su SHA-256 y tamaño mientras se guarda"""
+    def __init__(self, file):
+        super().__init__(file, name=file.name)
+        self.hasher = hashlib.sha256()
+        self.bytes_read = 0
+
+    def chunks(self, chunk_size=None):
+        for chunk in super().chunks(chunk_size):
+            self.hasher.update(chunk)
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+class AssembledFile(File):
+    """Archivo ya ensamblado en disco que FileSystemStorage mueve a su destino sin copiarlo"""
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name=name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def create_part_file(path, size):
+    # Reserva el archivo parcial con su tamaño final (disperso) para escribir bloques en cualquier orden
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.truncate(size)
+
+
+def stage_chunk(stream, length, directory):
+    # Lee por partes los bytes de un bloque en un temporal y devuelve (temporal, bytes, sha256)
+    # sin tocar el archivo parcial: sólo se escribe en él si la comprobación es correcta
+    staged = tempfile.SpooledTemporaryFile(max_size=CHUNK_SPOOL_SIZE, dir=directory)
+    hasher = hashlib.sha256()
+    received = 0
+    while received < length:
+        data = stream.read(min(READ_SIZE, length - received))
+        if not data:
+            break
+        staged.write(data)
+        hasher.update(data)
+        received += len(data)
+    staged.seek(0)
+    return staged, received, hasher.hexdigest()
+
+
+def write_chunk(path, offset, staged):
+    # Escribe en su posición del archivo parcial un bloque ya verificado
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        while True:
+            data = staged.read(READ_SIZE)
+            if not data:
+                break
+            os.pwrite(fd, data, offset)
+            offset += len(data)
+    finally:
+        os.close(fd)
+
+
+def file_sha256(path):
+    # SHA-256 de un archivo leído por bloques
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(READ_SIZE), b''):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def save_upload(uploaded_file, name, storage=default_storage):
+    # Guarda el archivo por bloques y devuelve (ruta, sha256, tamaño), sin cargarlo entero en memoria
+    hashing_file = HashingFile(uploaded_file)
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        # Django ya lo volcó a un temporal: se calcula el hash leyéndolo por bloques y
+        # FileSystemStorage lo mueve a su destino en lugar de copiarlo
+        for _ in hashing_file.chunks():
+            pass
+        path = storage.save(name, uploaded_file)
+    else:
+        path = storage.save(name, hashing_file)
+    return path, hashing_file.hasher.hexdigest(), hashing_file.bytes_read
@@ -20,10 +20,9 @@ from rest_framework.routers import DefaultRouter
 from series.views import getSeries,getEpisodiosPorSerie,newSeries,getSerieDetails,deleteSerie,editSerie,deleteEpisode,editEpisode
 from movies.views import getMovie,getMovies,deleteMovie,editMovie
 from users.views import login,signup,prueba,authenticated,isAdmin,deleteUser,createAdmin,editUser,getAdministrators,add_watched_episode,add_watched_movie,watchedMovies,watchedEpisodes,getWatchedEpisode,getWatchedMovie
-from .views import status,upload_video,mediaView,signed_media,getCategories,newCategory,get_signed_url,editCategory,deleteCategory
+from .views import status,upload_video,mediaView,signed_media,getCategories,newCategory,get_signed_url,editCategory,deleteCategory,getTranscodeJobs,getTranscodeJob,serve_hls,get_hls_token,metrics_view,create_upload,resumable_upload,upload_chunk,complete_upload
 from django.conf import settings
 from django.urls import re_path
-from django.views.static import serve
 
 router = DefaultRouter()
 
@@ -37,7 +36,14 @@ urlpatterns = [
     path('administrators/get/', getAdministrators),
     path('administrators/new/', createAdmin),
     path('status/',status),
+    path('metrics/', metrics_view, name='metrics'),
     path('media/upload/', upload_video),
+    path('media/uploads/', create_upload, name='create_upload'),
+    path('media/uploads/<uuid:pk>/', resumable_upload, name='resumable_upload'),
+    path('media/uploads/<uuid:pk>/chunks/<int:index>/', upload_chunk, name='upload_chunk'),
+    path('media/uploads/<uuid:pk>/complete/', complete_upload, name='complete_upload'),
+    path('media/jobs/', getTranscodeJobs, name='get_transcode_jobs'),
+    path('media/jobs/<int:pk>/', getTranscodeJob, name='get_transcode_job'),
     path('media/', mediaView),
     path('categories/', getCategories),
     path('users/edit/<str:id>/', editUser, name='edit_user'),
@@ -48,7 +54,8 @@ urlpatterns = [
     path('series/new/',newSeries, name='new_series'),
     path('media-signed/', signed_media, name='signed_media'),
     path('get-signed-url/<path:file_path>/', get_signed_url, name='get_signed_url'),
-    re_path(r'^hls/(?P<path>.*)$', serve, {'document_root': 'media/hls'}),
+    path('hls-token/<path:prefix>/', get_hls_token, name='get_hls_token'),
+    re_path(r'^hls/(?P<path>.*)$', serve_hls, name='serve_hls'),
     path('movies/', getMovies, name='get_movies'),
     path('movies/<int:pk>/', getMovie, name='get_movie),'),
     path('movies/progress/', watchedMovies, name='get_movies'),
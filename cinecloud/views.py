@@ -4,9 +4,9 @@ from series.models import Serie, Episodio
 import json
 from django.http import JsonResponse
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 from django.utils.dateparse import parse_date
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from datetime import datetime
 from django.http import JsonResponse
 from django.http import FileResponse
@@ -16,13 +16,19 @@ from django.db.models import F
 import os
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated,IsAdminUser
-from .hls_utils import process_video
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from .models import Categoria
-from .serializers import CategoriaSerializer
+from .hls_utils import probe_media, validate_prefix, metrics, MediaInfo, STREAM_PROBE_BYTES, PRIORITY_INTERACTIVE, PRIORITY_BACKFILL
+from .progress import send_progress_update
+from .tasks import transcode_video
+from .models import Categoria, MediaAsset, ResumableUpload, TranscodeJob
+from .uploads import AssembledFile, create_part_file, file_sha256, save_upload, stage_chunk, write_chunk
+from .serving import aserve_file, hls_cache, trickplay_url
+from .tokens import TOKEN_COOKIE, TOKEN_PARAM, authorize, make_token, normalize_path, verify_signed_path
+from .serializers import CategoriaSerializer, TranscodeJobSerializer
+from django.db import transaction
+from functools import partial
 from rest_framework.response import Response
 from django.core.signing import TimestampSigner, BadSignature
+from urllib.parse import quote
 import time
 from .settings import AUTH_USER_MODEL as Users
 from django.urls import reverse
@@ -37,6 +43,8 @@ def upload_video(request):
     user = request.user        
     try:            
         video_count = 0
+        rescale = True
+        jobs = []
         for key in request.POST:
             if key.startswith('videos[') and '][name]' in key:
                 video_count = max(video_count, int(key.split('[')[1].split(']')[0]) + 1)
@@ -48,6 +56,8 @@ def upload_video(request):
                     rescale = True
                 else:
                     rescale = False
+        # Una subida suelta (un episodio nuevo) se codifica antes que las subidas masivas
+        prioridad = PRIORITY_INTERACTIVE if video_count == 1 else PRIORITY_BACKFILL
         for index in range(video_count):
             name = request.POST.get(f'videos[{index}][name]')
             description = request.POST.get(f'videos[{index}][description]')
@@ -60,13 +70,11 @@ def upload_video(request):
             series_description = request.POST.get(f'videos[{index}][seriesDescription]')
             series_releaseDate = request.POST.get(f'videos[{index}][seriesReleaseDate]')
             video_file = request.FILES.get(f'videos[{index}][video]')
+            upload_id = request.POST.get(f'videos[{index}][upload]')
             thumbnail_file = request.FILES.get(f'videos[{index}][thumbnail]')
 
-            if not video_file or not name:
+            if not (video_file or upload_id) or not name:
                 continue
-            if not duration:
-                duration = 0
-
             send_progress_update(user.id, f"📥 Recibiendo video '{name}'...", 5)
             
             try:
@@ -76,13 +84,44 @@ def upload_video(request):
             except:
                 release_date = datetime.now().date()
 
-            send_progress_update(user.id, f"💾 Guardando archivo '{video_file.name}'...", 10)
-            video_path = default_storage.save(f'videos/{video_file.name}', ContentFile(video_file.read()))
-            full_video_path = default_storage.path(video_path)
+            streaming_upload = None
+            if upload_id:
+                upload = ResumableUpload.objects.filter(pk=upload_id, usuario=user).exclude(
+                    estado=ResumableUpload.Estado.FALLIDO
+                ).first()
+                if upload is None or upload.trabajos.exists():
+                    send_progress_update(user.id, f"⚠️ La subida de '{name}' no existe o ya está registrada. Saltando...", 25, "warning")
+                    continue
+                if upload.estado == ResumableUpload.Estado.COMPLETADO:
+                    # Video ya recibido con una subida reanudable completada
+                    video_path, video_hash, video_size = upload.ruta, upload.sha256, upload.tamano
+                    upload.delete()
+                else:
+                    # Subida en curso: la conversión empieza mientras llegan los bloques
+                    streaming_upload = upload
+            else:
+                send_progress_update(user.id, f"💾 Guardando archivo '{video_file.name}'...", 10)
+                with metrics.span('save'):
+                    video_path, video_hash, video_size = save_upload(video_file, f'videos/{video_file.name}')
+
+            if streaming_upload:
+                # Sin el archivo completo no hay hash para deduplicar; el análisis es el del inicio
+                video_path, asset = None, None
+                full_video_path = streaming_upload.ruta
+                media_info = MediaInfo.from_dict(streaming_upload.media_info) if streaming_upload.media_info else None
+            else:
+                full_video_path = default_storage.path(video_path)
+                # El mismo contenido sólo se convierte una vez aunque se suba con otro título
+                asset, _ = MediaAsset.objects.get_or_create(sha256=video_hash, defaults={"tamano": video_size})
+
+                # Un único ffprobe que se reutiliza en todo el procesamiento HLS
+                media_info = probe_media(full_video_path)
+            duration = resolve_duration(duration, media_info)
 
             if thumbnail_file:
                 send_progress_update(user.id, f"🖼️ Guardando thumbnail de '{name}'...", 15)
-                thumbnail_path = default_storage.save(f'thumbnails/{thumbnail_file.name}', ContentFile(thumbnail_file.read()))
+                with metrics.span('save_thumbnail'):
+                    thumbnail_path, _, _ = save_upload(thumbnail_file, f'thumbnails/{thumbnail_file.name}')
             else:
                 thumbnail_path = ""
 
@@ -90,6 +129,8 @@ def upload_video(request):
             if media_type == 'Pelicula':
                 if Pelicula.objects.filter(titulo=name).exists():
                     send_progress_update(user.id, f"⚠️ Película '{name}' ya existe. Saltando...", 25,"warning")
+                    if video_path:
+                        default_storage.delete(video_path)
                     continue
                 video_hls = "/hls/pelicula/" + name
                 print("RUTA DEL VIDEO : ", video_hls)
@@ -112,9 +153,19 @@ def upload_video(request):
                 print("Categorias existentes: ", Categoria.objects.all())
                 print("CATEGORIAS DE LA PELICULA: ", pelicula.categorias.all())
                 output_dir = os.path.join(default_storage.location, f'hls/pelicula/{pelicula.titulo}')
-                send_progress_update(user.id, f"⚙️ Procesando HLS de '{name}'...", 60)
-                process_video(full_video_path,output_dir,rescale)
-                send_progress_update(user.id, f"✅ Película '{name}' lista", 100)
+                jobs.append(TranscodeJob.objects.create(
+                    usuario=user,
+                    asset=asset,
+                    subida=streaming_upload,
+                    pelicula=pelicula,
+                    titulo=name,
+                    video=full_video_path,
+                    output_dir=output_dir,
+                    rescale=rescale,
+                    prioridad=prioridad,
+                    media_info=media_info.to_dict() if media_info else None
+                ))
+                send_progress_update(user.id, f"⏳ Película '{name}' en cola de procesamiento", 30)
 
             elif media_type == 'series':
                 serie, created = Serie.objects.get_or_create(
@@ -131,6 +182,8 @@ def upload_video(request):
                     serie.save()
                 if Episodio.objects.filter(titulo=name, serie=serie).exists():
                     send_progress_update(user.id, f"⚠️ Episodio '{name}' ya existe. Saltando...", 25,"warning")
+                    if video_path:
+                        default_storage.delete(video_path)
                     continue
                 video_hls = "/hls/serie/" + serie.titulo + "/" + name
                 episodio = Episodio(
@@ -147,22 +200,29 @@ def upload_video(request):
                     serie.temporadas = season
                     serie.save()
                 episodio.save()
-                send_progress_update(user.id, f"⚙️ Creando playlist master de '{name}'...", 35)
-                send_progress_update(user.id, f"⚙️ Procesando HLS de episodio '{name}'...", 40)
-                try:
-                    output_dir = os.path.join(default_storage.location, f'hls/serie/{serie.titulo}/{episodio.titulo}')
-                    process_video(full_video_path,output_dir,rescale)
-                except Exception as e:
-                    from django.db import transaction
-                    print(f"Error al procesar el video: {e}")
-                    transaction.rollback()
-                    send_progress_update(user.id, f"❌ Error al procesar el video: {e}", 0,"error")
-                    continue
-                send_progress_update(user.id, f"✅ Episodio '{name}' procesado correctamente", 100)
-
-        clean_videos()
-        send_progress_update(user.id, f"🎉 Todos los videos han sido procesados", 100)
-        return JsonResponse({"message": "Videos uploaded and processed"})
+                output_dir = os.path.join(default_storage.location, f'hls/serie/{serie.titulo}/{episodio.titulo}')
+                jobs.append(TranscodeJob.objects.create(
+                    usuario=user,
+                    asset=asset,
+                    subida=streaming_upload,
+                    episodio=episodio,
+                    titulo=name,
+                    video=full_video_path,
+                    output_dir=output_dir,
+                    rescale=rescale,
+                    prioridad=prioridad,
+                    media_info=media_info.to_dict() if media_info else None
+                ))
+                send_progress_update(user.id, f"⏳ Episodio '{name}' en cola de procesamiento", 30)
+
+        # Encolar la transcodificación; los workers informan del progreso por WebSocket
+        for job in jobs:
+            transaction.on_commit(partial(transcode_video.delay, job.id))
+        send_progress_update(user.id, f"📤 {len(jobs)} video(s) en cola de procesamiento", 30)
+        return JsonResponse({
+            "message": "Videos uploaded, processing queued",
+            "jobs": [{"id": job.id, "titulo": job.titulo, "estado": job.estado} for job in jobs]
+        }, status=202)
     
     except Exception as e:
         import traceback
@@ -170,6 +230,164 @@ def upload_video(request):
         send_progress_update(user.id, f"❌ Error durante la subida: {str(e)}", 0,"error")
         return JsonResponse({"error": str(e)}, status=400)
 
+def upload_status(upload):
+    return {
+        "id": str(upload.id),
+        "nombre": upload.nombre,
+        "tamano": upload.tamano,
+        "tamano_bloque": upload.tamano_bloque,
+        "bloques": upload.num_bloques,
+        "faltantes": upload.faltantes(),
+        "estado": upload.estado,
+        "sha256": upload.sha256,
+    }
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated,IsAdminUser])
+def create_upload(request):
+    # Inicia una subida reanudable: el cliente envía después cada bloque con PUT, en cualquier orden
+    try:
+        nombre = os.path.basename(request.data.get('nombre') or '')
+        tamano = int(request.data.get('tamano'))
+        tamano_bloque = int(request.data.get('tamano_bloque') or settings.UPLOAD_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Parámetros inválidos"}, status=400)
+    if not nombre or tamano <= 0:
+        return JsonResponse({"error": "Se requieren nombre y tamano"}, status=400)
+    tamano_bloque = min(max(tamano_bloque, settings.UPLOAD_MIN_CHUNK_SIZE), settings.UPLOAD_MAX_CHUNK_SIZE)
+
+    upload = ResumableUpload(usuario=request.user, nombre=nombre, tamano=tamano, tamano_bloque=tamano_bloque)
+    upload.ruta = os.path.join(settings.MEDIA_ROOT, 'uploads', f'{upload.id}.part')
+    create_part_file(upload.ruta, tamano)
+    upload.save()
+    return JsonResponse(upload_status(upload), status=201)
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated,IsAdminUser])
+def resumable_upload(request, pk):
+    # Estado de la subida (bloques que faltan, para reanudarla) o cancelación
+    upload = ResumableUpload.objects.filter(pk=pk, usuario=request.user).first()
+    if upload is None:
+        return JsonResponse({"error": "Subida no encontrada"}, status=404)
+    if request.method == 'DELETE':
+        if upload.estado != ResumableUpload.Estado.COMPLETADO and os.path.isfile(upload.ruta):
+            os.remove(upload.ruta)
+        upload.delete()
+        return JsonResponse({"message": "Subida cancelada"}, status=200)
+    return JsonResponse(upload_status(upload), status=200)
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated,IsAdminUser])
+def upload_chunk(request, pk, index):
+    # Escribe un bloque en su posición del archivo parcial; la cabecera X-Chunk-SHA256 es obligatoria
+    upload = ResumableUpload.objects.filter(pk=pk, usuario=request.user).first()
+    if upload is None:
+        return JsonResponse({"error": "Subida no encontrada"}, status=404)
+    if upload.estado != ResumableUpload.Estado.PENDIENTE:
+        return JsonResponse({"error": "La subida ya se completó"}, status=409)
+    if index >= upload.num_bloques:
+        return JsonResponse({"error": "Bloque fuera de rango"}, status=416)
+    if index in upload.recibidos:
+        # Reenvío de un bloque ya verificado (reintento del cliente): no se vuelve a escribir
+        return JsonResponse({"recibidos": len(upload.recibidos), "bloques": upload.num_bloques}, status=200)
+
+    checksum = (request.headers.get('X-Chunk-SHA256') or '').lower()
+    if not checksum:
+        return JsonResponse({"error": "Falta la cabecera X-Chunk-SHA256"}, status=400)
+    offset, length = upload.rango_bloque(index)
+    if request.headers.get('Content-Length') != str(length):
+        return JsonResponse({"error": f"El bloque {index} debe tener {length} bytes"}, status=400)
+
+    # El cuerpo se lee del stream por partes y se verifica antes de escribirlo en el archivo parcial
+    staged, received, digest = stage_chunk(request.stream, length, os.path.dirname(upload.ruta))
+    with staged:
+        if received != length:
+            return JsonResponse({"error": "Bloque incompleto"}, status=400)
+        if digest != checksum:
+            return JsonResponse({"error": "La suma de comprobación del bloque no coincide"}, status=422)
+
+        with transaction.atomic():
+            upload = ResumableUpload.objects.select_for_update().filter(pk=pk).first()
+            if upload is None:
+                return JsonResponse({"error": "Subida no encontrada"}, status=404)
+            if upload.estado != ResumableUpload.Estado.PENDIENTE:
+                return JsonResponse({"error": "La subida ya se completó"}, status=409)
+            # Con el bloqueo, un mismo bloque enviado dos veces en paralelo sólo se escribe una vez
+            if index not in upload.recibidos:
+                write_chunk(upload.ruta, offset, staged)
+                upload.recibidos = sorted(upload.recibidos + [index])
+                upload.save(update_fields=['recibidos', 'actualizado'])
+
+    # Validar el contenedor con los primeros megabytes para rechazar cuanto antes un archivo inválido
+    contiguous = upload.contiguos()
+    if upload.transmisible is None and contiguous >= min(STREAM_PROBE_BYTES, upload.tamano):
+        valid, media_info = validate_prefix(upload.ruta, contiguous)
+        if not valid:
+            upload.estado = ResumableUpload.Estado.FALLIDO
+            upload.save(update_fields=['estado', 'actualizado'])
+            if os.path.isfile(upload.ruta):
+                os.remove(upload.ruta)
+            return JsonResponse({"error": "El archivo no es un video válido"}, status=422)
+        ResumableUpload.objects.filter(pk=pk, transmisible__isnull=True).update(
+            transmisible=media_info is not None,
+            media_info=media_info.to_dict() if media_info else None
+        )
+    return JsonResponse({"recibidos": len(upload.recibidos), "bloques": upload.num_bloques}, status=200)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated,IsAdminUser])
+def complete_upload(request, pk):
+    # Mueve el archivo ensamblado a videos/ y calcula su hash; después se registra con
+    # /media/upload/ indicando videos[i][upload]=<id> en lugar del archivo
+    with transaction.atomic():
+        upload = ResumableUpload.objects.select_for_update().filter(pk=pk, usuario=request.user).first()
+        if upload is None:
+            return JsonResponse({"error": "Subida no encontrada"}, status=404)
+        if upload.estado == ResumableUpload.Estado.COMPLETADO:
+            return JsonResponse(upload_status(upload), status=200)
+        if upload.faltantes():
+            return JsonResponse({"error": "Faltan bloques", **upload_status(upload)}, status=409)
+        expected = (request.data.get('sha256') or '').lower()
+        if upload.trabajos.exists():
+            # Ya se está convirtiendo mientras se recibía: el trabajo se queda con el archivo,
+            # que conserva hasta esta verificación aunque haya terminado
+            with metrics.span('hash'):
+                video_hash = file_sha256(upload.ruta)
+            if expected and expected != video_hash:
+                upload.estado = ResumableUpload.Estado.FALLIDO
+                upload.save(update_fields=['estado', 'actualizado'])
+                for job in upload.trabajos.exclude(estado=TranscodeJob.Estado.FALLIDO):
+                    job.actualizar_estado(TranscodeJob.Estado.FALLIDO, error="La suma de comprobación del archivo no coincide")
+                    send_progress_update(request.user.id, f"❌ Error al procesar '{job.titulo}': el archivo recibido no coincide", 0, "error")
+                if os.path.isfile(upload.ruta):
+                    os.remove(upload.ruta)
+                return JsonResponse({"error": "La suma de comprobación del archivo no coincide"}, status=422)
+            upload.sha256 = video_hash
+            upload.estado = ResumableUpload.Estado.COMPLETADO
+            upload.save(update_fields=['sha256', 'estado', 'actualizado'])
+            active = upload.trabajos.filter(estado__in=[TranscodeJob.Estado.PENDIENTE, TranscodeJob.Estado.PROCESANDO])
+            if not active.exists() and os.path.isfile(upload.ruta):
+                os.remove(upload.ruta)
+            return JsonResponse(upload_status(upload), status=200)
+
+        part_file = AssembledFile(upload.ruta, upload.nombre)
+        try:
+            with metrics.span('save'):
+                video_path, video_hash, video_size = save_upload(part_file, f'videos/{upload.nombre}')
+        finally:
+            part_file.close()
+        if expected and expected != video_hash:
+            default_storage.delete(video_path)
+            upload.estado = ResumableUpload.Estado.FALLIDO
+            upload.save(update_fields=['estado', 'actualizado'])
+            return JsonResponse({"error": "La suma de comprobación del archivo no coincide"}, status=422)
+
+        upload.ruta = video_path
+        upload.sha256 = video_hash
+        upload.estado = ResumableUpload.Estado.COMPLETADO
+        upload.save(update_fields=['ruta', 'sha256', 'estado', 'actualizado'])
+    return JsonResponse(upload_status(upload), status=200)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated,IsAdminUser])
 def newCategory(request):
@@ -245,16 +463,52 @@ def getCategory(request, pk):
     return Response(serializer.data, status=200)
 
 [IsAuthenticated]
-def serveHLS(request, file_path):
+async def serveHLS(request, file_path):
     # Construye la ruta completa al archivo en la carpeta media
-    file_path = os.path.join(settings.MEDIA_ROOT, 'hls', file_path)
-    print(file_path)
-    # Verifica si el archivo existe
-    if not os.path.exists(file_path):
-        raise Http404("Archivo no encontrado.")
+    hls_root = os.path.join(settings.MEDIA_ROOT, 'hls')
     
-    # Sirve el archivo
-    return FileResponse(open(file_path, 'rb'))
+    # Sirve el archivo (con soporte de Range para las variantes fMP4)
+    return await aserve_file(request, hls_root, file_path)
+
+async def serve_hls(request, path):
+    # Playlists y segmentos HLS; las variantes fMP4 se leen por rangos de bytes.
+    # Vista asíncrona: los segmentos se envían sin ocupar un hilo por espectador
+    hls_root = os.path.join(settings.MEDIA_ROOT, 'hls')
+    if not settings.HLS_REQUIRE_TOKEN:
+        return await aserve_file(request, hls_root, path)
+
+    token, prefix, expires, from_query = await authorize(request, f'hls/{path}')
+    response = await aserve_file(request, hls_root, path, public=False)
+    if from_query:
+        # Las URIs relativas de las playlists no conservan el ?token=: el resto de
+        # peticiones del título lo envían en una cookie limitada a su prefijo
+        response.set_cookie(
+            TOKEN_COOKIE, token,
+            max_age=max(0, expires - int(time.time())),
+            path=quote(f'/{prefix}/'),
+            secure=request.is_secure(),
+            httponly=True,
+            samesite=settings.HLS_TOKEN_COOKIE_SAMESITE
+        )
+    return response
+
+def metrics_view(request):
+    # Métricas de ingesta en formato de texto de Prometheus (web y workers)
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    hls_cache.flush_metrics()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def resolve_duration(duration, media_info):
+    # Usa la duración analizada (en minutos) cuando el cliente no la envía o envía 0
+    try:
+        duration = int(duration or 0)
+    except (TypeError, ValueError):
+        duration = 0
+    if duration == 0 and media_info is not None and media_info.duration > 0:
+        duration = max(1, round(media_info.duration / 60))
+    return duration
 
 def clean_videos():
     # Elimina los archivos de video antiguos
@@ -266,25 +520,36 @@ def clean_videos():
             print(f"Archivo eliminado: {file_path}")
 
 
-def send_progress_update(user_id, message, progress, status="info"):
-    channel_layer = get_channel_layer()
-    print(f"Sending progress update to user {user_id}: {message}, {progress}, {status}")
-    async_to_sync(channel_layer.group_send)(
-        f"progress_{user_id}",
-        {
-            "type": "progress_message",
-            "message": message,
-            "progress": progress,
-            "status": status
-        }
-    )
+@api_view(['GET'])
+@permission_classes([IsAuthenticated,IsAdminUser])
+def getTranscodeJobs(request):
+    # Lista los trabajos de transcodificación, opcionalmente filtrados por estado
+    jobs = TranscodeJob.objects.all()
+    estado = request.GET.get('estado')
+    if estado:
+        jobs = jobs.filter(estado=estado)
+    serializer = TranscodeJobSerializer(jobs, many=True)
+    return Response(serializer.data, status=200)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated,IsAdminUser])
+def getTranscodeJob(request, pk):
+    # Obtiene el estado de un trabajo de transcodificación
+    try:
+        job = TranscodeJob.objects.get(pk=pk)
+    except TranscodeJob.DoesNotExist:
+        return JsonResponse({"error": "Trabajo no encontrado"}, status=404)
+
+    serializer = TranscodeJobSerializer(job)
+    return Response(serializer.data, status=200)
 
 def mediaView(request):
     peliculas = list(Pelicula.objects.values('id', 'titulo', 'descripcion', 'fecha_estreno', 'duracion', 'imagen', 'video').annotate(categorias=F('categorias__nombre')).distinct())
     peliculas = [
         {
             **pelicula,
-            "categorias": list(Pelicula.objects.filter(id=pelicula['id']).values_list('categorias__nombre', flat=True).distinct())
+            "categorias": list(Pelicula.objects.filter(id=pelicula['id']).values_list('categorias__nombre', flat=True).distinct()),
+            "trickplay": trickplay_url(pelicula['video'])
         }
         for pelicula in peliculas
     ]
@@ -298,33 +563,35 @@ def mediaView(request):
         for serie in series
     ]
     episodios = list(Episodio.objects.values('id', 'titulo', 'temporada', 'numero', 'descripcion', 'duracion', 'imagen', 'video').distinct())
+    episodios = [{**episodio, "trickplay": trickplay_url(episodio['video'])} for episodio in episodios]
     return JsonResponse({
         "peliculas": peliculas,
         "series": series,
         "episodios": episodios
     })
 
-@api_view(['GET'])
-def signed_media(request):
+@require_GET
+async def signed_media(request):
+    # Vista asíncrona (sin api_view: DRF no admite vistas async); la firma es la autorización.
+    # Acepta la firma de un archivo de get_signed_url o un token HLS del prefijo
     path = request.GET.get('path')
     expires = request.GET.get('expires')
     signature = request.GET.get('signature')
 
-    if not all([path, expires, signature]):
+    if not path:
         raise Http404("Parámetros inválidos.")
 
-    try:
-        expected = f"{path}:{expires}"
-        signer = TimestampSigner()
-        signer.unsign(signature, max_age=int(expires) - int(time.time()))
-    except BadSignature:
-        raise Http404("Firma inválida o expirada.")
-
-    file_path = os.path.join(settings.MEDIA_ROOT, path)
-    if not os.path.exists(file_path):
-        raise Http404("Archivo no encontrado.")
+    if signature or expires:
+        if not all([expires, signature]):
+            raise Http404("Parámetros inválidos.")
+        try:
+            verify_signed_path(path, expires, signature)
+        except (BadSignature, ValueError):
+            raise Http404("Firma inválida o expirada.")
+    else:
+        await authorize(request, path)
 
-    return FileResponse(open(file_path, 'rb'))
+    return await aserve_file(request, settings.MEDIA_ROOT, path, public=False)
 
 @api_view(['GET'])
 def get_signed_url(request, file_path):
@@ -340,4 +607,23 @@ def get_signed_url(request, file_path):
         'expires': expires,
         'signature': signature,
     })
-    return JsonResponse({"signed_url": f"{url}?{query}"})
\ No newline at end of file
+    return JsonResponse({"signed_url": f"{url}?{query}"})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_hls_token(request, prefix):
+    # Token para todo el HLS de un título (prefijo relativo a media, p. ej. hls/pelicula/<titulo>);
+    # con bind=1 sólo lo puede usar el usuario que lo pidió
+    try:
+        expiry_seconds = min(int(request.GET.get('expiry_seconds', settings.HLS_TOKEN_MAX_AGE)), settings.HLS_TOKEN_MAX_AGE)
+    except ValueError:
+        return JsonResponse({"error": "expiry_seconds no válido"}, status=400)
+    prefix = normalize_path(prefix)
+    if not prefix.startswith('hls/') or not os.path.isdir(os.path.join(settings.MEDIA_ROOT, prefix)):
+        return JsonResponse({"error": "Título no encontrado"}, status=404)
+
+    expires = int(time.time()) + expiry_seconds
+    user_id = request.user.pk if request.GET.get('bind') in ('1', 'true', 'True') else None
+    token = make_token(prefix, expires, user_id)
+    playlist = f"/{quote(prefix)}/playlist.m3u8?{urlencode({TOKEN_PARAM: token})}"
+    return JsonResponse({"token": token, "expires": expires, "playlist_url": playlist})
\ No newline at end of file
@@ -1,8 +1,14 @@
 from rest_framework import serializers
 from .models import Pelicula
+from cinecloud.serving import trickplay_url
 
 class PeliculaSerializer(serializers.ModelSerializer):
+    trickplay = serializers.SerializerMethodField()
+
     class Meta:
         model = Pelicula
         fields = '__all__'
         depth = 1
+
+    def get_trickplay(self, obj):
+        return trickplay_url(obj.video)
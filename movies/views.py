@@ -5,6 +5,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Pelicula
 import json
 from cinecloud.models import Categoria
+from cinecloud.serving import hls_cache
 from django.shortcuts import render
 from django.http import HttpResponseRedirect
 from .forms import PeliculaForm
@@ -100,6 +101,7 @@ def deleteMovie(request, pk):
     # Borrar el hls 
     hls_path = os.path.join(settings.MEDIA_ROOT, 'hls','pelicula', str(pelicula.titulo))
     print(hls_path)
+    hls_cache.invalidate(hls_path)
     if os.path.exists(hls_path) and os.path.isdir(hls_path):
         for root, dirs, files in os.walk(hls_path, topdown=False):
             for file in files:
@@ -1,17 +1,28 @@
 from rest_framework import serializers
 from .models import Serie, Episodio
+from cinecloud.serving import trickplay_url
 
 class EpisodioSerializer(serializers.ModelSerializer):
+    trickplay = serializers.SerializerMethodField()
+
     class Meta:
         model = Episodio
         fields = '__all__'
 
+    def get_trickplay(self, obj):
+        return trickplay_url(obj.video)
+
 
 class EpisodioSimpleSerializer(serializers.ModelSerializer):
     """Serializer simplificado para listar episodios dentro de una serie"""
+    trickplay = serializers.SerializerMethodField()
+
     class Meta:
         model = Episodio
-        fields = ['id', 'titulo', 'temporada', 'numero', 'descripcion', 'imagen', 'duracion', 'video']
+        fields = ['id', 'titulo', 'temporada', 'numero', 'descripcion', 'imagen', 'duracion', 'video', 'trickplay']
+
+    def get_trickplay(self, obj):
+        return trickplay_url(obj.video)
 
 
 class SerieSerializer(serializers.ModelSerializer):
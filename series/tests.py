@@ -1,3 +1,43 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from .models import Episodio, Serie
 
-# Create your tests here.
+
+class DeleteEpisodeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', 'secreto'))
+
+        serie = Serie.objects.create(
+            titulo='Serie', descripcion='', fecha_estreno='2020-01-01', temporadas=1, imagen='series/serie.jpg'
+        )
+        self.episodio = Episodio.objects.create(
+            serie=serie, titulo='Piloto', temporada=1, numero=1, descripcion='', video='episodios/piloto.mp4'
+        )
+        self.hls_path = os.path.join(self.media_root, 'hls', 'serie', 'Serie', 'Piloto')
+        os.makedirs(self.hls_path)
+        with open(os.path.join(self.hls_path, 'playlist.m3u8'), 'w') as f:
+            f.write('#EXTM3U\n')
+        # Otro episodio de la misma serie que no se debe tocar
+        self.other_path = os.path.join(self.media_root, 'hls', 'serie', 'Serie', 'Episodio 2')
+        os.makedirs(self.other_path)
+
+    def test_delete_removes_the_episode_hls_and_its_cache(self):
+        with mock.patch('series.views.hls_cache') as hls_cache:
+            response = self.client.delete(reverse('delete_episode', args=[self.episodio.id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Episodio.objects.filter(id=self.episodio.id).exists())
+        self.assertFalse(os.path.exists(self.hls_path))
+        self.assertTrue(os.path.isdir(self.other_path))
+        hls_cache.invalidate.assert_called_once_with(self.hls_path)
@@ -14,6 +14,7 @@ from rest_framework.permissions import IsAuthenticated,IsAdminUser
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import authentication_classes
 from cinecloud.models import Categoria
+from cinecloud.serving import hls_cache
 import os
 from django.conf import settings
 
@@ -213,6 +214,7 @@ def deleteSerie(request, pk):
     # Borrar el hls
     hls_path = os.path.join(settings.MEDIA_ROOT, 'hls', 'serie', str(serie.titulo))
     print(hls_path)
+    hls_cache.invalidate(hls_path)
     if os.path.exists(hls_path) and os.path.isdir(hls_path):
         for root, dirs, files in os.walk(hls_path, topdown=False):
             for file in files:
@@ -256,8 +258,9 @@ def deleteEpisode(request, id):
         return Response({'error': 'Episodio not found'}, status=404)
     
     episodio.delete()
-    hls_path = os.path.join(settings.MEDIA_ROOT, 'hls', episodio.serie.titulo, str(episodio.titulo))
+    hls_path = os.path.join(settings.MEDIA_ROOT, 'hls', 'serie', str(episodio.serie.titulo), str(episodio.titulo))
     print(hls_path)
+    hls_cache.invalidate(hls_path)
     if os.path.exists(hls_path) and os.path.isdir(hls_path):
         for root, dirs, files in os.walk(hls_path, topdown=False):
             for file in files: